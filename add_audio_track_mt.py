@@ -3,11 +3,36 @@ import subprocess
 import xml.etree.ElementTree as ET
 from multiprocessing.pool import ThreadPool
 import threading
+import queue
+import asyncio
+import time
+import math
+import io
+import hashlib
+import heapq
+import gzip
+import atexit
 from datetime import datetime
 from tqdm import tqdm
 import re
 import json
 
+try:
+	import numpy as np
+except ImportError:
+	np = None
+
+try:
+	import psutil
+except ImportError:
+	psutil = None
+
+# Requires numpy
+try:
+	import verify_sync
+except ImportError:
+	verify_sync = None
+
 
 # =========================== Settings ==================================================
 
@@ -28,7 +53,13 @@ outputPath = outputPathRoot + pathMedia
 inputPath += "\\"
 outputPath += "\\"
 
-# Select title language (DE or EN)
+# Library mode: process all shows below inputPathRoot (every folder containing an info.xml) in one batch
+# Output of a show is written to outputPathRoot + folder of the show relative to inputPathRoot, pathMedia is not used
+enableLibraryMode = False
+# Maximum number of info.xml files parsed simultaneously (library mode only)
+MAX_THREADS_PARSE = 4
+
+# Select title language (DE or EN), can be overridden per show with <TitleLanguage> in info.xml
 titleLanguage = "DE"
 
 # Normalize audio
@@ -37,6 +68,35 @@ loudnessTarget = -23.0		# EBU recommendation: (-23.0)
 loudnessTruePeak = -1.0		# EBU limit (-1.0)
 loudnessRange = 18.0		# https://www.audiokinetic.com/library/edge/?source=Help&id=more_on_loudness_range_lra (18.0)
 
+# Copy audio streams already meeting the targets instead of normalizing and encoding them
+# Integrated loudness within loudnessTolerance (LU) of loudnessTarget, true peak and loudness range not above their targets
+# Disabled by default, copied streams are not changed at all and differ from the output of earlier versions
+# Streams of the second input file are always encoded if their speed or offset is changed
+enableLoudnessTolerance = False
+loudnessTolerance = 0.5		# EBU R 128 tolerance for programmes (0.5)
+
+# Split the normalization of long episodes (e.g. films) into segments processed by simultaneous ffmpeg processes
+# Segments are cut sample exact, normalized, resampled, stored as 24 bit FLAC and joined for the final encode
+# Only used if all normalized streams can be normalized linearly, dynamic normalization depends on the whole stream
+enableSegmentedEncode = False
+# Minimum duration of an episode to be split (seconds)
+segmentMinDuration = 1800
+# Length of the segments (whole seconds)
+segmentLength = 300
+# Audio processed before and after every segment and discarded afterwards, covers the delay of the resamplers (whole seconds)
+segmentPadding = 1
+# Maximum number of segments processed simultaneously
+MAX_THREADS_SEGMENT = 4
+
+# Engine for the loudness analysis (first pass): "ffmpeg" (loudnorm filter) or "numpy" (EBU R128 meter, requires numpy)
+loudnessEngine = "ffmpeg"
+# Additionally measure with the ffmpeg loudnorm filter and log the differences (numpy engine only)
+loudnessEngineValidate = False
+# Threads processing chunks of the audio streams in parallel (numpy engine only)
+loudnessEngineThreads = 4
+# Length of the chunks in seconds (numpy engine only)
+loudnessEngineChunkLength = 10
+
 # Format of file name
 fileNameFormat = "{TITLE} - [{RESOLUTION} {VIDEO_CODEC} {HDR} en-{EN_AUDIO_CODEC}-{EN_AUDIO_CHANNELS} de-{DE_AUDIO_CODEC}-{DE_AUDIO_CHANNELS}].mkv"
 
@@ -44,23 +104,103 @@ fileNameFormat = "{TITLE} - [{RESOLUTION} {VIDEO_CODEC} {HDR} en-{EN_AUDIO_CODEC
 enableLogFile = True
 enableFfmpegLogFile = True
 enableUniqueLogFile = False
+# Compress ffmpeg log files with gzip (.txt.gz)
+enableFfmpegLogCompression = False
+# Log messages are written by a background thread in batches, at the latest after this time (seconds)
+logFlushInterval = 1.0
+
+# Record wall time per stage, CPU time, peak memory and I/O of child processes for every episode (JSON lines)
+# CPU time, memory and I/O of child processes require psutil
+enableTelemetry = True
+telemetryFile = "logs/telemetry.jsonl"
+# Interval of sampling child processes (seconds)
+telemetrySampleInterval = 0.5
 
 # Maximum number of simultaneous threads
 MAX_THREADS = 2
 
+# Run loudness analysis and encoding as two pipelined stages with separate thread pools
+# MAX_THREADS is used for the encoding stage
+enablePipeline = True
+# Maximum number of simultaneous threads for the analysis stage
+MAX_THREADS_ANALYSIS = 2
+# Maximum number of analyzed episodes waiting for the encoding stage
+PIPELINE_QUEUE_SIZE = 2
+
+# Distribute the CPU cores among simultaneous ffmpeg processes (-threads, -filter_threads, -filter_complex_threads)
+# Processes started while fewer episodes than ffmpeg slots are left get more threads
+enableCoreBudget = True
+# Number of logical cores to distribute (0: all cores available to this script)
+coreBudgetCores = 0
+# Additionally pin every ffmpeg process to its own cores, rebalanced whenever a process finishes (requires psutil)
+enableCoreAffinity = False
+
+# Limit the number of episodes reading or writing on the same volume (drive, mount or network share) simultaneously
+# Waiting episodes of one volume are started in the order of their files on the disk
+# Transferred MB/s per volume are logged at the end of the batch in any case
+enableVolumeScheduling = False
+# Maximum number of analysis and encoding jobs per volume (0: unlimited)
+MAX_JOBS_PER_VOLUME = 1
+# Limits of single volumes by mount point (e.g. {"E:\\": 2, "\\\\nas\\media\\": 1})
+volumeLimits = {}
+
+# Run all episodes from one thread with asyncio, external tools are limited by separate semaphores
+# Probes of later episodes overlap with running encodes, takes precedence over enablePipeline
+enableAsyncRunner = False
+# Maximum number of simultaneous ffmpeg processes (analysis and encoding of one episode)
+ASYNC_MAX_FFMPEG = 2
+# Maximum number of simultaneous ffprobe processes
+ASYNC_MAX_FFPROBE = 8
+# Maximum number of simultaneous file operations (moving output, writing caches)
+ASYNC_MAX_IO = 4
+
+# Check the sync of the added audio in sampled windows of every file written by the batch (requires numpy, see verify_sync.py)
+# Offset and drift between the first and the added audio stream are logged and written to syncReportFile
+enableSyncVerification = False
+syncReportFile = "logs/sync_report.json"
+
+# Only plan the batch (resolve files, probe, build commands, estimate time and size) and write the plan to planFile
+dryRun = False
+planFile = outputPathRoot + "plan.json"
+# Execute a plan written by a dry run instead of reading info.xml (empty: disabled)
+runPlanFile = ""
+
+# Process episodes with the longest estimated processing time first to minimize the total batch time
+enableCostScheduling = True
+# Estimated processing time in seconds (per second of audio and channel for analysis and encoding)
+costPerEpisode = 5.0
+costAnalysisPerChannelSecond = 0.002
+costEncodePerChannelSecond = 0.004
+
+# Cache ffprobe metadata of input files (keyed by path, size and modification time)
+enableMetadataCache = True
+# Clear the metadata cache before processing (forces all files to be probed again)
+invalidateMetadataCache = False
+metadataCacheFile = "cache/metadata_cache.json"
+# Least recently used entries are removed if the cache grows beyond this size
+metadataCacheMaxEntries = 10000
+
+# Cache loudnorm measurements (first pass) per audio stream, start offset and loudness targets
+enableLoudnessCache = True
+# Clear the loudness cache before processing (forces all audio streams to be analyzed again)
+invalidateLoudnessCache = False
+loudnessCacheFile = "cache/loudness_cache.json"
+loudnessCacheMaxEntries = 10000
+
+# Record finished episodes in a manifest and skip them in later runs if inputs, settings and output are unchanged
+enableRunManifest = True
+# Clear the manifest before processing (forces all episodes to be processed again)
+invalidateRunManifest = False
+runManifestFile = "cache/run_manifest.json"
+runManifestMaxEntries = 100000
+
 # Application paths
 ffmpeg = "ffmpeg.exe"
 ffprobe = "ffprobe.exe"
 
 # RegEx strings
-REGEX_MEDIA_STREAM		= r"Stream #(\d+):(\d+).*:\s*([a-zA-z]*)\s*:"
-REGEX_TOTAL_FRAMES		= r"NUMBER_OF_FRAMES\s*:\s*(\d+)"
-REGEX_TOTAL_DURATION	= r"\s*DURATION\s*:\s*(\d+):(\d+):(\d+.\d+)"
-REGEX_CURRENT_FRAME		= r"frame\s*=\s*(\d+)"
-REGEX_CURRENT_TIME		= r"time=(\d+):(\d+):(\d+).(\d+)"
 REGEX_LOUDNORM			= r"\[Parsed_loudnorm_(\d+)"
 REGEX_MKVPROPEDIT		= r"Progress:\s*(\d+)%"
-REGEX_FFMPEG_FILTER		= r"\[[0-9]*:a:[0-9]\](.*)\[out[0-9]*\]"
 
 # Log file location
 logFile = "logs/log_"
@@ -94,6 +234,45 @@ trim_before_resample = False
 
 validBitrates = [x * 32000 for x in range(1, 11)]
 
+# Values of the loudnorm first pass needed for the second pass
+LOUDNESS_MEASUREMENT_KEYS = ["input_i", "input_lra", "input_tp", "input_thresh", "target_offset"]
+
+# EBU R128 meter (numpy engine)
+LOUDNESS_SUBBLOCK_LENGTH = 0.1		# Seconds, gating blocks (400 ms, 3 s) are built from these
+TRUE_PEAK_OVERSAMPLING = 4
+TRUE_PEAK_TAPS = 12					# Taps of the interpolation filter per phase
+
+# Channel order of the ffmpeg channel layouts (ffprobe channel_layout)
+CHANNEL_LAYOUTS = {
+	"mono":				["FC"],
+	"stereo":			["FL", "FR"],
+	"2.1":				["FL", "FR", "LFE"],
+	"3.0":				["FL", "FR", "FC"],
+	"3.0(back)":		["FL", "FR", "BC"],
+	"4.0":				["FL", "FR", "FC", "BC"],
+	"quad":				["FL", "FR", "BL", "BR"],
+	"quad(side)":		["FL", "FR", "SL", "SR"],
+	"3.1":				["FL", "FR", "FC", "LFE"],
+	"5.0":				["FL", "FR", "FC", "BL", "BR"],
+	"5.0(side)":		["FL", "FR", "FC", "SL", "SR"],
+	"4.1":				["FL", "FR", "FC", "LFE", "BC"],
+	"5.1":				["FL", "FR", "FC", "LFE", "BL", "BR"],
+	"5.1(side)":		["FL", "FR", "FC", "LFE", "SL", "SR"],
+	"6.0":				["FL", "FR", "FC", "BC", "SL", "SR"],
+	"6.0(front)":		["FL", "FR", "FLC", "FRC", "SL", "SR"],
+	"hexagonal":		["FL", "FR", "FC", "BL", "BR", "BC"],
+	"6.1":				["FL", "FR", "FC", "LFE", "BC", "SL", "SR"],
+	"6.1(back)":		["FL", "FR", "FC", "LFE", "BL", "BR", "BC"],
+	"6.1(front)":		["FL", "FR", "LFE", "FLC", "FRC", "SL", "SR"],
+	"7.0":				["FL", "FR", "FC", "BL", "BR", "SL", "SR"],
+	"7.0(front)":		["FL", "FR", "FC", "FLC", "FRC", "SL", "SR"],
+	"7.1":				["FL", "FR", "FC", "LFE", "BL", "BR", "SL", "SR"],
+	"7.1(wide)":		["FL", "FR", "FC", "LFE", "BL", "BR", "FLC", "FRC"],
+	"7.1(wide-side)":	["FL", "FR", "FC", "LFE", "FLC", "FRC", "SL", "SR"]
+}
+# Layout ffmpeg assumes for streams without channel layout
+DEFAULT_CHANNEL_LAYOUTS = {1: "mono", 2: "stereo", 3: "2.1", 4: "4.0", 5: "5.0", 6: "5.1", 7: "6.1", 8: "7.1"}
+
 
 # =========================== Functions =================================================
 
@@ -106,9 +285,30 @@ class AudioCodecProfiles:
 	aac_eld		= "aac_eld"
 
 
+class SettingsShow:
+	def __init__(
+			self,
+			_name,
+			_inputPath,
+			_outputPath,
+			_videoPath,
+			_audioPath,
+			_prefixShow,
+			_titleLanguage
+	):
+		self.name				= _name
+		self.inputPath			= _inputPath
+		self.outputPath			= _outputPath
+		self.videoPath			= _videoPath
+		self.audioPath			= _audioPath
+		self.prefixShow			= _prefixShow
+		self.titleLanguage		= _titleLanguage
+
+
 class SettingsEpisode:
 	def __init__(
 			self,
+			_show,
 			_seasonPath,
 			_fileVideo,
 			_fileAudio,
@@ -119,6 +319,7 @@ class SettingsEpisode:
 			_audioOffset,
 			_audio_fps
 	):
+		self.show				= _show
 		self.seasonPath			= _seasonPath
 		self.fileVideo			= _fileVideo
 		self.fileAudio			= _fileAudio
@@ -128,6 +329,7 @@ class SettingsEpisode:
 		self.audioStart			= _audioStart
 		self.audioOffset		= _audioOffset
 		self.audio_fps			= _audio_fps
+		self.estimatedCost		= None
 
 
 class InfoVideo:
@@ -160,16 +362,653 @@ class InfoSubtitle:
 		self.language	= None
 
 
-# TODO: use logging module
-def logWrite(logStr, logFile = logFile):
-	if enableLogFile:
-		with threadLock:
-			# print(logStr)
+class AudioSegment:
+	def __init__(self, _idxStreamOut, _start, _end, _filePath):
+		self.idxStreamOut		= _idxStreamOut
+		self.start				= _start		# Seconds
+		self.end				= _end			# Seconds, None: until the end of the stream
+		self.filePath			= _filePath
+
+
+class EpisodeJob:
+	def __init__(self, _settings):
+		self.settings				= _settings
+		show						= _settings.show
+		self.audioFilePath			= show.inputPath + show.audioPath + _settings.seasonPath + _settings.fileAudio
+		self.videoFilePath			= show.inputPath + show.videoPath + _settings.seasonPath + _settings.fileVideo
+		self.episodeFullTitle		= show.prefixShow \
+									  + _settings.filePrefix \
+									  + _settings.titleDE if show.titleLanguage == "DE" else _settings.titleEN
+		self.convertedVideoFilePath	= show.outputPath + _settings.seasonPath
+		self.infoVideo				= InfoVideo()
+		self.infoAudio				= []
+		self.infoSubtitle			= []
+		self.audioSpeed				= 1.0
+		self.amountAudioStreams		= [0, 0]
+		self.amountSubtitleStreams	= [0, 0]
+		self.probeResults			= {}
+		self.loudnessInputFiles		= None
+		self.missingStreams			= []
+		self.loudnessMeasurements	= None
+		self.segments				= []
+		self.segmentFallback		= False
+		self.progressBar			= None
+		self.skipped				= False
+		self.ffmpegLogFile			= getFfmpegLogFile(_settings)
+		self.processingTime			= 0.0
+		self.telemetry				= EpisodeTelemetry()
+
+	def probe(self, filePath):
+		# Files probed in advance (asynchronous runner) are not probed again
+		if filePath not in self.probeResults:
+			self.probeResults[filePath] = probeFile(filePath)
+
+		return self.probeResults[filePath]
+
+	def closeProgressBar(self):
+		if self.progressBar is not None:
+			self.progressBar.close()
+			self.progressBar = None
+
+
+class DirectoryIndex:
+	def __init__(self):
+		self.entries			= {}
+		self.lock				= threading.Lock()
+
+	def list(self, directory):
+		key = getCacheKey(directory)
+
+		with self.lock:
+			if key in self.entries:
+				return self.entries[key]
+
+		try:
+			with os.scandir(directory) as iterator:
+				fileNames = sorted(entry.name for entry in iterator if entry.is_file())
+		except OSError as e:
+			logWrite("Error: Could not read directory \"" + directory + "\"! Exception: " + str(e))
+			fileNames = []
+
+		with self.lock:
+			self.entries[key] = fileNames
+
+		return fileNames
+
+	def resolve(self, directory, patterns):
+		# Single pass over the files of the directory for all patterns
+		matches = {pattern: [] for pattern in patterns}
+
+		for fileName in self.list(directory):
+			for pattern in matches:
+				if pattern in fileName:
+					matches[pattern].append(fileName)
+
+		return matches
+
+
+class VolumeScheduler:
+	def __init__(self, _maxJobsPerVolume, _volumeLimits):
+		self.maxJobsPerVolume	= _maxJobsPerVolume
+		self.volumeLimits		= {os.path.normcase(os.path.abspath(path)): limit for path, limit in _volumeLimits.items()}
+		self.volumes			= {}		# Folder -> mount point
+		self.activeJobs			= {}		# Mount point -> number of running jobs
+		self.waiting			= []		# [disk position, volumes, file paths]
+		self.statistics			= {}		# Mount point -> [bytes, busy time, start of busy time, number of jobs]
+		self.condition			= threading.Condition()
+		self.asyncCondition		= None		# Woken up on admission and release, belongs to asyncLoop
+		self.asyncLoop			= None
+
+	def getVolume(self, filePath):
+		folderPath = os.path.dirname(os.path.abspath(filePath))
+
+		with self.condition:
+			if folderPath in self.volumes:
+				return self.volumes[folderPath]
+
+		# Nearest existing folder, output folders may not exist yet
+		volumePath = folderPath
+
+		while not os.path.exists(volumePath) and os.path.dirname(volumePath) != volumePath:
+			volumePath = os.path.dirname(volumePath)
+
+		while not os.path.ismount(volumePath) and os.path.dirname(volumePath) != volumePath:
+			volumePath = os.path.dirname(volumePath)
+
+		volume = os.path.normcase(volumePath)
+
+		with self.condition:
+			self.volumes[folderPath] = volume
+
+		return volume
+
+	def getLimit(self, volume):
+		return self.volumeLimits.get(volume, self.maxJobsPerVolume)
+
+	def register(self, filePaths, diskPosition):
+		waiter = [diskPosition, sorted(set(self.getVolume(filePath) for filePath in filePaths)), filePaths]
+
+		with self.condition:
+			self.waiting.append(waiter)
+
+		return waiter
+
+	def tryAdmit(self, waiter):
+		diskPosition, volumes, filePaths = waiter
+
+		with self.condition:
+			if enableVolumeScheduling:
+				for volume in volumes:
+					limit = self.getLimit(volume)
+
+					if limit > 0 and self.activeJobs.get(volume, 0) >= limit:
+						return False
+
+					# Job with the file located first on the disk is started first
+					for other in self.waiting:
+						if other is not waiter and other[0] < diskPosition and volume in other[1]:
+							return False
+
+			self.waiting.remove(waiter)
+
+			now = time.monotonic()
+
+			for volume in volumes:
+				statistics = self.statistics.setdefault(volume, [0, 0.0, now, 0])
+
+				if self.activeJobs.get(volume, 0) == 0:
+					statistics[2] = now
+
+				statistics[3] += 1
+				self.activeJobs[volume] = self.activeJobs.get(volume, 0) + 1
+
+			# Jobs waiting only for this job to start first (disk order) can be admitted now
+			self.condition.notify_all()
+
+		self.notifyAsync()
+
+		return True
+
+	def acquire(self, filePaths, diskPosition):
+		waiter = self.register(filePaths, diskPosition)
+
+		with self.condition:
+			while not self.tryAdmit(waiter):
+				self.condition.wait()
+
+		return waiter
+
+	async def acquireAsync(self, filePaths, diskPosition):
+		# Folders of new files are resolved with blocking file system calls
+		waiter = await asyncio.to_thread(self.register, filePaths, diskPosition)
+
+		# Every batch of the asynchronous runner has its own event loop
+		with self.condition:
+			if self.asyncLoop is not asyncio.get_running_loop():
+				self.asyncLoop = asyncio.get_running_loop()
+				self.asyncCondition = asyncio.Condition()
+
+			asyncCondition = self.asyncCondition
+
+		# Waiting for the threading condition would block the event loop
+		async with asyncCondition:
+			while not self.tryAdmit(waiter):
+				await asyncCondition.wait()
+
+		return waiter
+
+	def notifyAsync(self):
+		# Release can be called from any thread, the asynchronous waiters are woken up in their event loop
+		with self.condition:
+			asyncLoop = self.asyncLoop
+			asyncCondition = self.asyncCondition
+
+		if asyncLoop is None or asyncLoop.is_closed():
+			return
+
+		async def notify():
+			async with asyncCondition:
+				asyncCondition.notify_all()
+
+		asyncLoop.call_soon_threadsafe(lambda: asyncLoop.create_task(notify()))
+
+	def release(self, reservation):
+		diskPosition, volumes, filePaths = reservation
+
+		# Inputs are read completely, outputs have their final size when the job is finished
+		transfers = [
+			[self.getVolume(filePath), os.path.getsize(filePath) if os.path.exists(filePath) else 0]
+			for filePath in filePaths
+		]
+
+		with self.condition:
+			now = time.monotonic()
+
+			for volume, amountBytes in transfers:
+				self.statistics[volume][0] += amountBytes
+
+			for volume in volumes:
+				self.activeJobs[volume] -= 1
+
+				if self.activeJobs[volume] == 0:
+					self.statistics[volume][1] += now - self.statistics[volume][2]
+
+			self.condition.notify_all()
+
+		self.notifyAsync()
+
+	def report(self):
+		with self.condition:
+			now = time.monotonic()
+
+			for volume, (amountBytes, busyTime, busyStart, amountJobs) in sorted(self.statistics.items()):
+				if self.activeJobs.get(volume, 0) > 0:
+					busyTime += now - busyStart
+
+				logWrite(
+					"Volume \""
+					+ volume
+					+ "\": "
+					+ str(amountJobs)
+					+ " jobs, "
+					+ f"{amountBytes / 1000 ** 2:.0f}"
+					+ " MB in "
+					+ secondsToTimeString(busyTime)
+					+ " ("
+					+ f"{amountBytes / 1000 ** 2 / busyTime if busyTime > 0 else 0:.1f}"
+					+ " MB/s, limit "
+					+ (str(self.getLimit(volume)) if enableVolumeScheduling and self.getLimit(volume) > 0 else "none")
+					+ ")"
+				)
+
+
+class CoreLease:
+	def __init__(self, _threads):
+		self.threads			= _threads
+		self.cores				= []
+		self.pid				= None
+
+
+class CoreBudget:
+	def __init__(self, _amountCores, _enableAffinity):
+		self.cores				= getAvailableCores(_amountCores)
+		self.enableAffinity		= _enableAffinity and isAffinitySupported()
+		self.slots				= 1			# Maximum number of simultaneous ffmpeg processes
+		self.remainingEpisodes	= 0			# Episodes of the batch not finished yet
+		self.leases				= []
+		self.lock				= threading.Lock()
+
+	def begin(self, amountEpisodes, slots):
+		with self.lock:
+			self.remainingEpisodes = amountEpisodes
+			self.slots = max(slots, 1)
+
+	def finishEpisode(self):
+		with self.lock:
+			self.remainingEpisodes = max(self.remainingEpisodes - 1, 0)
+
+	def getConcurrency(self, amountLeases):
+		# Slots stay free at the end of the batch, running processes are never fewer than the leases
+		return max(min(self.slots, self.remainingEpisodes), amountLeases, 1)
+
+	def acquire(self):
+		with self.lock:
+			lease = CoreLease(max(len(self.cores) // self.getConcurrency(len(self.leases) + 1), 1))
+			self.leases.append(lease)
+			self.rebalance()
+
+		return lease
+
+	def attach(self, lease, pid):
+		with self.lock:
+			lease.pid = pid
+
+			if self.enableAffinity:
+				setProcessAffinity(pid, lease.cores)
+
+	def release(self, lease):
+		with self.lock:
+			self.leases.remove(lease)
+			self.rebalance()
+
+	def rebalance(self):
+		# Every running process gets its own block of cores, freed cores are given to the remaining processes
+		blockSize = max(len(self.cores) // self.getConcurrency(len(self.leases)), 1)
+
+		for idxLease, lease in enumerate(self.leases):
+			start = (idxLease * blockSize) % len(self.cores)
+			cores = self.cores[start:start + blockSize]
+
+			if cores == lease.cores:
+				continue
+
+			lease.cores = cores
+
+			if self.enableAffinity and lease.pid is not None:
+				setProcessAffinity(lease.pid, cores)
+
+	def applyToCommand(self, command, lease):
+		# Filter threads are global options, -threads in front of the output sets the threads of all encoders
+		threads = str(lease.threads)
+
+		return (
+			command[:1]
+			+ ["-filter_threads", threads, "-filter_complex_threads", threads]
+			+ command[1:-1]
+			+ ["-threads", threads]
+			+ command[-1:]
+		)
+
+
+class ProcessMonitor:
+	def __init__(self, _pid, _interval):
+		self.pid				= _pid
+		self.interval			= _interval
+		self.cpuTime			= 0.0
+		self.peakRss			= 0
+		self.readBytes			= 0
+		self.writeBytes			= 0
+		self.stopEvent			= threading.Event()
+		self.thread				= None
+
+		try:
+			self.process		= psutil.Process(_pid) if psutil is not None else None
+		except psutil.Error:
+			self.process		= None
+
+	def sample(self):
+		# Values of the last sample before the process exits are kept
+		try:
+			with self.process.oneshot():
+				cpuTimes = self.process.cpu_times()
+				memoryInfo = self.process.memory_info()
+				self.cpuTime = cpuTimes.user + cpuTimes.system
+				# Windows reports the peak working set, otherwise the maximum of the samples is used
+				self.peakRss = max(self.peakRss, getattr(memoryInfo, "peak_wset", memoryInfo.rss))
+
+				if hasattr(self.process, "io_counters"):
+					ioCounters = self.process.io_counters()
+					self.readBytes = ioCounters.read_bytes
+					self.writeBytes = ioCounters.write_bytes
+
+			return True
+		except psutil.Error:
+			return False
+
+	def start(self):
+		if self.process is None:
+			return
+
+		self.thread = threading.Thread(target = self.run, daemon = True)
+		self.thread.start()
+
+	def run(self):
+		while self.sample() and not self.stopEvent.wait(self.interval):
+			pass
+
+	async def runAsync(self):
+		if self.process is None:
+			return
+
+		while self.sample() and not self.stopEvent.is_set():
+			await asyncio.sleep(self.interval)
+
+	def stop(self):
+		self.stopEvent.set()
+
+		if self.thread is not None:
+			self.thread.join()
+
+
+class EpisodeTelemetry:
+	def __init__(self):
+		self.stages				= {}		# Stage -> wall time
+		self.cpuTime			= {}		# Stage -> CPU time of child processes
+		self.peakRss			= 0
+		self.readBytes			= 0
+		self.writeBytes			= 0
+		self.amountProcesses	= 0
+		self.stage				= None
+		self.stageStart			= None
+		self.lock				= threading.Lock()
+
+	def beginStage(self, stage):
+		self.endStage()
+		self.stage = stage
+		self.stageStart = time.monotonic()
+
+	def endStage(self):
+		if self.stage is not None:
+			self.stages[self.stage] = self.stages.get(self.stage, 0.0) + time.monotonic() - self.stageStart
+			self.stage = None
+
+	def addProcess(self, monitor):
+		# Processes of the numpy engine are started from several threads
+		with self.lock:
+			stage = self.stage if self.stage is not None else "other"
+			self.cpuTime[stage] = self.cpuTime.get(stage, 0.0) + monitor.cpuTime
+			self.peakRss = max(self.peakRss, monitor.peakRss)
+			self.readBytes += monitor.readBytes
+			self.writeBytes += monitor.writeBytes
+			self.amountProcesses += 1
+
+
+class LogWriter:
+	# Marker of a queued request to close a file
+	CLOSE = object()
+
+	def __init__(self, _flushInterval):
+		self.flushInterval		= _flushInterval
+		self.queue				= queue.SimpleQueue()
+		self.thread				= threading.Thread(target = self.run, daemon = True)
+		self.stopped			= False
+		self.gzipFiles			= {}		# File path -> open gzip file, one gzip member per file and run
+
+	def start(self):
+		self.thread.start()
+
+	def write(self, filePath, text):
+		self.queue.put((filePath, text))
+
+	def clear(self, filePath):
+		self.queue.put((filePath, None))
+
+	def close(self, filePath):
+		# Finishes a compressed log file, nothing is written to it afterwards
+		if filePath is not None:
+			self.queue.put((filePath, LogWriter.CLOSE))
+
+	def stop(self):
+		if self.stopped:
+			return
+
+		self.stopped = True
+		self.queue.put(None)
+		self.thread.join()
+
+	def run(self):
+		running = True
+
+		while running:
+			# Wait for first message, then collect everything queued until the flush interval elapsed
+			batch = [self.queue.get()]
+			deadline = time.monotonic() + self.flushInterval
+
+			while batch[-1] is not None:
+				timeout = deadline - time.monotonic()
+
+				if timeout <= 0:
+					break
+
+				try:
+					batch.append(self.queue.get(timeout = timeout))
+				except queue.Empty:
+					break
+
+			if batch[-1] is None:
+				running = False
+				batch.pop()
+
+			self.flush(batch)
+
+		for filePath in list(self.gzipFiles):
+			self.closeGzip(filePath)
+
+	def flush(self, batch):
+		# Group messages by file so every file is opened only once per batch
+		# Value: [clear file before writing, lines, close file after writing]
+		buffers = {}
+
+		for filePath, text in batch:
+			if text is None:
+				buffers[filePath] = [True, [], False]
+			elif text is LogWriter.CLOSE:
+				buffers.setdefault(filePath, [False, [], False])[2] = True
+			else:
+				buffers.setdefault(filePath, [False, [], False])[1].append(text)
+
+		for filePath, (clearFile, lines, closeFile) in buffers.items():
 			try:
-				with open(logFile, 'a', encoding = "utf-8") as fileHandle:
-					fileHandle.write(logStr + '\n')
+				if filePath.endswith(".gz"):
+					self.writeGzip(filePath, clearFile, lines)
+
+					if closeFile:
+						self.closeGzip(filePath)
+				else:
+					with open(filePath, 'w' if clearFile else 'a', encoding = "utf-8") as fileHandle:
+						if lines:
+							fileHandle.write("\n".join(lines) + '\n')
 			except Exception as e:
-				print("Error writing log file: " + logFile + "! Exception: ", e)
+				print("Error writing log file: " + filePath + "! Exception: ", e)
+
+	def writeGzip(self, filePath, clearFile, lines):
+		# Compressed files stay open, appending would start a new gzip member with every flush
+		if clearFile:
+			self.closeGzip(filePath)
+
+		if filePath not in self.gzipFiles:
+			self.gzipFiles[filePath] = gzip.open(filePath, 'wt' if clearFile else 'at', encoding = "utf-8")
+
+		fileHandle = self.gzipFiles[filePath]
+
+		if lines:
+			fileHandle.write("\n".join(lines) + '\n')
+
+		# Written data can be read while the file is open, the gzip member is not finished
+		fileHandle.flush()
+
+	def closeGzip(self, filePath):
+		fileHandle = self.gzipFiles.pop(filePath, None)
+
+		if fileHandle is not None:
+			fileHandle.close()
+
+
+class PersistentCache:
+	def __init__(self, _filePath, _maxEntries, _enabled = True):
+		self.filePath			= _filePath
+		self.maxEntries			= _maxEntries
+		self.enabled			= _enabled
+		self.entries			= {}
+		self.modified			= False
+		self.lock				= threading.Lock()
+
+	def load(self):
+		if not self.enabled or not os.path.exists(self.filePath):
+			return
+
+		try:
+			with open(self.filePath, 'r', encoding = "utf-8") as fileHandle:
+				self.entries = json.load(fileHandle)
+		except (OSError, ValueError) as e:
+			logWrite("Warning: Could not read cache file \"" + self.filePath + "\"! Exception: " + str(e))
+			self.entries = {}
+
+	def clear(self):
+		with self.lock:
+			self.entries = {}
+			self.modified = True
+
+	def get(self, key, fingerprint):
+		if not self.enabled:
+			return None
+
+		with self.lock:
+			entry = self.entries.get(key)
+
+			# Entry is stale if the file changed since it was cached
+			if entry is None or entry["fingerprint"] != fingerprint:
+				return None
+
+			entry["lastUsed"] = time.time()
+			self.modified = True
+
+			return entry["data"]
+
+	def put(self, key, fingerprint, data):
+		if not self.enabled:
+			return
+
+		with self.lock:
+			self.entries[key] = {
+				"fingerprint":	fingerprint,
+				"lastUsed":		time.time(),
+				"data":			data
+			}
+			self.modified = True
+
+			# Evict least recently used entries (10 % at once to avoid sorting on every insert)
+			if len(self.entries) > self.maxEntries:
+				self.evict(max(self.maxEntries - self.maxEntries // 10, 0))
+
+	def evict(self, maxEntries):
+		if len(self.entries) <= maxEntries:
+			return
+
+		keys = sorted(self.entries, key = lambda k: self.entries[k]["lastUsed"], reverse = True)
+
+		for key in keys[maxEntries:]:
+			del self.entries[key]
+
+	def save(self):
+		if not self.enabled or not self.modified:
+			return
+
+		with self.lock:
+			self.evict(self.maxEntries)
+
+			try:
+				if os.path.dirname(self.filePath) != "":
+					os.makedirs(os.path.dirname(self.filePath), exist_ok = True)
+
+				# Write to temporary file first so an interrupted run cannot corrupt the cache
+				with open(self.filePath + ".tmp", 'w', encoding = "utf-8") as fileHandle:
+					json.dump(self.entries, fileHandle)
+
+				os.replace(self.filePath + ".tmp", self.filePath)
+				self.modified = False
+			except OSError as e:
+				logWrite("Warning: Could not write cache file \"" + self.filePath + "\"! Exception: " + str(e))
+
+
+def logWrite(logStr, logFile = logFile):
+	if enableLogFile:
+		# print(logStr)
+		logWriter.write(logFile, logStr)
+
+
+def getFfmpegLogFile(ep):
+	if not enableFfmpegLogFile:
+		return None
+
+	# One ffmpeg log file per episode, the name of the show keeps episodes of different shows apart
+	episodeName = re.sub(r'[\\/:*?"<>|]', "_", ep.show.name + "_" + ep.seasonPath + os.path.splitext(ep.fileVideo)[0]).strip("_ ")
+	filePath = logFileFfmpeg + "_" + episodeName + logFileExtension
+
+	if enableFfmpegLogCompression:
+		filePath += ".gz"
+
+	return filePath
 
 
 def errorCritical(errorStr):
@@ -232,12 +1071,234 @@ def timeStringToSeconds(timeStr):
 	return seconds
 
 
-def listSearch(elementList, value):
-	for element in elementList:
-		if value in element:
-			return element
+def getCacheKey(filePath):
+	return os.path.normcase(os.path.abspath(filePath))
+
+
+def getFileFingerprint(filePath):
+	fileStat = os.stat(filePath)
+	return [fileStat.st_size, fileStat.st_mtime_ns]
+
+
+def buildProbeCommand(filePath):
+	return [
+		ffprobe,
+		"-v",										# Less output
+		"quiet",
+		"-print_format",							# Set print format to json
+		"json",
+		"-show_streams",							# Output all entries
+		filePath
+	]
+
+
+def isAffinitySupported():
+	# psutil has no cpu_affinity on macOS
+	return psutil is not None and hasattr(psutil.Process, "cpu_affinity")
+
+
+def getAvailableCores(amountCores):
+	# Cores this script may run on (process affinity set by the user is respected)
+	if isAffinitySupported():
+		cores = psutil.Process().cpu_affinity()
+	elif hasattr(os, "sched_getaffinity"):
+		cores = sorted(os.sched_getaffinity(0))
+	else:
+		cores = list(range(os.cpu_count() or 1))
+
+	if amountCores > 0:
+		cores = cores[:amountCores]
+
+	return cores
+
+
+def setProcessAffinity(pid, cores):
+	try:
+		process = psutil.Process(pid)
+		process.cpu_affinity(cores)
+
+		# Linux only changes the main thread, threads already started by ffmpeg are moved separately
+		if hasattr(os, "sched_setaffinity"):
+			for thread in process.threads():
+				os.sched_setaffinity(thread.id, cores)
+	except (psutil.Error, OSError):
+		# Process already finished
+		pass
+
+
+def getDiskPosition(filePath):
+	# File ID (inode) approximates the position of the file on the disk
+	return os.stat(filePath).st_ino if os.path.exists(filePath) else 0
+
+
+def probeFile(filePath):
+	key = getCacheKey(filePath)
+	fingerprint = getFileFingerprint(filePath)
+
+	processOutJson = metadataCache.get(key, fingerprint)
+
+	if processOutJson is not None:
+		logWrite("Using cached metadata of \"" + filePath + "\"")
+		return processOutJson
+
+	processOutJson = json.loads(subprocess.check_output(buildProbeCommand(filePath)).decode("utf-8"))
+
+	metadataCache.put(key, fingerprint, processOutJson)
+
+	return processOutJson
+
+
+async def probeFileAsync(filePath):
+	key = getCacheKey(filePath)
+	fingerprint = getFileFingerprint(filePath)
+
+	processOutJson = metadataCache.get(key, fingerprint)
+
+	if processOutJson is not None:
+		logWrite("Using cached metadata of \"" + filePath + "\"")
+		return processOutJson
+
+	process = await asyncio.create_subprocess_exec(
+		*buildProbeCommand(filePath),
+		stdout = asyncio.subprocess.PIPE
+	)
+	processOut, _ = await process.communicate()
+
+	if process.returncode:
+		raise subprocess.CalledProcessError(process.returncode, ffprobe)
+
+	processOutJson = json.loads(processOut.decode("utf-8"))
+
+	metadataCache.put(key, fingerprint, processOutJson)
+
+	return processOutJson
+
+
+def getLoudnessCacheKey(filePath, idxStream, startTime):
+	# Measurements depend on the audio stream, the skipped start, the engine and the loudness targets
+	return "|".join([
+		getCacheKey(filePath),
+		str(idxStream),
+		f"{timeStringToSeconds(startTime):.3f}",
+		loudnessEngine,
+		str(loudnessTarget),
+		str(loudnessRange),
+		str(loudnessTruePeak)
+	])
+
+
+def getPartialFilePath(filePath):
+	# Keep the extension, ffmpeg uses it to select the output format
+	fileRoot, fileExtension = os.path.splitext(filePath)
+	return fileRoot + ".partial" + fileExtension
+
+
+def getSettingsFingerprint(job):
+	# All settings which change the content of the output file
+	settings = [
+		job.episodeFullTitle,
+		job.settings.audioStart,
+		job.settings.audioOffset,
+		job.settings.audio_fps,
+		enableNormalization,
+		loudnessTarget,
+		loudnessTruePeak,
+		loudnessRange,
+		audioEncoderAAC,
+		audioEncoderAC3,
+		audioEncoderOPUS,
+		audioResampler,
+		audioResamplerPrecision,
+		trim_before_resample,
+		enableLoudnessTolerance,
+		loudnessTolerance,
+		enableSegmentedEncode
+	]
+
+	return hashlib.sha1(json.dumps(settings).encode("utf-8")).hexdigest()
+
+
+def getManifestFingerprint(job):
+	return [
+		getFileFingerprint(job.videoFilePath),
+		getFileFingerprint(job.audioFilePath),
+		getSettingsFingerprint(job)
+	]
+
+
+def isEpisodeFinished(job):
+	if not enableRunManifest or not os.path.exists(job.convertedVideoFilePath):
+		return False
+
+	outputFingerprint = runManifest.get(getCacheKey(job.convertedVideoFilePath), getManifestFingerprint(job))
+
+	# Output was overwritten or modified since it was recorded
+	return outputFingerprint is not None and outputFingerprint == getFileFingerprint(job.convertedVideoFilePath)
+
+
+def recordEpisodeFinished(job):
+	if not enableRunManifest:
+		return
+
+	runManifest.put(
+		getCacheKey(job.convertedVideoFilePath),
+		getManifestFingerprint(job),
+		getFileFingerprint(job.convertedVideoFilePath)
+	)
+
+	# Store manifest immediately so finished episodes are known even if the batch is interrupted
+	runManifest.save()
+
+
+def resolveFileNames(episodeList, fileResolutions):
+	# Group by directory, every directory is read and searched only once for all patterns
+	patternsByDirectory = {}
+
+	for idxEpisode, attribute, directory, pattern in fileResolutions:
+		patternsByDirectory.setdefault(directory, []).append(pattern)
+
+	matchesByDirectory = {}
+
+	for directory, patterns in patternsByDirectory.items():
+		matchesByDirectory[directory] = directoryIndex.resolve(directory, patterns)
+
+	amountUnmatched = 0
+	amountAmbiguous = 0
+
+	for idxEpisode, attribute, directory, pattern in fileResolutions:
+		matches = matchesByDirectory[directory][pattern]
+
+		if not matches:
+			amountUnmatched += 1
+			logWrite("Warning: No file in \"" + directory + "\" contains \"" + pattern + "\"")
+		elif len(matches) > 1:
+			amountAmbiguous += 1
+			logWrite(
+				"Warning: Multiple files in \""
+				+ directory
+				+ "\" contain \""
+				+ pattern
+				+ "\": "
+				+ ", ".join("\"" + match + "\"" for match in matches)
+				+ " (using \""
+				+ matches[0]
+				+ "\")"
+			)
+
+		setattr(episodeList[idxEpisode], attribute, matches[0] if matches else "")
 
-	return ""
+	if fileResolutions:
+		logWrite(
+			"Resolved "
+			+ str(len(fileResolutions))
+			+ " file names in "
+			+ str(len(patternsByDirectory))
+			+ " directories ("
+			+ str(amountUnmatched)
+			+ " unmatched, "
+			+ str(amountAmbiguous)
+			+ " ambiguous)"
+		)
 
 
 def get_resolution(widht, height):
@@ -278,7 +1339,7 @@ def get_audio_channels(channels, layout):
 	elif channels == 2:
 		return "2"
 	else:
-		errorCritical("Unknown channel layout! Channels: " + channels + " Layout: " + layout)
+		errorCritical("Unknown channel layout! Channels: " + str(channels) + " Layout: " + str(layout))
 
 
 def get_audio_codec(codec, profile):
@@ -291,879 +1352,2743 @@ def get_audio_codec(codec, profile):
 		return codec.upper()
 
 
-def decodeFfmpegOutput(process, progressBar, maxProgress):
-	captureTotalFrames = False
-	jsonStart = False
-	totalFrames = 0
-	totalDurationS = 0
-	percentCounter = 0
-	regexPatternMediaStream		= re.compile(REGEX_MEDIA_STREAM)
-	regexPatternTotalFrames		= re.compile(REGEX_TOTAL_FRAMES)
-	regexPatternTotalDuration	= re.compile(REGEX_TOTAL_DURATION, re.IGNORECASE)
-	regexPatternCurrentFrame	= re.compile(REGEX_CURRENT_FRAME)
-	regexPatternCurrentTime		= re.compile(REGEX_CURRENT_TIME)
+class FfmpegProgress:
+	def __init__(self):
+		self.frame				= None
+		self.fps				= None
+		self.bitrate			= None
+		self.totalSize			= None
+		self.outTime			= 0.0		# Seconds
+		self.speed				= None
+		self.totalDuration		= None		# Seconds
+		self.finished			= False
 
-	# Normalization output
-	regexPatternLoudNorm = re.compile(REGEX_LOUDNORM)
-	jsonStrings = []
+	def getFraction(self):
+		if self.finished:
+			return 1.0
 
-	# Log file buffer (avoid constant opening and closing of file)
-	logFileBuffer = ""
+		if self.totalDuration is None or self.totalDuration <= 0:
+			return 0.0
 
-	# Decode output from ffmpeg
-	for line in process.stdout:
-		# Stop decoding if process finished
-		if process.poll() is not None:
-			break
+		return min(max(self.outTime / self.totalDuration, 0.0), 1.0)
 
-		# Ignore empty lines
-		if line.strip() == "":
-			continue
 
-		# Print output to file
-		if enableFfmpegLogFile:
-			logFileBuffer += line.strip() + "\n"
-			if len(logFileBuffer) > 1024:
-				logWrite(logFileBuffer[:-1], logFileFfmpeg + "_" + str(threading.get_ident()) + logFileExtension)
-				logFileBuffer = ""
-
-		# Update progress bar
-		regexMatchFrame = regexPatternCurrentFrame.match(line.strip())
-		regexMatchTime = regexPatternCurrentTime.search(line.strip())
-		if regexMatchFrame and totalFrames > 0:
-			progress = int(((int(regexMatchFrame.group(1)) * maxProgress) / totalFrames) * (progressAudioEncode / 100))
-			progressBar.update(progress - percentCounter)
-			percentCounter = progress
-			continue
-		elif regexMatchTime and totalDurationS > 0:
-			timeS  = int(regexMatchTime.group(1)) * 3600		# Hours
-			timeS += int(regexMatchTime.group(2)) * 60			# Minutes
-			timeS += float(regexMatchTime.group(3))				# Seconds
-			progress = int(((timeS * maxProgress) / totalDurationS) * (progressAudioEncode / 100))
-			progressBar.update(progress - percentCounter)
-			percentCounter = progress
-			continue
+def parseFfmpegProgressValue(value, valueType):
+	try:
+		return valueType(value.strip().rstrip("x"))
+	except ValueError:
+		return None
 
-		# Check for video stream
-		regexMatch = regexPatternMediaStream.match(line.strip())
-		if regexMatch:
-			if regexMatch.group(3).lower() == "video":
-				captureTotalFrames = True
-			else:
-				captureTotalFrames = False
-			continue
 
-		# Get total frames of video stream
-		if captureTotalFrames:
-			regexMatch = regexPatternTotalFrames.match(line.strip())
-			if regexMatch:
-				totalFrames = int(regexMatch.group(1))
-				captureTotalFrames = False
-				continue
+class FfmpegProgressDecoder:
+	def __init__(self, _totalDurationS, _onProgress):
+		self.progress				= FfmpegProgress()
+		self.progress.totalDuration	= _totalDurationS
+		self.onProgress				= _onProgress
+
+	def feed(self, line):
+		progress = self.progress
+
+		# ffmpeg writes one "key=value" pair per line, every block is terminated by the "progress" key
+		key, separator, value = line.partition("=")
+
+		if separator == "":
+			return
+
+		key = key.strip()
+
+		if key == "frame":
+			progress.frame = parseFfmpegProgressValue(value, int)
+		elif key == "fps":
+			progress.fps = parseFfmpegProgressValue(value, float)
+		elif key == "total_size":
+			progress.totalSize = parseFfmpegProgressValue(value, int)
+		elif key == "bitrate":
+			progress.bitrate = value.strip()
+		elif key == "out_time_us":
+			outTimeUs = parseFfmpegProgressValue(value, int)
+			if outTimeUs is not None:
+				progress.outTime = outTimeUs / 1000000
+		elif key == "speed":
+			progress.speed = parseFfmpegProgressValue(value, float)
+		elif key == "progress":
+			progress.finished = value.strip() == "end"
+			self.onProgress(progress)
+
+	def finish(self):
+		# Process ended without final progress block (e.g. error)
+		if not self.progress.finished:
+			self.progress.finished = True
+			self.onProgress(self.progress)
+
+
+class FfmpegLogDecoder:
+	def __init__(self, _jsonStrings, _logFilePath):
+		self.jsonStrings			= _jsonStrings
+		self.logFilePath			= _logFilePath
+		self.jsonStart				= False
+		self.regexPatternLoudNorm	= re.compile(REGEX_LOUDNORM)
+		# Log file buffer (avoid queueing every single line)
+		self.logFileBuffer			= ""
+
+	def feed(self, line):
+		lineStripped = line.strip()
 
-		# Get maximum total duration
-		regexMatch = regexPatternTotalDuration.match(line.strip())
-		if regexMatch:
-			durationS  = int(regexMatch.group(1)) * 3600		# Hours
-			durationS += int(regexMatch.group(2)) * 60			# Minutes
-			durationS += float(regexMatch.group(3))				# Seconds
-			if durationS > totalDurationS:
-				totalDurationS = durationS
-			continue
+		# Ignore empty lines
+		if lineStripped == "":
+			return
+
+		# Print output to file
+		if enableFfmpegLogFile and self.logFilePath is not None:
+			self.logFileBuffer += lineStripped + "\n"
+			if len(self.logFileBuffer) > 1024:
+				logWrite(self.logFileBuffer[:-1], self.logFilePath)
+				self.logFileBuffer = ""
 
 		# Get normalization output
 		if enableNormalization:
-			regexMatch = regexPatternLoudNorm.match(line.strip())
-			if regexMatch:
-				jsonStrings.append("")
-				jsonStart = True
-				continue
-			elif jsonStart:
-				jsonStrings[-1] += line
-				if "}" in line:
-					jsonStart = False
-				continue
+			if self.jsonStart:
+				self.jsonStrings[-1] += line
+				if "}" in lineStripped:
+					self.jsonStart = False
+			elif lineStripped.startswith("[Parsed_loudnorm_") and self.regexPatternLoudNorm.match(lineStripped):
+				self.jsonStrings.append("")
+				self.jsonStart = True
 
-	# Flush remaining buffer to log file
-	if enableFfmpegLogFile:
-		if len(logFileBuffer) > 0:
-			logWrite(logFileBuffer[:-1], logFileFfmpeg + "_" + str(threading.get_ident()) + logFileExtension)
-			logFileBuffer = ""
+	def finish(self):
+		# Flush remaining buffer to log file
+		if enableFfmpegLogFile and self.logFilePath is not None and len(self.logFileBuffer) > 0:
+			logWrite(self.logFileBuffer[:-1], self.logFilePath)
+			self.logFileBuffer = ""
 
-	# Add any missing percent value to progress bar
-	progressBar.update(maxProgress - percentCounter)
-	progressBar.refresh()
 
-	# Return json output
-	return [json.loads(s) for s in jsonStrings]
+def decodeFfmpegProgress(process, totalDurationS, onProgress):
+	decoder = FfmpegProgressDecoder(totalDurationS, onProgress)
 
+	for line in process.stdout:
+		decoder.feed(line)
 
-def processEpisode(ep):
-	global threadProgress
+	decoder.finish()
 
-	# Clear ffmpeg log file
-	# TODO: Unique log files per episode, not per thread
-	# if not enableUniqueLogFile:
-	# 	open(logFileFfmpeg + "_" + str(threading.get_ident()) + logFileExtension, 'w').close()
 
-	# File paths
-	audioFilePath = inputPath + audioPath + ep.seasonPath + ep.fileAudio
-	videoFilePath = inputPath + videoPath + ep.seasonPath + ep.fileVideo
-	episodeFullTitle = outputFilePrefixShow \
-					   + ep.filePrefix \
-					   + ep.titleDE if titleLanguage == "DE" else ep.titleEN
-	convertedVideoFilePath = outputPath + ep.seasonPath
+def decodeFfmpegLog(stream, jsonStrings, logFilePath):
+	decoder = FfmpegLogDecoder(jsonStrings, logFilePath)
 
-	infoVideo = InfoVideo()
-	infoAudio = []
-	infoSubtitle = []
+	for line in stream:
+		decoder.feed(line)
 
-	audioSpeed = 1.0
-	amountAudioStreams = [0, 0]
-	amountSubtitleStreams = [0, 0]
+	decoder.finish()
 
-	# Check if video and audio files exist
-	if os.path.exists(videoFilePath):
-		if os.path.exists(audioFilePath):
-			logWrite("Checking framerate of \"" + videoFilePath + "\"...")
-
-			# Get metadata of video file
-			processOutJson = json.loads(subprocess.check_output([
-				ffprobe,
-				"-v",										# Less output
-				"quiet",
-				"-print_format",							# Set print format to json
-				"json",
-				"-show_streams",							# Output all entries
-				videoFilePath
-			]).decode("utf-8"))								# Decode bytes into text
-
-			for stream in processOutJson["streams"]:
-				# Check video fps and calculate audio speed for additional audio track
-				if stream["codec_type"] == "video":
-					avgFps = stream["avg_frame_rate"].split("/")
-					infoVideo.framerate = int(avgFps[0]) / int(avgFps[1])
-
-					if ep.audio_fps > 0:
-						audioSpeed = infoVideo.framerate / ep.audio_fps
-
-					# Get video duration
-					if "tags" in stream and "DURATION" in stream["tags"] and timeStringToSeconds(stream["tags"]["DURATION"]) > 0:
-						infoVideo.duration = timeStringToSeconds(stream["tags"]["DURATION"])
-					elif "tags" in stream and "DURATION-eng" in stream["tags"] and timeStringToSeconds(stream["tags"]["DURATION-eng"]) > 0:
-						infoVideo.duration = timeStringToSeconds(stream["tags"]["DURATION-eng"])
-					else:
-						errorCritical("Could not get duration of video stream " + stream["index"] + " in file \"" + videoFilePath + "\"")
-
-					infoVideo.width = stream["width"]
-					infoVideo.height = stream["height"]
-					infoVideo.codec = stream["codec_name"]
-					infoVideo.profile = stream["profile"]
-
-					if "color_space" in stream:
-						infoVideo.color_space = stream["color_space"]
-					if "color_transfer" in stream:
-						infoVideo.color_transfer = stream["color_transfer"]
-					if "color_primaries" in stream:
-						infoVideo.color_primaries = stream["color_primaries"]
-
-				# Get audio stream info
-				elif stream["codec_type"] == "audio":
-					amountAudioStreams[0] += 1
-					infoStream = InfoAudio()
-
-					# Get duration
-					if "tags" in stream and "DURATION" in stream["tags"] and timeStringToSeconds(stream["tags"]["DURATION"]) > 0:
-						infoStream.duration = timeStringToSeconds(stream["tags"]["DURATION"])
-					elif "tags" in stream and "DURATION-eng" in stream["tags"] and timeStringToSeconds(stream["tags"]["DURATION-eng"]) > 0:
-						infoStream.duration = timeStringToSeconds(stream["tags"]["DURATION-eng"])
-
-					# Get samplerate
-					if "sample_rate" in stream and int(stream["sample_rate"]) > 0:
-						infoStream.samplerate =int(stream["sample_rate"])
-					else:
-						errorCritical("Could not get samplerate of audio stream " + stream["index"] + " in file \"" + videoFilePath + "\"")
-
-					# Get bitrate
-					if "bit_rate" in stream and int(stream["bit_rate"]) > 0:
-						infoStream.bitrate = int(stream["bit_rate"])
-					elif "tags" in stream and "BPS" in stream["tags"] and int(stream["tags"]["BPS"]) > 0:
-						infoStream.bitrate = int(stream["tags"]["BPS"])
-					elif "tags" in stream and "BPS-eng" in stream["tags"] and int(stream["tags"]["BPS-eng"]) > 0:
-						infoStream.bitrate = int(stream["tags"]["BPS-eng"])
-					else:
-						errorCritical("Could not get bitrate of audio stream " + stream["index"] + " in file \"" + videoFilePath + "\"")
-
-					# Get audio codec and profile
-					if "codec_name" in stream:
-						infoStream.codec = stream["codec_name"]
-
-					if "profile" in stream:
-						infoStream.profile = stream["profile"]
-
-					# Get audio language
-					if "tags" in stream and "language" in stream["tags"]:
-						infoStream.language = stream["tags"]["language"]
-
-					# Get audio channels
-					if "channels" in stream:
-						infoStream.channels = stream["channels"]
-
-					if "channel_layout" in stream:
-						infoStream.channel_layout = stream["channel_layout"]
-
-					infoAudio.append(infoStream)
-
-				# Get subtitle stream info
-				elif stream["codec_type"] == "subtitle":
-					amountSubtitleStreams[0] += 1
-
-					infoStream = InfoSubtitle()
-
-					# Get subtitle language
-					if "tags" in stream and "language" in stream["tags"]:
-						infoStream.language = stream["tags"]["language"]
-
-					infoSubtitle.append(infoStream)
-
-			logWrite("Using audio speed " + str(audioSpeed) + " for \"" + audioFilePath + "\"")
-			logWrite("Checking audio codec of \"" + audioFilePath + "\"...")
-
-			# Get metadata of audio file
-			processOutJson = json.loads(subprocess.check_output([
-				ffprobe,
-				"-v",										# Less output
-				"quiet",
-				"-print_format",							# Set print format to json
-				"json",
-				"-show_streams",							# Output all entries
-				audioFilePath
-			]).decode("utf-8"))								# Decode bytes into text
-
-			for stream in processOutJson["streams"]:
-				# Get audio stream info
-				if stream["codec_type"] == "audio":
-					amountAudioStreams[1] += 1
-					infoStream = InfoAudio()
-
-					# Get duration
-					if "tags" in stream and "DURATION" in stream["tags"] and timeStringToSeconds(stream["tags"]["DURATION"]) > 0:
-						infoStream.duration = timeStringToSeconds(stream["tags"]["DURATION"])
-
-					# Get samplerate
-					if "sample_rate" in stream and int(stream["sample_rate"]) > 0:
-						infoStream.samplerate = int(stream["sample_rate"])
-					else:
-						errorCritical("Could not get samplerate of audio stream " + stream[
-							"index"] + " in file \"" + videoFilePath + "\"")
-
-					# Get bitrate
-					if "bit_rate" in stream and int(stream["bit_rate"]) > 0:
-						infoStream.bitrate = int(stream["bit_rate"])
-					elif "tags" in stream and "BPS" in stream["tags"] and int(stream["tags"]["BPS"]) > 0:
-						infoStream.bitrate = int(stream["tags"]["BPS"])
-					else:
-						errorCritical("Could not get bitrate of audio stream " + stream[
-							"index"] + " in file \"" + videoFilePath + "\"")
-
-					# Get audio codec and profile
-					if "codec_name" in stream:
-						infoStream.codec = stream["codec_name"]
-
-					if "profile" in stream:
-						infoStream.profile = stream["profile"]
-
-					# Get audio language
-					if "tags" in stream and "language" in stream["tags"]:
-						infoStream.language = stream["tags"]["language"]
-
-					# Get audio channels
-					if "channels" in stream:
-						infoStream.channels = stream["channels"]
-
-					if "channel_layout" in stream:
-						infoStream.channel_layout = stream["channel_layout"]
 
-					infoAudio.append(infoStream)
-
-				# Get subtitle stream info
-				elif stream["codec_type"] == "subtitle":
-					amountSubtitleStreams[1] += 1
+def startProcessMonitor(pid, telemetry):
+	if not enableTelemetry or telemetry is None:
+		return None
 
-					infoStream = InfoSubtitle()
+	monitor = ProcessMonitor(pid, telemetrySampleInterval)
+	monitor.start()
 
-					# Get subtitle language
-					if "tags" in stream and "language" in stream["tags"]:
-						infoStream.language = stream["tags"]["language"]
+	return monitor
 
-					infoSubtitle.append(infoStream)
 
-			logWrite(
-				"Adding audio track \""
-				+ ep.seasonPath
-				+ ep.fileAudio
-				+ "\" to video file \""
-				+ ep.seasonPath
-				+ ep.fileVideo
-				+ "\"..."
-			)
+def stopProcessMonitor(monitor, telemetry):
+	if monitor is None:
+		return
 
-			# Add thread progress to dictionary
-			maxProgress = amountAudioStreams[1] * progressAudioEncode
+	monitor.stop()
+	telemetry.addProcess(monitor)
 
-			if enableNormalization:
-				maxProgress = (amountAudioStreams[0] + amountAudioStreams[1]) * 2 * progressAudioEncode
 
-			progressbar_name = "Processing \"" + ep.seasonPath + ep.fileVideo
+def runFfmpeg(command, totalDurationS, onProgress, logFilePath = None, telemetry = None):
+	lease = None
 
-			if (len(progressbar_name) > 50):
-				progressbar_name = progressbar_name[:50]
-				progressbar_name += "..."
+	if enableCoreBudget:
+		lease = coreBudget.acquire()
+		command = coreBudget.applyToCommand(command, lease)
 
-			progressbar_name += "\""
+	try:
+		# Progress is written to stdout ("-progress pipe:1"), log and loudnorm output to stderr
+		process = subprocess.Popen(
+			command,
+			stdout = subprocess.PIPE,
+			stderr = subprocess.PIPE,
+			universal_newlines = True,
+			encoding = "utf-8",
+			errors = "replace"
+		)
 
-			threadProgress[threading.get_ident()] = tqdm(
-				total = maxProgress,
-				desc = progressbar_name,
-				leave = False,
-			)
+		if lease is not None:
+			coreBudget.attach(lease, process.pid)
 
-			if enableNormalization:
-				command = [
-					ffmpeg,
-					"-hide_banner",			# Hide start info
-				]
+		monitor = startProcessMonitor(process.pid, telemetry)
 
-				# Set codecs for all audio streams in first input file
-				# FDK AAC seams to be bugged as decoder (removes silence and sets timestamps, but fails for the english audio)
-				# for idxStream in range(amountAudioStreams[0]):
-				# 	command.append("-c:a:" + str(idxStream))
-				# 	command.append(audioCodecs[idxStream])
+		# Read log output in separate thread, otherwise ffmpeg blocks if one of the pipes is full
+		jsonStrings = []
+		logThread = threading.Thread(target = decodeFfmpegLog, args = (process.stderr, jsonStrings, logFilePath))
+		logThread.start()
 
-				command.extend([
-					"-i",					# Input video
-					videoFilePath,
-				])
+		decodeFfmpegProgress(process, totalDurationS, onProgress)
 
-				# Set codecs for all audio streams in second input file
-				# FDK AAC seams to be bugged as decoder (removes silence and sets timestamps, but fails for the english audio)
-				# for idxStream in range(amountAudioStreams[1]):
-				# 	command.append("-c:a:" + str(idxStream))
-				# 	command.append(audioCodecs[idxStream + amountAudioStreams[0]])
-
-				command.extend([
-					"-ss",					# Skip specified time in next input file
-					ep.audioStart,
-					"-i",					# Input audio
-					audioFilePath,
-				])
+		logThread.join()
 
-				command.append("-filter_complex")
-				filterStr = ""
-
-				# Filter all audio streams of the two input files
-				for idxFile in range(2):
-					for idxStream in range(amountAudioStreams[idxFile]):
-						filterStr += "[" + str(idxFile) + ":a:" + str(idxStream) + "]"
-						filterStr += "loudnorm="
-						filterStr += "I="		+ str(loudnessTarget)
-						filterStr += ":LRA="	+ str(loudnessRange)
-						filterStr += ":TP="		+ str(loudnessTruePeak)
-						filterStr += ":print_format=json;"
-
-				# Remove last ';'
-				filterStr = filterStr[:-1]
-
-				# Add filter to command
-				command.append(filterStr)
-
-				command.extend([
-					# No output codec needed, output is discarded anyway and measured values stay the same
-					"-vn",					# Discard video
-					"-f",					# Only analyze file, don't create any output
-					"null",
-					"-"
-				])
+		# Wait for process to finish
+		process.wait()
 
-				commandStr = ""
+		stopProcessMonitor(monitor, telemetry)
+	finally:
+		if lease is not None:
+			coreBudget.release(lease)
 
-				for elem in command:
-					commandStr += elem
-					commandStr += ' '
+	# Return process and json output
+	return process, [json.loads(s) for s in jsonStrings]
 
-				logWrite("Executing command: " + commandStr)
 
-				# Analyze loudness of audio tracks
-				process = subprocess.Popen(
-					command,
-					stdout = subprocess.PIPE,
-					stderr = subprocess.STDOUT,
-					universal_newlines = True,
-					encoding = "utf-8"
-				)
+async def decodeStreamAsync(stream, decoder):
+	# Lines are decoded the same way as the text pipes of the synchronous runner
+	async for line in stream:
+		decoder.feed(line.decode("utf-8", errors = "replace"))
 
-				# Decode ffmpeg output
-				processOutJson = decodeFfmpegOutput(
-					process,
-					threadProgress[threading.get_ident()],
-					(amountAudioStreams[0] + amountAudioStreams[1]) * progressAudioEncode
-				)
+	decoder.finish()
 
-				# Wait for process to finish
-				process.wait()
 
-				# Check exit code
-				if process.returncode:
-					errorCritical(
-						"Failed to get audio normalization values for \""
-						+ ep.seasonPath
-						+ ep.fileVideo
-						+ "\"!"
-					)
+async def runFfmpegAsync(command, totalDurationS, onProgress, logFilePath = None, telemetry = None):
+	# Same as runFfmpeg, but both pipes are read by the event loop instead of a thread
+	lease = None
 
-			command = [
-				ffmpeg,
-				"-hide_banner",			# Hide start info
-				"-y"					# Overwrite existing files
-			]
+	if enableCoreBudget:
+		lease = coreBudget.acquire()
+		command = coreBudget.applyToCommand(command, lease)
 
-			# Set codecs for all audio streams in first input file
-			# FDK AAC seams to be bugged as decoder (removes silence and sets timestamps, but fails for the english audio)
-			# for idxStream in range(amountAudioStreams[0]):
-			# 	command.append("-c:a:" + str(idxStream))
-			# 	command.append(audioCodecs[idxStream])
+	try:
+		process = await asyncio.create_subprocess_exec(
+			*command,
+			stdout = asyncio.subprocess.PIPE,
+			stderr = asyncio.subprocess.PIPE
+		)
 
-			command.extend([
-				"-i",					# Input video
-				videoFilePath,
-			])
+		if lease is not None:
+			coreBudget.attach(lease, process.pid)
 
-			# Set codecs for all audio streams in second input file
-			# FDK AAC seams to be bugged as decoder (removes silence and sets timestamps, but fails for the english audio)
-			# for idxStream in range(amountAudioStreams[1]):
-			# 	command.append("-c:a:" + str(idxStream))
-			# 	command.append(audioCodecs[idxStream + amountAudioStreams[0]])
+		# Child process is sampled by a task of the event loop instead of a thread
+		monitor = None
+		monitorTask = None
 
-			command.extend([
-				"-ss",					# Skip specified time in next input file
-				ep.audioStart,
-				"-i",					# Input audio
-				audioFilePath
-			])
+		if enableTelemetry and telemetry is not None:
+			monitor = ProcessMonitor(process.pid, telemetrySampleInterval)
+			monitorTask = asyncio.create_task(monitor.runAsync())
 
-			# Filter all audio streams of the two input files
-			# File 1: Video + Original Audio
-			# File 2: Audio to be added
-			filterStr = ""
-			for idxFile in range(0 if enableNormalization else 1, 2):
-				for idxStream in range(amountAudioStreams[idxFile]):
-					idxStreamOut = idxFile * amountAudioStreams[0] + idxStream
-					filterStr += "[" + str(idxFile) + ":a:" + str(idxStream) + "]"
-					if enableNormalization:
-						filterStr += "loudnorm="
-						filterStr += "I="					+ str(loudnessTarget)
-						filterStr += ":LRA="				+ str(loudnessRange)
-						filterStr += ":TP="					+ str(loudnessTruePeak)
-						filterStr += ":measured_I="			+ processOutJson[idxStreamOut]["input_i"]
-						filterStr += ":measured_LRA="		+ processOutJson[idxStreamOut]["input_lra"]
-						filterStr += ":measured_TP="		+ processOutJson[idxStreamOut]["input_tp"]
-						filterStr += ":measured_thresh="	+ processOutJson[idxStreamOut]["input_thresh"]
-						filterStr += ":offset="				+ processOutJson[idxStreamOut]["target_offset"]
-						filterStr += ":linear=true"
-						filterStr += ":print_format=json"
-						if trim_before_resample:
-							filterStr += ",atrim=duration="
-							if infoAudio[idxStreamOut].duration is not None and infoAudio[idxStreamOut].duration > 0:
-								filterStr += str(infoAudio[idxStreamOut].duration)
-							else:
-								filterStr += str(infoVideo.duration)
-						filterStr += ",aresample="
-						filterStr += "resampler="			+ audioResampler
-						filterStr += ":out_sample_rate="	+ str(infoAudio[idxStreamOut].samplerate)
-						if audioResampler == "soxr":
-							filterStr += ":precision="		+ str(audioResamplerPrecision)
-						filterStr += ","
-					if idxFile == 1:
-						if audioSpeed != 1:
-							filterStr += "atempo="			+ str(audioSpeed)
-							filterStr += ","
-						if timeStringToSeconds(ep.audioOffset) > 0:
-							filterStr += "adelay=delays="	+ str(int(timeStringToSeconds(ep.audioOffset) * 1000))
-							filterStr += ":all=true"
-					if filterStr[-1] == ",":
-						filterStr = filterStr[:-1]
-					filterStr += "[out"						+ str(idxStreamOut)
-					filterStr += "];"
-
-			# Remove last ';'
-			filterStr = filterStr[:-1]
-
-			# Add filter to command
-			regexPatternFilter = re.compile(REGEX_FFMPEG_FILTER)
-			regexMatchFilter = regexPatternFilter.match(filterStr)
-
-			if regexMatchFilter and regexMatchFilter.group(1) != "":
-				command.extend([
-					"-filter_complex",  # Apply complex filter
-					filterStr
-				])
+		jsonStrings = []
 
-			# Set audio codec, profile and bitrate
-			for idxFile in range(2):
-				for idxStream in range(amountAudioStreams[idxFile]):
-					idxStreamOut = idxFile * amountAudioStreams[0] + idxStream
-					command.append("-c:a:" + str(idxStreamOut))
+		await asyncio.gather(
+			decodeStreamAsync(process.stdout, FfmpegProgressDecoder(totalDurationS, onProgress)),
+			decodeStreamAsync(process.stderr, FfmpegLogDecoder(jsonStrings, logFilePath))
+		)
 
-					encoder = None
-					profile = None
-					bitrate = None
+		await process.wait()
 
-					if idxFile == 0 and not enableNormalization:
-						encoder = "copy"
-					else:
-						encoder = getAudioEncoder(infoAudio[idxStreamOut].codec)
-						profile = getAudioEncoderProfile(infoAudio[idxStreamOut].codec, infoAudio[idxStreamOut].profile)
-						bitrate = getNearestValidBitrate(infoAudio[idxStreamOut].bitrate)
+		if monitor is not None:
+			monitor.stopEvent.set()
+			await monitorTask
+			telemetry.addProcess(monitor)
+	finally:
+		if lease is not None:
+			coreBudget.release(lease)
 
-					command.append(encoder)
+	return process, [json.loads(s) for s in jsonStrings]
 
-					if profile is not None:
-						command.append("-profile:a:" + str(idxStreamOut))
-						command.append(profile)
 
-					if bitrate is not None:
-						command.append("-b:a:" + str(idxStreamOut))
-						command.append(str(bitrate))
+def getProgressBarCallback(progressBar, maxProgress):
+	percentCounter = 0
 
-			command.extend([
-				"-c:v",					# Copy video
-				"copy",
-				"-c:s",					# Copy subtitles
-				"copy",
-				"-map",					# Map video from first input file to output
-				"0:v"
-			])
+	def updateProgressBar(progress):
+		nonlocal percentCounter
 
-			# Map all filtered audio and corresponding metadata to output
-			for idxFile in range(2):
-				for idxStream in range(amountAudioStreams[idxFile]):
-					idxStreamOut = idxFile * amountAudioStreams[0] + idxStream
-					if (idxFile == 0 and not enableNormalization) or regexMatchFilter.group(1) == "":
-						command.append("-map")
-						command.append(str(idxFile) + ":a:" + str(idxStream))
-					else:
-						command.append("-map")
-						command.append("[out" + str(idxStreamOut) + "]")
-					command.append("-map_metadata:s:a:" + str(idxStreamOut))
-					command.append(str(idxFile) + ":s:a:" + str(idxStream))
-
-			# Map all subtitle streams to output
-			for idxFile in range(2):
-				for idxStream in range(amountSubtitleStreams[idxFile]):
-					idxStreamOut = idxFile * amountAudioStreams[0] + idxStream
-					command.append("-map")
-					command.append(str(idxFile) + ":s:" + str(idxStream))
-					command.append("-map_metadata:s:s:" + str(idxStreamOut))
-					command.append(str(idxFile) + ":s:s:" + str(idxStream))
+		value = int(progress.getFraction() * maxProgress * (progressAudioEncode / 100))
 
-			command.extend([
-				"-map_metadata:g",			# Map global metadata to output
-				"0:g",
-				"-max_interleave_delta",	# Needed for use with subtitles, otherwise audio has buffering issues
-				"0"
-			])
+		if progress.finished:
+			# Add any missing percent value to progress bar
+			value = maxProgress
+
+		if value > percentCounter:
+			progressBar.update(value - percentCounter)
+			percentCounter = value
+
+		if progress.finished:
+			progressBar.refresh()
+
+	return updateProgressBar
 
-			# Assume the first audio stream is english if not specified
-			if amountAudioStreams[0] > 0:
-				lang = infoAudio[0].language
-				if lang is None or lang == "" or lang == "und":
-					infoAudio[0].language = "eng"
-
-			# Assume the second audio stream is german if not specified
-			if amountAudioStreams[1] > 0:
-				lang = infoAudio[amountAudioStreams[0]].language
-				if lang is None or lang == "" or lang == "und":
-					infoAudio[amountAudioStreams[0]].language = "deu"
-
-			# Set audio languages
-			for idxStream in range(amountAudioStreams[0]):
-				lang = infoAudio[idxStream].language
-				if lang is not None and lang != "":
-					command.append("-metadata:s:a:" + str(idxStream))
-					command.append("language=" + lang)
-
-			for idxStream in range(amountAudioStreams[1]):
-				lang = infoAudio[idxStream + amountAudioStreams[0]].language
-				if lang is not None and lang != "":
-					command.append("-metadata:s:a:" + str(idxStream + amountAudioStreams[0]))
-					command.append("language=" + lang)
-
-			# Mark all original subtitle streams as english
-			# for idxStream in range(amountSubtitleStreams[0]):
-			# 	command.append("-metadata:s:s:" + str(idxStream))
-			# 	command.append("language=eng")
-
-			# Mark all additional subtitle streams as german
-			# for idxStream in range(amountSubtitleStreams[1]):
-			# 	command.append("-metadata:s:s:" + str(idxStream + amountSubtitleStreams[0]))
-			# 	command.append("language=deu")
-
-			# Move MOOV-Atom to the beginning of the file for faster playback
-			command.extend([
-				"-movflags",
-				"+faststart"
-			])
 
-			fileName = fileNameFormat
-			fileName = fileName.replace("{TITLE}",				episodeFullTitle)
-			fileName = fileName.replace("{RESOLUTION}",			get_resolution(infoVideo.width, infoVideo.height))
-			fileName = fileName.replace("{VIDEO_CODEC}",			str(infoVideo.codec).upper())
-			fileName = fileName.replace("{HDR}",					get_hdr(infoVideo.color_space, infoVideo.color_transfer, infoVideo.color_primaries))
-			fileName = fileName.replace("{EN_AUDIO_CODEC}",		get_audio_codec(infoAudio[0].codec, infoAudio[0].profile))
-			fileName = fileName.replace("{EN_AUDIO_CHANNELS}",	get_audio_channels(infoAudio[0].channels, infoAudio[0].channel_layout))
-			fileName = fileName.replace("{DE_AUDIO_CODEC}", 		get_audio_codec(infoAudio[amountAudioStreams[0]].codec, infoAudio[amountAudioStreams[0]].profile))
-			fileName = fileName.replace("{DE_AUDIO_CHANNELS}",	get_audio_channels(infoAudio[amountAudioStreams[0]].channels, infoAudio[amountAudioStreams[0]].channel_layout))
+def buildLoudnessCommand(job, missingStreams, inputFiles):
+	command = [
+		ffmpeg,
+		"-hide_banner",			# Hide start info
+		"-nostats",				# Progress is read from the progress pipe
+		"-progress",			# Write machine readable progress to stdout
+		"pipe:1"
+	]
 
-			convertedVideoFilePath += fileName
+	# Only open input files containing streams that still need to be analyzed
+	inputIndices = {}
 
+	for idxFile in range(2):
+		if not any(stream[0] == idxFile for stream in missingStreams):
+			continue
+
+		inputIndices[idxFile] = len(inputIndices)
+
+		# Set codecs for all audio streams of the input file
+		# FDK AAC seams to be bugged as decoder (removes silence and sets timestamps, but fails for the english audio)
+		# for idxStream in range(amountAudioStreams[idxFile]):
+		# 	command.append("-c:a:" + str(idxStream))
+		# 	command.append(audioCodecs[idxStream + idxFile * amountAudioStreams[0]])
+
+		if idxFile == 1:
 			command.extend([
-				"-metadata",					# Set title
-				"title=" + episodeFullTitle,
-				"-t",							# Duration of video to correctly truncate audio
-				secondsToTimeString(infoVideo.duration),
-				convertedVideoFilePath			# Output video
+				"-ss",			# Skip specified time in next input file
+				job.settings.audioStart,
 			])
 
-			commandStr = ""
+		command.extend([
+			"-i",				# Input video or audio
+			inputFiles[idxFile][0],
+		])
 
-			for elem in command:
-				commandStr += elem
-				commandStr += ' '
+	command.append("-filter_complex")
+	filterStr = ""
 
-			logWrite("Executing command: " + commandStr)
+	# Filter all audio streams without cached measurement
+	for idxFile, idxStream in missingStreams:
+		filterStr += "[" + str(inputIndices[idxFile]) + ":a:" + str(idxStream) + "]"
+		filterStr += "loudnorm="
+		filterStr += "I="		+ str(loudnessTarget)
+		filterStr += ":LRA="	+ str(loudnessRange)
+		filterStr += ":TP="		+ str(loudnessTruePeak)
+		filterStr += ":print_format=json;"
 
-			# Add additional audio track with offset, speed adjustment and normalize loudness of all audio tracks
-			process = subprocess.Popen(
-				command,
-				stdout = subprocess.PIPE,
-				stderr = subprocess.STDOUT,
-				universal_newlines = True,
-				encoding = "utf-8"
-			)
+	# Remove last ';'
+	filterStr = filterStr[:-1]
 
-			# Decode ffmpeg output
-			processOutJson = decodeFfmpegOutput(
-				process,
-				threadProgress[threading.get_ident()],
-				(amountAudioStreams[0] * int(enableNormalization) + amountAudioStreams[1]) * progressAudioEncode
-			)
+	# Add filter to command
+	command.append(filterStr)
 
-			# Wait for process to finish
-			process.wait()
-
-			# Check exit code
-			if process.returncode:
-				errorCritical(
-					"Failed to add audio track \""
-					+ ep.seasonPath
-					+ ep.fileAudio
-					+ "\" to video file \""
-					+ ep.seasonPath
-					+ ep.fileVideo
-					+ "\"!"
-				)
+	command.extend([
+		# No output codec needed, output is discarded anyway and measured values stay the same
+		"-vn",					# Discard video
+		"-f",					# Only analyze file, don't create any output
+		"null",
+		"-"
+	])
 
-			# Check if linear normalization was successful
-			if enableNormalization:
-				for idxStream, outJson in enumerate(processOutJson):
-					if outJson["normalization_type"] != "linear":
-						if idxStream < amountAudioStreams[0]:
-							logWrite(
-								"Warning: "
-								+ "Audio stream "
-								+ str(idxStream)
-								+ " in file \"" + videoFilePath + "\""
-								+ " was normalized dynamically."
-							)
-						else:
-							logWrite(
-								"Warning: "
-								+ "Audio stream "
-								+ str(idxStream - amountAudioStreams[0])
-								+ " in file \"" + audioFilePath + "\""
-								+ " was normalized dynamically."
-							)
-		else:
-			errorCritical('"' + audioFilePath + "\" does not exist!")
+	return command
+
+
+def measureLoudnessFfmpeg(job, missingStreams, inputFiles, onProgress):
+	command = buildLoudnessCommand(job, missingStreams, inputFiles)
+
+	commandStr = ""
+
+	for elem in command:
+		commandStr += elem
+		commandStr += ' '
+
+	logWrite("Executing command: " + commandStr)
+
+	# Analyze loudness of audio tracks
+	process, processOutJson = runFfmpeg(
+		command,
+		job.infoVideo.duration,
+		onProgress,
+		job.ffmpegLogFile,
+		job.telemetry
+	)
+
+	return getLoudnessOutput(job, missingStreams, process, processOutJson)
+
+
+def getLoudnessOutput(job, missingStreams, process, processOutJson):
+	# Check exit code
+	if process.returncode or len(processOutJson) != len(missingStreams):
+		errorCritical(
+			"Failed to get audio normalization values for \""
+			+ job.settings.seasonPath
+			+ job.settings.fileVideo
+			+ "\"!"
+		)
+
+	# loudnorm prints the measured values in the same order as the filters were specified
+	return [{key: outJson[key] for key in LOUDNESS_MEASUREMENT_KEYS} for outJson in processOutJson]
+
+
+def getLoudnessInputFiles(job):
+	# Input files with their start time
+	return [
+		[job.videoFilePath, secondsToTimeString(0)],
+		[job.audioFilePath, job.settings.audioStart]
+	]
+
+
+def getCachedLoudness(job):
+	inputFiles = getLoudnessInputFiles(job)
+	loudnessMeasurements = []
+	missingStreams = []
+
+	for idxFile in range(2):
+		fingerprint = getFileFingerprint(inputFiles[idxFile][0])
+
+		for idxStream in range(job.amountAudioStreams[idxFile]):
+			measurement = loudnessCache.get(
+				getLoudnessCacheKey(inputFiles[idxFile][0], idxStream, inputFiles[idxFile][1]),
+				fingerprint
+			)
+
+			if measurement is None:
+				missingStreams.append([idxFile, idxStream])
+
+			loudnessMeasurements.append(measurement)
+
+	return inputFiles, loudnessMeasurements, missingStreams
+
+
+def getKWeightingFilter(sampleRate):
+	# Impulse response of the K-weighting filter (ITU-R BS.1770-4)
+	# Applied as FIR filter, so chunks only depend on the samples directly before them and can be filtered in parallel
+	if sampleRate in kWeightingFilters:
+		return kWeightingFilters[sampleRate]
+
+	# Stage 1: High shelf (head effects)
+	K = math.tan(math.pi * 1681.974450955533 / sampleRate)
+	Q = 0.7071752369554196
+	Vh = 10 ** (3.999843853973347 / 20)
+	Vb = Vh ** 0.4996667741545416
+	a0 = 1 + K / Q + K * K
+	shelfB = [(Vh + Vb * K / Q + K * K) / a0, 2 * (K * K - Vh) / a0, (Vh - Vb * K / Q + K * K) / a0]
+	shelfA = [2 * (K * K - 1) / a0, (1 - K / Q + K * K) / a0]
+
+	# Stage 2: High pass (RLB weighting)
+	K = math.tan(math.pi * 38.13547087602444 / sampleRate)
+	Q = 0.5003270373238773
+	a0 = 1 + K / Q + K * K
+	highpassB = [1.0, -2.0, 1.0]
+	highpassA = [2 * (K * K - 1) / a0, (1 - K / Q + K * K) / a0]
+
+	# The impulse response has decayed completely after 200 ms
+	taps = int(sampleRate * 0.2)
+	impulse = [1.0] + [0.0] * (taps - 1)
+
+	for b, a in [[shelfB, shelfA], [highpassB, highpassA]]:
+		x1 = x2 = y1 = y2 = 0.0
+		response = []
+
+		for x0 in impulse:
+			y0 = b[0] * x0 + b[1] * x1 + b[2] * x2 - a[0] * y1 - a[1] * y2
+			x2, x1 = x1, x0
+			y2, y1 = y1, y0
+			response.append(y0)
+
+		impulse = response
+
+	kWeightingFilters[sampleRate] = np.array(impulse)
+
+	return kWeightingFilters[sampleRate]
+
+
+def getTruePeakFilter():
+	# Polyphase interpolation filter for 4x oversampling (ITU-R BS.1770-4 Annex 2)
+	# Windowed sinc with 12 taps per phase, phase p interpolates the sample at n + p / 4
+	phases = []
+	taps = np.arange(-(TRUE_PEAK_TAPS // 2 - 1), TRUE_PEAK_TAPS // 2 + 1)
+
+	for phase in range(TRUE_PEAK_OVERSAMPLING):
+		position = taps - phase / TRUE_PEAK_OVERSAMPLING
+		coefficients = np.sinc(position) * (0.5 + 0.5 * np.cos(np.pi * position / (TRUE_PEAK_TAPS // 2 + 0.5)))
+		phases.append(coefficients / coefficients.sum())
+
+	return phases
+
+
+def getChannelWeights(channels, channelLayout):
+	# Same weights as the ffmpeg ebur128 filter: side and back channels +1.5 dB, LFE is ignored, all others 1.0
+	# Channel names come from the layout of the stream, "FL+FR+LFE" style layouts are split into their channels
+	names = CHANNEL_LAYOUTS.get(channelLayout)
+
+	if names is None and channelLayout is not None and "+" in channelLayout:
+		names = channelLayout.split("+")
+
+	if names is None or len(names) != channels:
+		names = CHANNEL_LAYOUTS.get(DEFAULT_CHANNEL_LAYOUTS.get(channels), [])
+
+	weights = np.ones(channels)
+
+	for idxChannel, name in enumerate(names[:channels]):
+		if name.startswith("LFE"):
+			weights[idxChannel] = 0.0
+		elif name in ["BL", "BR", "BC", "SL", "SR", "TBL", "TBR", "TBC", "SDL", "SDR"]:
+			weights[idxChannel] = 1.41
+
+	return weights
+
+
+def measureLoudnessChunk(samples, history, sampleRate):
+	# samples: chunk of decoded audio (samples x channels)
+	# history: samples directly before the chunk (zeros at the start of the stream)
+	kWeightingFilter = getKWeightingFilter(sampleRate)
+	subblockLength = round(sampleRate * LOUDNESS_SUBBLOCK_LENGTH)
+	amountSubblocks = len(samples) // subblockLength
+	amountSamples = amountSubblocks * subblockLength
+
+	data = np.concatenate([history, samples]).astype(np.float64)
+	fftSize = 1 << int(math.ceil(math.log2(len(data) + len(kWeightingFilter) - 1)))
+	filterSpectrum = np.fft.rfft(kWeightingFilter, fftSize)
+
+	subblockPower = np.zeros((amountSubblocks, samples.shape[1]))
+	truePeak = float(np.abs(samples).max()) if len(samples) > 0 else 0.0
+
+	for idxChannel in range(samples.shape[1]):
+		# K-weighting by FFT convolution, history provides the filter state
+		filtered = np.fft.irfft(np.fft.rfft(data[:, idxChannel], fftSize) * filterSpectrum, fftSize)
+		filtered = filtered[len(history):len(history) + amountSamples]
+
+		# Mean square of 100 ms subblocks, the gating blocks are assembled from these after all chunks are measured
+		subblockPower[:, idxChannel] = np.mean(np.square(filtered).reshape(amountSubblocks, subblockLength), axis = 1)
+
+		# True peak of oversampled signal
+		tpData = data[len(history) - (TRUE_PEAK_TAPS - 1):, idxChannel]
+		tpLength = len(tpData) - (TRUE_PEAK_TAPS - 1)
+
+		for coefficients in truePeakFilter:
+			interpolated = np.zeros(tpLength)
+
+			for idxTap, coefficient in enumerate(coefficients):
+				interpolated += coefficient * tpData[idxTap:idxTap + tpLength]
+
+			if tpLength > 0:
+				truePeak = max(truePeak, float(np.abs(interpolated).max()))
+
+	return subblockPower, truePeak
+
+
+def powerToLoudness(power):
+	return -0.691 + 10 * np.log10(np.maximum(power, 1e-20))
+
+
+def calculateLoudness(subblockPower, channelWeights):
+	# Channel weighted power of all 100 ms subblocks
+	power = subblockPower @ channelWeights
+	cumulativePower = np.concatenate([[0.0], np.cumsum(power)])
+
+	def getBlocks(subblocks):
+		if len(power) < subblocks:
+			return np.array([])
+
+		return (cumulativePower[subblocks:] - cumulativePower[:-subblocks]) / subblocks
+
+	# Integrated loudness: 400 ms blocks with 75 % overlap, absolute and relative gate (-10 LU)
+	blocks = getBlocks(4)
+	blockLoudness = powerToLoudness(blocks)
+	gatedBlocks = blocks[blockLoudness > -70]
+
+	if len(gatedBlocks) > 0:
+		threshold = float(powerToLoudness(gatedBlocks.mean())) - 10
+		integrated = float(powerToLoudness(blocks[(blockLoudness > -70) & (blockLoudness > threshold)].mean()))
+	else:
+		threshold = -80.0
+		integrated = -70.0
+
+	# Loudness range: 3 s blocks with 10 Hz rate, absolute and relative gate (-20 LU), 10th to 95th percentile
+	blocks = getBlocks(30)
+	blockLoudness = powerToLoudness(blocks)
+	gatedBlocks = blocks[blockLoudness > -70]
+	loudnessRangeValue = 0.0
+
+	if len(gatedBlocks) > 0:
+		thresholdRange = float(powerToLoudness(gatedBlocks.mean())) - 20
+		gatedLoudness = blockLoudness[(blockLoudness > -70) & (blockLoudness > thresholdRange)]
+
+		if len(gatedLoudness) > 0:
+			loudnessRangeValue = float(np.percentile(gatedLoudness, 95) - np.percentile(gatedLoudness, 10))
+
+	return integrated, loudnessRangeValue, threshold
+
+
+def buildPcmDecodeCommand(filePath, idxStream, startTime, sampleRate, channels):
+	return [
+		ffmpeg,
+		"-hide_banner",			# Hide start info
+		"-nostdin",				# Stdin is not used
+		"-v",					# Only print errors
+		"error",
+		"-ss",					# Skip specified time in input file
+		startTime,
+		"-i",					# Input file
+		filePath,
+		"-map",					# Select audio stream
+		"0:a:" + str(idxStream),
+		"-ac",					# Keep channels and sample rate of the stream
+		str(channels),
+		"-ar",
+		str(sampleRate),
+		"-f",					# Raw 32 bit float samples
+		"f32le",
+		"-"
+	]
+
+
+def measureLoudnessNumpyStream(filePath, idxStream, startTime, sampleRate, channels, channelLayout, totalDurationS, onProgress, logFilePath, telemetry = None):
+	# Decode audio stream to raw 32 bit float samples
+	process = subprocess.Popen(
+		buildPcmDecodeCommand(filePath, idxStream, startTime, sampleRate, channels),
+		stdout = subprocess.PIPE,
+		stderr = subprocess.PIPE,
+		universal_newlines = False
+	)
+
+	monitor = startProcessMonitor(process.pid, telemetry)
+
+	# Read log output in separate thread
+	logThread = threading.Thread(
+		target = decodeFfmpegLog,
+		args = (io.TextIOWrapper(process.stderr, encoding = "utf-8", errors = "replace"), [], logFilePath)
+	)
+	logThread.start()
+
+	# Chunks consist of complete 100 ms subblocks
+	subblockLength = round(sampleRate * LOUDNESS_SUBBLOCK_LENGTH)
+	chunkSamples = max(round(loudnessEngineChunkLength / LOUDNESS_SUBBLOCK_LENGTH), 1) * subblockLength
+	historyLength = len(getKWeightingFilter(sampleRate)) - 1
+
+	history = np.zeros((historyLength, channels), dtype = np.float32)
+	progress = FfmpegProgress()
+	progress.totalDuration = totalDurationS
+	pendingResults = []
+	results = []
+
+	while True:
+		data = process.stdout.read(chunkSamples * channels * 4)
+		samples = np.frombuffer(data[:len(data) - len(data) % (channels * 4)], dtype = np.float32).reshape(-1, channels)
+
+		if len(samples) == 0:
+			break
+
+		pendingResults.append(loudnessEnginePool.apply_async(measureLoudnessChunk, (samples, history, sampleRate)))
+
+		history = np.concatenate([history, samples])[-historyLength:]
+
+		# Limit number of decoded chunks waiting in memory
+		while len(pendingResults) > loudnessEngineThreads * 2:
+			results.append(pendingResults.pop(0).get())
+
+		progress.outTime += len(samples) / sampleRate
+		onProgress(progress)
+
+	results.extend(result.get() for result in pendingResults)
+
+	logThread.join()
+	process.wait()
+
+	stopProcessMonitor(monitor, telemetry)
+
+	if process.returncode:
+		errorCritical("Failed to decode audio stream " + str(idxStream) + " of \"" + filePath + "\"!")
+
+	progress.finished = True
+	onProgress(progress)
+
+	if not results:
+		subblockPower = np.zeros((0, channels))
+		truePeak = 0.0
 	else:
+		subblockPower = np.concatenate([result[0] for result in results])
+		truePeak = max(result[1] for result in results)
+
+	channelWeights = getChannelWeights(channels, channelLayout)
+	integrated, loudnessRangeValue, threshold = calculateLoudness(subblockPower, channelWeights)
+	truePeakDb = max(20 * math.log10(truePeak), -99.0) if truePeak > 0 else -99.0
+
+	# Target offset as reported by loudnorm: target minus the gated loudness of the output after the linear gain
+	# The absolute gate (-70 LUFS) lets other blocks pass after the gain, so the output is measured again
+	gain = loudnessTarget - integrated
+	outputIntegrated, _, _ = calculateLoudness(subblockPower * 10 ** (gain / 10), channelWeights)
+
+	# Same fields as the loudnorm json output
+	return {
+		"input_i":			f"{integrated:.2f}",
+		"input_lra":		f"{loudnessRangeValue:.2f}",
+		"input_tp":			f"{truePeakDb:.2f}",
+		"input_thresh":		f"{threshold:.2f}",
+		"target_offset":	f"{loudnessTarget - outputIntegrated:.2f}"
+	}
+
+
+def measureLoudnessNumpy(job, missingStreams, inputFiles):
+	measuredValues = []
+
+	for idxFile, idxStream in missingStreams:
+		infoStream = job.infoAudio[idxFile * job.amountAudioStreams[0] + idxStream]
+
+		logWrite("Measuring loudness of audio stream " + str(idxStream) + " of \"" + inputFiles[idxFile][0] + "\"...")
+
+		measuredValues.append(measureLoudnessNumpyStream(
+			inputFiles[idxFile][0],
+			idxStream,
+			inputFiles[idxFile][1],
+			infoStream.samplerate,
+			infoStream.channels,
+			infoStream.channel_layout,
+			job.infoVideo.duration,
+			getProgressBarCallback(job.progressBar, progressAudioEncode),
+			job.ffmpegLogFile,
+			job.telemetry
+		))
+
+	return measuredValues
+
+
+def validateLoudness(job, missingStreams, inputFiles, measuredValues, referenceValues):
+	for (idxFile, idxStream), measurement, reference in zip(missingStreams, measuredValues, referenceValues):
+		differences = []
+
+		for key in ["input_i", "input_lra", "input_tp", "input_thresh"]:
+			differences.append(
+				key
+				+ ": "
+				+ measurement[key]
+				+ " (loudnorm: "
+				+ reference[key]
+				+ ", difference: "
+				+ f"{float(measurement[key]) - float(reference[key]):+.2f}"
+				+ ")"
+			)
+
+		logWrite(
+			"Loudness validation of audio stream "
+			+ str(idxStream)
+			+ " of \""
+			+ inputFiles[idxFile][0]
+			+ "\": "
+			+ ", ".join(differences)
+		)
+
+
+def probeEpisode(job):
+	ep = job.settings
+
+	# File paths
+	audioFilePath = job.audioFilePath
+	videoFilePath = job.videoFilePath
+
+	infoVideo = job.infoVideo
+	infoAudio = job.infoAudio
+	infoSubtitle = job.infoSubtitle
+
+	audioSpeed = 1.0
+	amountAudioStreams = job.amountAudioStreams
+	amountSubtitleStreams = job.amountSubtitleStreams
+
+	# Check if video and audio files exist
+	if not os.path.exists(videoFilePath):
 		errorCritical('"' + videoFilePath + "\" does not exist!")
 
-	# Remove thread progress from dictionary since thread is finished now
-	threadProgress[threading.get_ident()].close()
-	del threadProgress[threading.get_ident()]
+	if not os.path.exists(audioFilePath):
+		errorCritical('"' + audioFilePath + "\" does not exist!")
 
+	logWrite("Checking framerate of \"" + videoFilePath + "\"...")
 
-# =========================== Start of Script ===========================================
+	# Get metadata of video file
+	processOutJson = job.probe(videoFilePath)
 
-# Clear log file
-if not enableUniqueLogFile:
-	open(logFile, 'w').close()
+	for stream in processOutJson["streams"]:
+		# Check video fps and calculate audio speed for additional audio track
+		if stream["codec_type"] == "video":
+			avgFps = stream["avg_frame_rate"].split("/")
+			infoVideo.framerate = int(avgFps[0]) / int(avgFps[1])
 
-# Create thread lock
-threadLock = threading.Lock()
+			if ep.audio_fps > 0:
+				audioSpeed = infoVideo.framerate / ep.audio_fps
 
-# Write name of script to log file
-logWrite("This is " + os.path.basename(__file__))
+			# Get video duration
+			if "tags" in stream and "DURATION" in stream["tags"] and timeStringToSeconds(stream["tags"]["DURATION"]) > 0:
+				infoVideo.duration = timeStringToSeconds(stream["tags"]["DURATION"])
+			elif "tags" in stream and "DURATION-eng" in stream["tags"] and timeStringToSeconds(stream["tags"]["DURATION-eng"]) > 0:
+				infoVideo.duration = timeStringToSeconds(stream["tags"]["DURATION-eng"])
+			else:
+				errorCritical("Could not get duration of video stream " + stream["index"] + " in file \"" + videoFilePath + "\"")
+
+			infoVideo.width = stream["width"]
+			infoVideo.height = stream["height"]
+			infoVideo.codec = stream["codec_name"]
+			infoVideo.profile = stream["profile"]
+
+			if "color_space" in stream:
+				infoVideo.color_space = stream["color_space"]
+			if "color_transfer" in stream:
+				infoVideo.color_transfer = stream["color_transfer"]
+			if "color_primaries" in stream:
+				infoVideo.color_primaries = stream["color_primaries"]
+
+		# Get audio stream info
+		elif stream["codec_type"] == "audio":
+			amountAudioStreams[0] += 1
+			infoStream = InfoAudio()
+
+			# Get duration
+			if "tags" in stream and "DURATION" in stream["tags"] and timeStringToSeconds(stream["tags"]["DURATION"]) > 0:
+				infoStream.duration = timeStringToSeconds(stream["tags"]["DURATION"])
+			elif "tags" in stream and "DURATION-eng" in stream["tags"] and timeStringToSeconds(stream["tags"]["DURATION-eng"]) > 0:
+				infoStream.duration = timeStringToSeconds(stream["tags"]["DURATION-eng"])
+
+			# Get samplerate
+			if "sample_rate" in stream and int(stream["sample_rate"]) > 0:
+				infoStream.samplerate =int(stream["sample_rate"])
+			else:
+				errorCritical("Could not get samplerate of audio stream " + stream["index"] + " in file \"" + videoFilePath + "\"")
+
+			# Get bitrate
+			if "bit_rate" in stream and int(stream["bit_rate"]) > 0:
+				infoStream.bitrate = int(stream["bit_rate"])
+			elif "tags" in stream and "BPS" in stream["tags"] and int(stream["tags"]["BPS"]) > 0:
+				infoStream.bitrate = int(stream["tags"]["BPS"])
+			elif "tags" in stream and "BPS-eng" in stream["tags"] and int(stream["tags"]["BPS-eng"]) > 0:
+				infoStream.bitrate = int(stream["tags"]["BPS-eng"])
+			else:
+				errorCritical("Could not get bitrate of audio stream " + stream["index"] + " in file \"" + videoFilePath + "\"")
 
-# Get root element of XML file
-root_node = ET.parse(inputPath + "info.xml").getroot()
+			# Get audio codec and profile
+			if "codec_name" in stream:
+				infoStream.codec = stream["codec_name"]
 
-# Get video and audio file paths from XML
-videoPath = root_node.find("FilePathVideo").text
-audioPath = root_node.find("FilePathAudio").text
+			if "profile" in stream:
+				infoStream.profile = stream["profile"]
 
-# Get show prefix for output file name from XML
-outputFilePrefixShow = ""
+			# Get audio language
+			if "tags" in stream and "language" in stream["tags"]:
+				infoStream.language = stream["tags"]["language"]
 
-if root_node.find("PrefixShow") is not None:
-	outputFilePrefixShow = root_node.find("PrefixShow").text
+			# Get audio channels
+			if "channels" in stream:
+				infoStream.channels = stream["channels"]
 
-if outputFilePrefixShow is None:
-	outputFilePrefixShow = ""
+			if "channel_layout" in stream:
+				infoStream.channel_layout = stream["channel_layout"]
 
-# List containing settings for each episode in this season
-episodeSettings = []
+			infoAudio.append(infoStream)
 
-# Dictionary containing thread identifier as key and thread progress as value
-threadProgress = {}
+		# Get subtitle stream info
+		elif stream["codec_type"] == "subtitle":
+			amountSubtitleStreams[0] += 1
 
-# Loop over all seasons in XML file
-for season in root_node.findall("Season"):
-	# Check if only specific seasons should be processed
-	skip = False
-	if seasons:
-		skip = True
-		# Check if season was specified to be processed
-		for seasonNumber in seasons:
-			prefix = ""
+			infoStream = InfoSubtitle()
 
-			if season.find("PrefixSeason") is not None:
-				prefix = season.find("PrefixSeason").text
+			# Get subtitle language
+			if "tags" in stream and "language" in stream["tags"]:
+				infoStream.language = stream["tags"]["language"]
 
-			if prefix is None:
-				prefix = ""
+			infoSubtitle.append(infoStream)
+
+	logWrite("Using audio speed " + str(audioSpeed) + " for \"" + audioFilePath + "\"")
+	logWrite("Checking audio codec of \"" + audioFilePath + "\"...")
+
+	# Get metadata of audio file
+	processOutJson = job.probe(audioFilePath)
+
+	for stream in processOutJson["streams"]:
+		# Get audio stream info
+		if stream["codec_type"] == "audio":
+			amountAudioStreams[1] += 1
+			infoStream = InfoAudio()
+
+			# Get duration
+			if "tags" in stream and "DURATION" in stream["tags"] and timeStringToSeconds(stream["tags"]["DURATION"]) > 0:
+				infoStream.duration = timeStringToSeconds(stream["tags"]["DURATION"])
+
+			# Get samplerate
+			if "sample_rate" in stream and int(stream["sample_rate"]) > 0:
+				infoStream.samplerate = int(stream["sample_rate"])
+			else:
+				errorCritical("Could not get samplerate of audio stream " + stream[
+					"index"] + " in file \"" + videoFilePath + "\"")
+
+			# Get bitrate
+			if "bit_rate" in stream and int(stream["bit_rate"]) > 0:
+				infoStream.bitrate = int(stream["bit_rate"])
+			elif "tags" in stream and "BPS" in stream["tags"] and int(stream["tags"]["BPS"]) > 0:
+				infoStream.bitrate = int(stream["tags"]["BPS"])
+			else:
+				errorCritical("Could not get bitrate of audio stream " + stream[
+					"index"] + " in file \"" + videoFilePath + "\"")
+
+			# Get audio codec and profile
+			if "codec_name" in stream:
+				infoStream.codec = stream["codec_name"]
+
+			if "profile" in stream:
+				infoStream.profile = stream["profile"]
+
+			# Get audio language
+			if "tags" in stream and "language" in stream["tags"]:
+				infoStream.language = stream["tags"]["language"]
+
+			# Get audio channels
+			if "channels" in stream:
+				infoStream.channels = stream["channels"]
+
+			if "channel_layout" in stream:
+				infoStream.channel_layout = stream["channel_layout"]
+
+			infoAudio.append(infoStream)
+
+		# Get subtitle stream info
+		elif stream["codec_type"] == "subtitle":
+			amountSubtitleStreams[1] += 1
+
+			infoStream = InfoSubtitle()
+
+			# Get subtitle language
+			if "tags" in stream and "language" in stream["tags"]:
+				infoStream.language = stream["tags"]["language"]
+
+			infoSubtitle.append(infoStream)
+
+	job.audioSpeed = audioSpeed
+
+	# Get output file name
+	fileName = fileNameFormat
+	fileName = fileName.replace("{TITLE}",				job.episodeFullTitle)
+	fileName = fileName.replace("{RESOLUTION}",			get_resolution(infoVideo.width, infoVideo.height))
+	fileName = fileName.replace("{VIDEO_CODEC}",			str(infoVideo.codec).upper())
+	fileName = fileName.replace("{HDR}",					get_hdr(infoVideo.color_space, infoVideo.color_transfer, infoVideo.color_primaries))
+	fileName = fileName.replace("{EN_AUDIO_CODEC}",		get_audio_codec(infoAudio[0].codec, infoAudio[0].profile))
+	fileName = fileName.replace("{EN_AUDIO_CHANNELS}",	get_audio_channels(infoAudio[0].channels, infoAudio[0].channel_layout))
+	fileName = fileName.replace("{DE_AUDIO_CODEC}", 		get_audio_codec(infoAudio[amountAudioStreams[0]].codec, infoAudio[amountAudioStreams[0]].profile))
+	fileName = fileName.replace("{DE_AUDIO_CHANNELS}",	get_audio_channels(infoAudio[amountAudioStreams[0]].channels, infoAudio[amountAudioStreams[0]].channel_layout))
+
+	job.convertedVideoFilePath += fileName
+
+	# Skip episode if the output of a previous run is still valid
+	if isEpisodeFinished(job):
+		logWrite("Skipping \"" + ep.seasonPath + ep.fileVideo + "\", output \"" + job.convertedVideoFilePath + "\" is up to date")
+		job.skipped = True
+		return
+
+
+def beginAnalysis(job):
+	ep = job.settings
+
+	# Clear ffmpeg log file of previous runs
+	if job.ffmpegLogFile is not None and not enableUniqueLogFile and enableLogFile:
+		logWriter.clear(job.ffmpegLogFile)
+
+	job.telemetry.beginStage("probe")
 
-			if seasonNumber in prefix:
-				skip = False
+	probeEpisode(job)
 
-	if skip:
-		continue
+	# Output of a previous run is still valid
+	if job.skipped:
+		return
 
-	# Get path for season
-	seasonPath = season.find("FilePathSeason").text
+	amountAudioStreams = job.amountAudioStreams
+
+	logWrite(
+		"Adding audio track \""
+		+ ep.seasonPath
+		+ ep.fileAudio
+		+ "\" to video file \""
+		+ ep.seasonPath
+		+ ep.fileVideo
+		+ "\"..."
+	)
+
+	# Create progress bar of episode
+	maxProgress = amountAudioStreams[1] * progressAudioEncode
+
+	if enableNormalization:
+		maxProgress = (amountAudioStreams[0] + amountAudioStreams[1]) * 2 * progressAudioEncode
+
+	progressbar_name = "Processing \"" + ep.seasonPath + ep.fileVideo
+
+	if (len(progressbar_name) > 50):
+		progressbar_name = progressbar_name[:50]
+		progressbar_name += "..."
+
+	progressbar_name += "\""
+
+	job.progressBar = tqdm(
+		total = maxProgress,
+		desc = progressbar_name,
+		leave = False,
+	)
+
+	if enableNormalization:
+		# Measured loudness values of all audio streams, reuse values of previous runs if available
+		job.loudnessInputFiles, job.loudnessMeasurements, job.missingStreams = getCachedLoudness(job)
+
+		job.progressBar.update((len(job.loudnessMeasurements) - len(job.missingStreams)) * progressAudioEncode)
+
+		if len(job.missingStreams) < len(job.loudnessMeasurements):
+			logWrite(
+				"Using cached loudness values for "
+				+ str(len(job.loudnessMeasurements) - len(job.missingStreams))
+				+ " of "
+				+ str(len(job.loudnessMeasurements))
+				+ " audio streams of \""
+				+ ep.seasonPath
+				+ ep.fileVideo
+				+ "\""
+			)
+
+
+def measureLoudness(job):
+	missingStreams = job.missingStreams
+	inputFiles = job.loudnessInputFiles
+
+	if loudnessEngine == "numpy":
+		measuredValues = measureLoudnessNumpy(job, missingStreams, inputFiles)
+		referenceValues = None
+
+		if loudnessEngineValidate:
+			referenceValues = measureLoudnessFfmpeg(job, missingStreams, inputFiles, lambda progress: None)
+			validateLoudness(job, missingStreams, inputFiles, measuredValues, referenceValues)
+
+		# The target offset of dynamic normalization depends on the limiter of loudnorm, it is measured by loudnorm itself
+		dynamicStreams = [idx for idx, measurement in enumerate(measuredValues) if not isLinearNormalization(measurement)]
+
+		if dynamicStreams and referenceValues is None:
+			logWrite(
+				"Measuring "
+				+ str(len(dynamicStreams))
+				+ " audio streams of \""
+				+ job.settings.seasonPath
+				+ job.settings.fileVideo
+				+ "\" with loudnorm, they are normalized dynamically"
+			)
+
+			fallbackValues = measureLoudnessFfmpeg(job, [missingStreams[idx] for idx in dynamicStreams], inputFiles, lambda progress: None)
+			referenceValues = dict(zip(dynamicStreams, fallbackValues))
+
+		for idx in dynamicStreams:
+			measuredValues[idx] = referenceValues[idx]
+
+		return measuredValues
+
+	return measureLoudnessFfmpeg(
+		job,
+		missingStreams,
+		inputFiles,
+		getProgressBarCallback(job.progressBar, len(missingStreams) * progressAudioEncode)
+	)
+
+
+def finishAnalysis(job, measuredValues):
+	inputFiles = job.loudnessInputFiles
+
+	# Store measured values
+	for (idxFile, idxStream), measurement in zip(job.missingStreams, measuredValues):
+		job.loudnessMeasurements[idxFile * job.amountAudioStreams[0] + idxStream] = measurement
+		loudnessCache.put(
+			getLoudnessCacheKey(inputFiles[idxFile][0], idxStream, inputFiles[idxFile][1]),
+			getFileFingerprint(inputFiles[idxFile][0]),
+			measurement
+		)
+
+	# Store cache immediately so the measurements survive a failed encode
+	loudnessCache.save()
+
+
+def analyzeEpisode(job):
+	beginAnalysis(job)
+
+	if enableNormalization and not job.skipped and job.missingStreams:
+		job.telemetry.beginStage("wait")
+
+		reservation = volumeScheduler.acquire([job.videoFilePath, job.audioFilePath], getDiskPosition(job.videoFilePath))
+
+		try:
+			job.telemetry.beginStage("analysis")
+			measuredValues = measureLoudness(job)
+		finally:
+			volumeScheduler.release(reservation)
+
+		finishAnalysis(job, measuredValues)
+
+	job.telemetry.endStage()
+
+
+def isWithinLoudnessTolerance(measurement):
+	try:
+		inputI = float(measurement["input_i"])
+		inputLra = float(measurement["input_lra"])
+		inputTp = float(measurement["input_tp"])
+	except (TypeError, ValueError):
+		# Measurement not known yet (dry run)
+		return False
+
+	return (
+		abs(inputI - loudnessTarget) <= loudnessTolerance
+		and inputTp <= loudnessTruePeak
+		and inputLra <= loudnessRange
+	)
+
+
+def getCopiedAudioStreams(job, loudnessMeasurements):
+	# Output indices of audio streams copied without normalization
+	if not enableNormalization or not enableLoudnessTolerance or loudnessMeasurements is None:
+		return []
+
+	copiedStreams = []
+
+	for idxFile in range(2):
+		# Speed and offset of the added audio can only be changed by filters
+		if idxFile == 1 and (job.audioSpeed != 1 or timeStringToSeconds(job.settings.audioOffset) > 0):
+			continue
+
+		for idxStream in range(job.amountAudioStreams[idxFile]):
+			idxStreamOut = idxFile * job.amountAudioStreams[0] + idxStream
+
+			if isWithinLoudnessTolerance(loudnessMeasurements[idxStreamOut]):
+				copiedStreams.append(idxStreamOut)
+
+	return copiedStreams
+
+
+def isLinearNormalization(measurement):
+	# Same decision as loudnorm (af_loudnorm.c, init): linear if all measurements are set (not the defaults of the
+	# filter), the gain keeps the true peak below the target and the range fits, evaluated in the same order
+	try:
+		measuredI = float(measurement["input_i"])
+		measuredLra = float(measurement["input_lra"])
+		measuredTp = float(measurement["input_tp"])
+		measuredThresh = float(measurement["input_thresh"])
+	except (TypeError, ValueError, KeyError):
+		return False
+
+	if measuredTp == 99 or measuredThresh == -70 or measuredLra == 0 or measuredI == 0:
+		return False
+
+	offset = float(loudnessTarget) - measuredI
+	offsetTp = measuredTp + offset
+
+	return offsetTp <= float(loudnessTruePeak) and measuredLra <= float(loudnessRange)
+
+
+def getSegmentedStreams(job, loudnessMeasurements):
+	# Output indices of audio streams normalized in segments
+	if not enableSegmentedEncode or not enableNormalization or loudnessMeasurements is None:
+		return []
+
+	# A segment was normalized dynamically, the episode is encoded in a single pass
+	if job.segmentFallback:
+		return []
+
+	if job.infoVideo.duration is None or job.infoVideo.duration < segmentMinDuration:
+		return []
+
+	copiedStreams = getCopiedAudioStreams(job, loudnessMeasurements)
+	streams = [idxStreamOut for idxStreamOut in range(sum(job.amountAudioStreams)) if idxStreamOut not in copiedStreams]
+
+	# Dynamic normalization of a segment would depend on the audio around it
+	if not all(isLinearNormalization(loudnessMeasurements[idxStreamOut]) for idxStreamOut in streams):
+		return []
+
+	return streams
+
+
+def getTrimDuration(job, idxStreamOut):
+	infoStream = job.infoAudio[idxStreamOut]
+
+	if infoStream.duration is not None and infoStream.duration > 0:
+		return infoStream.duration
+
+	return job.infoVideo.duration
+
+
+def getSegmentedDuration(job, idxStreamOut):
+	# Streams of the added audio file are read from audioStart on (-ss in front of the input)
+	duration = getTrimDuration(job, idxStreamOut)
+
+	if idxStreamOut >= job.amountAudioStreams[0]:
+		duration -= timeStringToSeconds(job.settings.audioStart)
+
+	return max(duration, 0)
+
+
+def getSegmentDirectory(job):
+	fileRoot, _ = os.path.splitext(job.convertedVideoFilePath)
+	return fileRoot + ".segments"
+
+
+def getSegmentListPath(job, idxStreamOut):
+	return os.path.join(getSegmentDirectory(job), "stream" + str(idxStreamOut) + ".txt")
+
+
+def createSegments(job, loudnessMeasurements):
+	segments = []
+
+	for idxStreamOut in getSegmentedStreams(job, loudnessMeasurements):
+		amountSegments = max(math.ceil(getSegmentedDuration(job, idxStreamOut) / segmentLength), 1)
+
+		for idxSegment in range(amountSegments):
+			# Last segment is processed until the end of the stream
+			segments.append(AudioSegment(
+				idxStreamOut,
+				idxSegment * segmentLength,
+				(idxSegment + 1) * segmentLength if idxSegment < amountSegments - 1 else None,
+				os.path.join(getSegmentDirectory(job), "stream" + str(idxStreamOut) + "_" + f"{idxSegment:04}" + ".flac")
+			))
+
+	return segments
+
+
+def buildLoudnormFilter(measurement):
+	filterStr = "loudnorm="
+	filterStr += "I="					+ str(loudnessTarget)
+	filterStr += ":LRA="				+ str(loudnessRange)
+	filterStr += ":TP="					+ str(loudnessTruePeak)
+	filterStr += ":measured_I="			+ measurement["input_i"]
+	filterStr += ":measured_LRA="		+ measurement["input_lra"]
+	filterStr += ":measured_TP="		+ measurement["input_tp"]
+	filterStr += ":measured_thresh="	+ measurement["input_thresh"]
+	filterStr += ":offset="				+ measurement["target_offset"]
+	filterStr += ":linear=true"
+	filterStr += ":print_format=json"
+
+	return filterStr
+
+
+def buildResampleFilter(sampleRate):
+	filterStr = "aresample="
+	filterStr += "resampler="			+ audioResampler
+	filterStr += ":out_sample_rate="	+ str(sampleRate)
+	if audioResampler == "soxr":
+		filterStr += ":precision="		+ str(audioResamplerPrecision)
+
+	return filterStr
+
+
+def buildSegmentCommand(job, segment, measurement):
+	idxStreamOut = segment.idxStreamOut
+	idxFile = 0 if idxStreamOut < job.amountAudioStreams[0] else 1
+	idxStream = idxStreamOut - idxFile * job.amountAudioStreams[0]
+	sampleRate = job.infoAudio[idxStreamOut].samplerate
+
+	command = [
+		ffmpeg,
+		"-hide_banner",			# Hide start info
+		"-nostats",				# Progress is read from the progress pipe
+		"-progress",			# Write machine readable progress to stdout
+		"pipe:1",
+		"-y"					# Overwrite existing files
+	]
+
+	# Input options are the same as for the encode, so all segments count samples from the same start
+	if idxFile == 1:
+		command.extend([
+			"-ss",				# Skip specified time in input file
+			job.settings.audioStart
+		])
+
+	command.extend([
+		"-i",					# Input video or audio
+		job.videoFilePath if idxFile == 0 else job.audioFilePath
+	])
+
+	# Decoded samples before the padding are discarded, filters only process the segment and its padding
+	paddedStart = max(segment.start - segmentPadding, 0) * sampleRate
+
+	filterStr = "[0:a:" + str(idxStream) + "]"
+	filterStr += "atrim=start_sample="		+ str(paddedStart)
+	if segment.end is not None:
+		filterStr += ":end_sample="			+ str((segment.end + segmentPadding) * sampleRate)
+	filterStr += ",asetpts=PTS-STARTPTS,"
+	filterStr += buildLoudnormFilter(measurement)
+	if trim_before_resample and segment.end is None:
+		filterStr += ",atrim=duration="		+ str(getSegmentedDuration(job, idxStreamOut) - paddedStart / sampleRate)
+	filterStr += ","
+	filterStr += buildResampleFilter(sampleRate)
+
+	# Remove padding, boundaries are counted in samples of the resampled output
+	filterStr += ",atrim=start_sample="		+ str(segment.start * sampleRate - paddedStart)
+	if segment.end is not None:
+		filterStr += ":end_sample="			+ str(segment.end * sampleRate - paddedStart)
+	filterStr += "[out]"
+
+	command.extend([
+		"-filter_complex",		# Apply complex filter
+		filterStr,
+		"-map",					# Map segment to output
+		"[out]",
+		"-c:a",					# Lossless intermediate, 24 bit
+		"flac",
+		"-sample_fmt",
+		"s32",
+		"-vn",
+		segment.filePath
+	])
+
+	return command
+
+
+def writeSegmentLists(job):
+	os.makedirs(getSegmentDirectory(job), exist_ok = True)
+
+	segmentLists = {}
+
+	for segment in job.segments:
+		segmentLists.setdefault(segment.idxStreamOut, []).append(segment)
+
+	# Segments are joined by the concat demuxer, paths are relative to the list file
+	for idxStreamOut, segments in segmentLists.items():
+		with open(getSegmentListPath(job, idxStreamOut), 'w', encoding = "utf-8") as fileHandle:
+			for segment in segments:
+				fileHandle.write("file '" + os.path.basename(segment.filePath) + "'\n")
+
+
+def removeSegments(job):
+	if not job.segments:
+		return
+
+	segmentDirectory = getSegmentDirectory(job)
+
+	if not os.path.isdir(segmentDirectory):
+		return
+
+	for fileName in os.listdir(segmentDirectory):
+		os.remove(os.path.join(segmentDirectory, fileName))
+
+	os.rmdir(segmentDirectory)
+
+
+def getSegmentProgressCallback(job):
+	# Progress of the segments counts finished segments
+	onProgress = getProgressBarCallback(
+		job.progressBar,
+		len(set(segment.idxStreamOut for segment in job.segments)) * progressAudioEncode
+	)
+	progress = FfmpegProgress()
+	progress.totalDuration = len(job.segments)
+	lock = threading.Lock()
+
+	def onSegmentFinished():
+		with lock:
+			progress.outTime += 1
+			progress.finished = progress.outTime >= progress.totalDuration
+			onProgress(progress)
+
+	return onSegmentFinished
+
+
+def checkSegment(job, segment, process, processOutJson):
+	if process.returncode:
+		errorCritical("Failed to normalize segment \"" + segment.filePath + "\" of \"" + job.settings.seasonPath + job.settings.fileVideo + "\"!")
+
+	# Loudnorm decides on linear normalization for each segment, the analysis only predicts it
+	for outJson in processOutJson:
+		if outJson["normalization_type"] != "linear":
+			logWrite("Warning: Segment \"" + segment.filePath + "\" was normalized dynamically.")
+			job.segmentFallback = True
+
+
+def disableSegments(job):
+	# Segments normalized dynamically cannot be joined, all streams are normalized by the single pass encode instead
+	logWrite(
+		"Warning: Segmented normalization of \""
+		+ job.settings.seasonPath
+		+ job.settings.fileVideo
+		+ "\" is not linear, encoding in a single pass instead"
+	)
+
+	removeSegments(job)
+	job.segments = []
+
+	command = buildEncodeCommand(job, job.loudnessMeasurements)
+	logWrite("Executing command: " + " ".join(command))
+
+	return command
+
+
+def runSegments(job):
+	onSegmentFinished = getSegmentProgressCallback(job)
+
+	def runSegment(segment):
+		# Remaining segments are useless once the episode falls back to a single pass
+		if job.segmentFallback:
+			return
+
+		process, processOutJson = runFfmpeg(
+			buildSegmentCommand(job, segment, job.loudnessMeasurements[segment.idxStreamOut]),
+			None,
+			lambda progress: None,
+			job.ffmpegLogFile,
+			job.telemetry
+		)
+
+		checkSegment(job, segment, process, processOutJson)
+		onSegmentFinished()
+
+	with ThreadPool(max(MAX_THREADS_SEGMENT, 1)) as segmentPool:
+		segmentPool.map(runSegment, job.segments)
+
+
+async def runSegmentsAsync(job):
+	onSegmentFinished = getSegmentProgressCallback(job)
+	semaphore = asyncio.Semaphore(max(MAX_THREADS_SEGMENT, 1))
+
+	async def runSegment(segment):
+		async with semaphore:
+			# Remaining segments are useless once the episode falls back to a single pass
+			if job.segmentFallback:
+				return
+
+			process, processOutJson = await runFfmpegAsync(
+				buildSegmentCommand(job, segment, job.loudnessMeasurements[segment.idxStreamOut]),
+				None,
+				lambda progress: None,
+				job.ffmpegLogFile,
+				job.telemetry
+			)
+
+		checkSegment(job, segment, process, processOutJson)
+		onSegmentFinished()
+
+	await asyncio.gather(*[runSegment(segment) for segment in job.segments])
+
+
+def buildEncodeCommand(job, loudnessMeasurements):
+	ep = job.settings
+
+	# File paths
+	audioFilePath = job.audioFilePath
+	videoFilePath = job.videoFilePath
+	episodeFullTitle = job.episodeFullTitle
+	partialVideoFilePath = getPartialFilePath(job.convertedVideoFilePath)
+
+	infoVideo = job.infoVideo
+	infoAudio = job.infoAudio
+
+	audioSpeed = job.audioSpeed
+	amountAudioStreams = job.amountAudioStreams
+	amountSubtitleStreams = job.amountSubtitleStreams
+
+	copiedStreams = getCopiedAudioStreams(job, loudnessMeasurements)
+	segmentedStreams = getSegmentedStreams(job, loudnessMeasurements)
+
+	command = [
+		ffmpeg,
+		"-hide_banner",			# Hide start info
+		"-nostats",				# Progress is read from the progress pipe
+		"-progress",			# Write machine readable progress to stdout
+		"pipe:1",
+		"-y"					# Overwrite existing files
+	]
+
+	# Set codecs for all audio streams in first input file
+	# FDK AAC seams to be bugged as decoder (removes silence and sets timestamps, but fails for the english audio)
+	# for idxStream in range(amountAudioStreams[0]):
+	# 	command.append("-c:a:" + str(idxStream))
+	# 	command.append(audioCodecs[idxStream])
+
+	command.extend([
+		"-i",					# Input video
+		videoFilePath,
+	])
+
+	# Set codecs for all audio streams in second input file
+	# FDK AAC seams to be bugged as decoder (removes silence and sets timestamps, but fails for the english audio)
+	# for idxStream in range(amountAudioStreams[1]):
+	# 	command.append("-c:a:" + str(idxStream))
+	# 	command.append(audioCodecs[idxStream + amountAudioStreams[0]])
+
+	command.extend([
+		"-ss",					# Skip specified time in next input file
+		ep.audioStart,
+		"-i",					# Input audio
+		audioFilePath
+	])
+
+	# Streams normalized in segments are read from the joined segments
+	for idxStreamOut in segmentedStreams:
+		command.extend([
+			"-f",				# Join segments without decoding
+			"concat",
+			"-i",				# Input list of segments
+			getSegmentListPath(job, idxStreamOut)
+		])
+
+	# Filter all audio streams of the two input files
+	# File 1: Video + Original Audio
+	# File 2: Audio to be added
+	filterStr = ""
+	filteredStreams = []
+	for idxFile in range(0 if enableNormalization else 1, 2):
+		for idxStream in range(amountAudioStreams[idxFile]):
+			idxStreamOut = idxFile * amountAudioStreams[0] + idxStream
+			if idxStreamOut in copiedStreams:
+				continue
+			streamFilterStr = ""
+			if idxStreamOut in segmentedStreams:
+				inputStr = "[" + str(2 + segmentedStreams.index(idxStreamOut)) + ":a:0]"
+			else:
+				inputStr = "[" + str(idxFile) + ":a:" + str(idxStream) + "]"
+				if enableNormalization:
+					streamFilterStr += buildLoudnormFilter(loudnessMeasurements[idxStreamOut])
+					if trim_before_resample:
+						streamFilterStr += ",atrim=duration=" + str(getTrimDuration(job, idxStreamOut))
+					streamFilterStr += ","
+					streamFilterStr += buildResampleFilter(infoAudio[idxStreamOut].samplerate)
+					streamFilterStr += ","
+			if idxFile == 1:
+				if audioSpeed != 1:
+					streamFilterStr += "atempo="			+ str(audioSpeed)
+					streamFilterStr += ","
+				if timeStringToSeconds(ep.audioOffset) > 0:
+					streamFilterStr += "adelay=delays="	+ str(int(timeStringToSeconds(ep.audioOffset) * 1000))
+					streamFilterStr += ":all=true"
+			if streamFilterStr == "":
+				continue
+			if streamFilterStr[-1] == ",":
+				streamFilterStr = streamFilterStr[:-1]
+			filterStr += inputStr + streamFilterStr
+			filterStr += "[out"						+ str(idxStreamOut)
+			filterStr += "];"
+			filteredStreams.append(idxStreamOut)
+
+	# Remove last ';'
+	filterStr = filterStr[:-1]
+
+	# Add filter to command
+	if filterStr != "":
+		command.extend([
+			"-filter_complex",  # Apply complex filter
+			filterStr
+		])
+
+	# Set audio codec, profile and bitrate
+	for idxFile in range(2):
+		for idxStream in range(amountAudioStreams[idxFile]):
+			idxStreamOut = idxFile * amountAudioStreams[0] + idxStream
+			command.append("-c:a:" + str(idxStreamOut))
+
+			encoder = None
+			profile = None
+			bitrate = None
+
+			if (idxFile == 0 and not enableNormalization) or idxStreamOut in copiedStreams:
+				encoder = "copy"
+			else:
+				encoder = getAudioEncoder(infoAudio[idxStreamOut].codec)
+				profile = getAudioEncoderProfile(infoAudio[idxStreamOut].codec, infoAudio[idxStreamOut].profile)
+				bitrate = getNearestValidBitrate(infoAudio[idxStreamOut].bitrate)
+
+			command.append(encoder)
+
+			if profile is not None:
+				command.append("-profile:a:" + str(idxStreamOut))
+				command.append(profile)
+
+			if bitrate is not None:
+				command.append("-b:a:" + str(idxStreamOut))
+				command.append(str(bitrate))
+
+	command.extend([
+		"-c:v",					# Copy video
+		"copy",
+		"-c:s",					# Copy subtitles
+		"copy",
+		"-map",					# Map video from first input file to output
+		"0:v"
+	])
+
+	# Map all filtered audio and corresponding metadata to output
+	for idxFile in range(2):
+		for idxStream in range(amountAudioStreams[idxFile]):
+			idxStreamOut = idxFile * amountAudioStreams[0] + idxStream
+			command.append("-map")
+			if idxStreamOut in filteredStreams:
+				command.append("[out" + str(idxStreamOut) + "]")
+			elif idxStreamOut in segmentedStreams:
+				command.append(str(2 + segmentedStreams.index(idxStreamOut)) + ":a:0")
+			else:
+				command.append(str(idxFile) + ":a:" + str(idxStream))
+			command.append("-map_metadata:s:a:" + str(idxStreamOut))
+			command.append(str(idxFile) + ":s:a:" + str(idxStream))
+
+	# Map all subtitle streams to output
+	for idxFile in range(2):
+		for idxStream in range(amountSubtitleStreams[idxFile]):
+			idxStreamOut = idxFile * amountAudioStreams[0] + idxStream
+			command.append("-map")
+			command.append(str(idxFile) + ":s:" + str(idxStream))
+			command.append("-map_metadata:s:s:" + str(idxStreamOut))
+			command.append(str(idxFile) + ":s:s:" + str(idxStream))
+
+	command.extend([
+		"-map_metadata:g",			# Map global metadata to output
+		"0:g",
+		"-max_interleave_delta",	# Needed for use with subtitles, otherwise audio has buffering issues
+		"0"
+	])
+
+	# Assume the first audio stream is english if not specified
+	if amountAudioStreams[0] > 0:
+		lang = infoAudio[0].language
+		if lang is None or lang == "" or lang == "und":
+			infoAudio[0].language = "eng"
+
+	# Assume the second audio stream is german if not specified
+	if amountAudioStreams[1] > 0:
+		lang = infoAudio[amountAudioStreams[0]].language
+		if lang is None or lang == "" or lang == "und":
+			infoAudio[amountAudioStreams[0]].language = "deu"
+
+	# Set audio languages
+	for idxStream in range(amountAudioStreams[0]):
+		lang = infoAudio[idxStream].language
+		if lang is not None and lang != "":
+			command.append("-metadata:s:a:" + str(idxStream))
+			command.append("language=" + lang)
+
+	for idxStream in range(amountAudioStreams[1]):
+		lang = infoAudio[idxStream + amountAudioStreams[0]].language
+		if lang is not None and lang != "":
+			command.append("-metadata:s:a:" + str(idxStream + amountAudioStreams[0]))
+			command.append("language=" + lang)
+
+	# Mark all original subtitle streams as english
+	# for idxStream in range(amountSubtitleStreams[0]):
+	# 	command.append("-metadata:s:s:" + str(idxStream))
+	# 	command.append("language=eng")
+
+	# Mark all additional subtitle streams as german
+	# for idxStream in range(amountSubtitleStreams[1]):
+	# 	command.append("-metadata:s:s:" + str(idxStream + amountSubtitleStreams[0]))
+	# 	command.append("language=deu")
+
+	# Move MOOV-Atom to the beginning of the file for faster playback
+	command.extend([
+		"-movflags",
+		"+faststart"
+	])
+
+
+	command.extend([
+		"-metadata",					# Set title
+		"title=" + episodeFullTitle,
+		"-t",							# Duration of video to correctly truncate audio
+		secondsToTimeString(infoVideo.duration),
+		partialVideoFilePath			# Output video (renamed after ffmpeg finished successfully)
+	])
+
+	return command
+
+
+def beginEncode(job):
+	convertedVideoFilePath = job.convertedVideoFilePath
 
 	# Check if output folder exists and create it if it doesn't
-	if not os.path.isdir(outputPath + seasonPath):
-		os.makedirs(outputPath + seasonPath)
+	if not os.path.isdir(os.path.dirname(convertedVideoFilePath)):
+		os.makedirs(os.path.dirname(convertedVideoFilePath), exist_ok = True)
+
+	command = buildEncodeCommand(job, job.loudnessMeasurements)
+
+	job.segments = createSegments(job, job.loudnessMeasurements)
+
+	if job.segments:
+		writeSegmentLists(job)
+
+		logWrite(
+			"Normalizing "
+			+ str(len(set(segment.idxStreamOut for segment in job.segments)))
+			+ " audio streams of \""
+			+ job.settings.seasonPath
+			+ job.settings.fileVideo
+			+ "\" in "
+			+ str(len(job.segments))
+			+ " segments"
+		)
+
+	for idxStreamOut in getCopiedAudioStreams(job, job.loudnessMeasurements):
+		if idxStreamOut < job.amountAudioStreams[0]:
+			streamStr = "Audio stream " + str(idxStreamOut) + " in file \"" + job.videoFilePath + "\""
+		else:
+			streamStr = "Audio stream " + str(idxStreamOut - job.amountAudioStreams[0]) + " in file \"" + job.audioFilePath + "\""
+
+		logWrite(streamStr + " is already within loudness tolerance and is copied.")
+
+	commandStr = ""
+
+	for elem in command:
+		commandStr += elem
+		commandStr += ' '
+
+	logWrite("Executing command: " + commandStr)
+
+	return command
+
+
+def getEncodeFilePaths(job):
+	# Files read and written by the encoding
+	return [job.videoFilePath, job.audioFilePath, getPartialFilePath(job.convertedVideoFilePath)]
+
 
-	# Loop over all episodes within one season
-	for episode in season.find("Episodes").findall("Episode"):
-		# Check if only specific episodes should be processed
+def getEncodeProgressCallback(job):
+	# Progress of streams normalized in segments is counted by the segments
+	amountSegmentedStreams = len(set(segment.idxStreamOut for segment in job.segments))
+
+	return getProgressBarCallback(
+		job.progressBar,
+		(job.amountAudioStreams[0] * int(enableNormalization) + job.amountAudioStreams[1] - amountSegmentedStreams) * progressAudioEncode
+	)
+
+
+def finishEncode(job, process, processOutJson):
+	ep = job.settings
+
+	# File paths
+	audioFilePath = job.audioFilePath
+	videoFilePath = job.videoFilePath
+	convertedVideoFilePath = job.convertedVideoFilePath
+	partialVideoFilePath = getPartialFilePath(convertedVideoFilePath)
+
+	amountAudioStreams = job.amountAudioStreams
+
+	# Check exit code
+	if process.returncode:
+		# Remove incomplete output
+		if os.path.exists(partialVideoFilePath):
+			os.remove(partialVideoFilePath)
+
+		errorCritical(
+			"Failed to add audio track \""
+			+ ep.seasonPath
+			+ ep.fileAudio
+			+ "\" to video file \""
+			+ ep.seasonPath
+			+ ep.fileVideo
+			+ "\"!"
+		)
+
+	# Output is complete, replace output of previous runs and record it in the manifest
+	os.replace(partialVideoFilePath, convertedVideoFilePath)
+	recordEpisodeFinished(job)
+
+	# Check if linear normalization was successful
+	if enableNormalization:
+		# Copied streams and streams normalized in segments are not passed through loudnorm
+		skippedStreams = getCopiedAudioStreams(job, job.loudnessMeasurements) + getSegmentedStreams(job, job.loudnessMeasurements)
+		normalizedStreams = [
+			idxStream for idxStream in range(amountAudioStreams[0] + amountAudioStreams[1]) if idxStream not in skippedStreams
+		]
+
+		for idxStream, outJson in zip(normalizedStreams, processOutJson):
+			if outJson["normalization_type"] != "linear":
+				if idxStream < amountAudioStreams[0]:
+					logWrite(
+						"Warning: "
+						+ "Audio stream "
+						+ str(idxStream)
+						+ " in file \"" + videoFilePath + "\""
+						+ " was normalized dynamically."
+					)
+				else:
+					logWrite(
+						"Warning: "
+						+ "Audio stream "
+						+ str(idxStream - amountAudioStreams[0])
+						+ " in file \"" + audioFilePath + "\""
+						+ " was normalized dynamically."
+					)
+
+	# Remove progress bar since episode is finished now
+	job.closeProgressBar()
+
+
+def encodeEpisode(job):
+	# Output of a previous run is still valid
+	if job.skipped:
+		return
+
+	command = beginEncode(job)
+
+	job.telemetry.beginStage("wait")
+
+	reservation = volumeScheduler.acquire(getEncodeFilePaths(job), getDiskPosition(job.videoFilePath))
+
+	try:
+		if job.segments:
+			job.telemetry.beginStage("segments")
+			runSegments(job)
+
+			if job.segmentFallback:
+				command = disableSegments(job)
+
+		# Add additional audio track with offset, speed adjustment and normalize loudness of all audio tracks
+		job.telemetry.beginStage("encode")
+
+		process, processOutJson = runFfmpeg(
+			command,
+			job.infoVideo.duration,
+			getEncodeProgressCallback(job),
+			job.ffmpegLogFile,
+			job.telemetry
+		)
+	finally:
+		volumeScheduler.release(reservation)
+		removeSegments(job)
+
+	job.telemetry.beginStage("finish")
+
+	finishEncode(job, process, processOutJson)
+
+	job.telemetry.endStage()
+
+
+def processEpisode(ep):
+	job = EpisodeJob(ep)
+	startTime = time.monotonic()
+	status = "failed"
+
+	try:
+		analyzeEpisode(job)
+		encodeEpisode(job)
+		status = "skipped" if job.skipped else "finished"
+	finally:
+		job.closeProgressBar()
+		job.processingTime = time.monotonic() - startTime
+		recordTelemetry(job, status)
+		coreBudget.finishEpisode()
+		logWriter.close(job.ffmpegLogFile)
+
+	return job
+
+
+async def probeEpisodeAsync(job, semaphores):
+	job.telemetry.beginStage("probe")
+
+	# Missing files are reported by probeEpisode
+	for filePath in [job.videoFilePath, job.audioFilePath]:
+		if os.path.exists(filePath):
+			async with semaphores["ffprobe"]:
+				job.probeResults[filePath] = await probeFileAsync(filePath)
+
+
+async def analyzeEpisodeAsync(job, semaphores):
+	# Cache lookups and the run manifest read files, blocking calls are moved off the event loop
+	await asyncio.to_thread(beginAnalysis, job)
+
+	if not enableNormalization or job.skipped or not job.missingStreams:
+		return
+
+	job.telemetry.beginStage("wait")
+
+	reservation = await volumeScheduler.acquireAsync([job.videoFilePath, job.audioFilePath], getDiskPosition(job.videoFilePath))
+
+	try:
+		job.telemetry.beginStage("analysis")
+
+		if loudnessEngine == "numpy":
+			# NumPy engine processes chunks in its own thread pool, only waiting for it is moved off the event loop
+			measuredValues = await asyncio.to_thread(measureLoudness, job)
+		else:
+			command = buildLoudnessCommand(job, job.missingStreams, job.loudnessInputFiles)
+
+			logWrite("Executing command: " + " ".join(command))
+
+			process, processOutJson = await runFfmpegAsync(
+				command,
+				job.infoVideo.duration,
+				getProgressBarCallback(job.progressBar, len(job.missingStreams) * progressAudioEncode),
+				job.ffmpegLogFile,
+				job.telemetry
+			)
+
+			measuredValues = getLoudnessOutput(job, job.missingStreams, process, processOutJson)
+	finally:
+		await asyncio.to_thread(volumeScheduler.release, reservation)
+
+	async with semaphores["io"]:
+		await asyncio.to_thread(finishAnalysis, job, measuredValues)
+
+	job.telemetry.endStage()
+
+
+async def encodeEpisodeAsync(job, semaphores):
+	# Output of a previous run is still valid
+	if job.skipped:
+		return
+
+	command = await asyncio.to_thread(beginEncode, job)
+
+	job.telemetry.beginStage("wait")
+
+	reservation = await volumeScheduler.acquireAsync(getEncodeFilePaths(job), getDiskPosition(job.videoFilePath))
+
+	try:
+		if job.segments:
+			job.telemetry.beginStage("segments")
+			await runSegmentsAsync(job)
+
+			if job.segmentFallback:
+				command = await asyncio.to_thread(disableSegments, job)
+
+		job.telemetry.beginStage("encode")
+
+		process, processOutJson = await runFfmpegAsync(
+			command,
+			job.infoVideo.duration,
+			getEncodeProgressCallback(job),
+			job.ffmpegLogFile,
+			job.telemetry
+		)
+	finally:
+		await asyncio.to_thread(volumeScheduler.release, reservation)
+		await asyncio.to_thread(removeSegments, job)
+
+	return process, processOutJson
+
+
+def runAsync(episodeList, onFinished):
+	async def processEpisodeAsync(ep, semaphores):
+		job = EpisodeJob(ep)
+		startTime = time.monotonic()
+		status = "failed"
+
+		try:
+			# Probing does not wait for running encodes
+			await probeEpisodeAsync(job, semaphores)
+
+			job.telemetry.beginStage("wait")
+
+			# Analysis and encoding of one episode share one ffmpeg slot
+			async with semaphores["ffmpeg"]:
+				await analyzeEpisodeAsync(job, semaphores)
+				encodeResult = await encodeEpisodeAsync(job, semaphores)
+
+			if encodeResult is not None:
+				job.telemetry.beginStage("finish")
+
+				async with semaphores["io"]:
+					await asyncio.to_thread(finishEncode, job, *encodeResult)
+
+			job.processingTime = time.monotonic() - startTime
+			status = "skipped" if job.skipped else "finished"
+			onFinished(job)
+		except Exception as e:
+			logWrite("Error: Processing of \"" + ep.seasonPath + ep.fileVideo + "\" failed! Exception: " + str(e))
+		finally:
+			job.closeProgressBar()
+			recordTelemetry(job, status)
+			coreBudget.finishEpisode()
+			logWriter.close(job.ffmpegLogFile)
+
+	async def processEpisodes():
+		# Semaphores have to be created inside the event loop
+		semaphores = {
+			"ffmpeg":	asyncio.Semaphore(max(ASYNC_MAX_FFMPEG, 1)),
+			"ffprobe":	asyncio.Semaphore(max(ASYNC_MAX_FFPROBE, 1)),
+			"io":		asyncio.Semaphore(max(ASYNC_MAX_IO, 1))
+		}
+
+		# Episodes are started in the given order, waiting for a semaphore keeps that order
+		await asyncio.gather(*[processEpisodeAsync(ep, semaphores) for ep in episodeList])
+
+	asyncio.run(processEpisodes())
+
+
+def estimateEpisodeCost(ep):
+	job = EpisodeJob(ep)
+	duration = 0.0
+	channels = [0, 0]
+
+	# Probe results are cached, analysis of the episode does not need to probe again
+	for idxFile, filePath in enumerate([job.videoFilePath, job.audioFilePath]):
+		for stream in probeFile(filePath)["streams"]:
+			if "tags" in stream:
+				for tag in ["DURATION", "DURATION-eng"]:
+					if tag in stream["tags"]:
+						duration = max(duration, timeStringToSeconds(stream["tags"][tag]))
+
+			if stream["codec_type"] == "audio" and "channels" in stream:
+				channels[idxFile] += int(stream["channels"])
+
+	# Original audio is only processed with normalization enabled
+	cost = duration * channels[1] * costEncodePerChannelSecond
+
+	if enableNormalization:
+		cost += duration * (channels[0] + channels[1]) * costAnalysisPerChannelSecond
+		cost += duration * channels[0] * costEncodePerChannelSecond
+
+	return costPerEpisode + cost
+
+
+def estimateMakespan(costs, workers):
+	# Simulate assignment of jobs (in the given order) to the next free worker
+	workerTimes = [0.0] * max(workers, 1)
+
+	for cost in costs:
+		heapq.heappush(workerTimes, heapq.heappop(workerTimes) + cost)
+
+	return max(workerTimes)
+
+
+def scheduleEpisodes(episodeList):
+	def estimate(ep):
+		try:
+			ep.estimatedCost = estimateEpisodeCost(ep)
+		except Exception as e:
+			# Missing or broken files are reported when the episode is processed
+			logWrite("Warning: Could not estimate processing time of \"" + ep.seasonPath + ep.fileVideo + "\"! Exception: " + str(e))
+			ep.estimatedCost = costPerEpisode
+
+	# Probing is I/O bound, probe all files in parallel
+	with ThreadPool(max(MAX_THREADS, MAX_THREADS_ANALYSIS, 1)) as probePool:
+		probePool.map(estimate, episodeList)
+
+	if enableAsyncRunner:
+		workers = max(ASYNC_MAX_FFMPEG, 1)
+	else:
+		workers = MAX_THREADS if enablePipeline or MAX_THREADS > 1 else 1
+	predictedMakespanXml = estimateMakespan([ep.estimatedCost for ep in episodeList], workers)
+
+	# Longest processing time first
+	episodeList = sorted(episodeList, key = lambda ep: ep.estimatedCost, reverse = True)
+	predictedMakespan = estimateMakespan([ep.estimatedCost for ep in episodeList], workers)
+
+	logWrite(
+		"Predicted batch time: "
+		+ secondsToTimeString(predictedMakespan)
+		+ " (XML order: "
+		+ secondsToTimeString(predictedMakespanXml)
+		+ ")"
+	)
+
+	return episodeList, predictedMakespan
+
+
+def runPipeline(episodeList, onFinished):
+	# Episodes waiting for analysis
+	analysisQueue = queue.Queue()
+
+	for ep in episodeList:
+		analysisQueue.put(ep)
+
+	# Analyzed episodes waiting for encoding (bounded, analysis waits if encoding falls behind)
+	encodeQueue = queue.Queue(maxsize = max(PIPELINE_QUEUE_SIZE, 1))
+
+	def analysisWorker():
+		while True:
+			try:
+				ep = analysisQueue.get_nowait()
+			except queue.Empty:
+				return
+
+			job = EpisodeJob(ep)
+			startTime = time.monotonic()
+
+			try:
+				analyzeEpisode(job)
+			except Exception as e:
+				logWrite("Error: Analysis of \"" + ep.seasonPath + ep.fileVideo + "\" failed! Exception: " + str(e))
+				job.closeProgressBar()
+				recordTelemetry(job, "failed")
+				coreBudget.finishEpisode()
+				logWriter.close(job.ffmpegLogFile)
+				continue
+			finally:
+				job.processingTime += time.monotonic() - startTime
+
+			# Time waiting for a free encoding thread
+			job.telemetry.beginStage("queue")
+
+			encodeQueue.put(job)
+
+	def encodeWorker():
+		while True:
+			job = encodeQueue.get()
+
+			# Analysis stage finished
+			if job is None:
+				return
+
+			startTime = time.monotonic()
+			status = "failed"
+
+			try:
+				job.telemetry.endStage()
+				encodeEpisode(job)
+				job.processingTime += time.monotonic() - startTime
+				status = "skipped" if job.skipped else "finished"
+				onFinished(job)
+			except Exception as e:
+				logWrite("Error: Encoding of \"" + job.settings.seasonPath + job.settings.fileVideo + "\" failed! Exception: " + str(e))
+			finally:
+				job.closeProgressBar()
+				recordTelemetry(job, status)
+				coreBudget.finishEpisode()
+				logWriter.close(job.ffmpegLogFile)
+
+	analysisThreads = [threading.Thread(target = analysisWorker) for _ in range(max(MAX_THREADS_ANALYSIS, 1))]
+	encodeThreads = [threading.Thread(target = encodeWorker) for _ in range(max(MAX_THREADS, 1))]
+
+	for thread in analysisThreads + encodeThreads:
+		thread.start()
+
+	for thread in analysisThreads:
+		thread.join()
+
+	# Stop encoding threads after all remaining episodes are encoded
+	for _ in encodeThreads:
+		encodeQueue.put(None)
+
+	for thread in encodeThreads:
+		thread.join()
+
+
+def parseEpisodeSettings(showName, showInputPath, showOutputPath):
+	# Get root element of XML file
+	root_node = ET.parse(showInputPath + "info.xml").getroot()
+
+	# Get show prefix for output file name from XML
+	prefixShow = ""
+
+	if root_node.find("PrefixShow") is not None:
+		prefixShow = root_node.find("PrefixShow").text
+
+	if prefixShow is None:
+		prefixShow = ""
+
+	showTitleLanguage = titleLanguage
+
+	if root_node.find("TitleLanguage") is not None:
+		showTitleLanguage = root_node.find("TitleLanguage").text
+
+	# Get video and audio file paths from XML
+	show = SettingsShow(
+		showName,
+		showInputPath,
+		showOutputPath,
+		root_node.find("FilePathVideo").text,
+		root_node.find("FilePathAudio").text,
+		prefixShow,
+		showTitleLanguage
+	)
+
+	# List containing settings for each episode in this season
+	episodeSettings = []
+
+	# Partial file names to resolve: [index of episode, attribute, directory, part of file name]
+	fileResolutions = []
+
+	# Loop over all seasons in XML file
+	for season in root_node.findall("Season"):
+		# Check if only specific seasons should be processed
 		skip = False
-		if episodes:
+		if seasons:
 			skip = True
-			# Check if episode was specified to be processed
-			for episodeNumber in episodes:
+			# Check if season was specified to be processed
+			for seasonNumber in seasons:
 				prefix = ""
 
-				if episode.find("PrefixEpisode"):
-					prefix = episode.find("PrefixEpisode").text
+				if season.find("PrefixSeason") is not None:
+					prefix = season.find("PrefixSeason").text
+
+				if prefix is None:
+					prefix = ""
 
-				if episodeNumber in prefix:
+				if seasonNumber in prefix:
 					skip = False
 
 		if skip:
 			continue
 
-		audioStart = timeStringToSeconds(season.find("AudioStart").text)
-		audioDelay = timeStringToSeconds(episode.find("AudioOffset").text)
-		videoFile = ""
-		audioFile = ""
+		# Get path for season
+		seasonPath = season.find("FilePathSeason").text
 
-		if episode.find("FileNameVideo"):
-			videoFile = episode.find("FileNameVideo").text
-		else:
-			dirList = os.listdir(inputPath + videoPath + seasonPath)
-			videoFile = listSearch(dirList, episode.find("FileNameVideoContains").text)
+		# Loop over all episodes within one season
+		for episode in season.find("Episodes").findall("Episode"):
+			# Check if only specific episodes should be processed
+			skip = False
+			if episodes:
+				skip = True
+				# Check if episode was specified to be processed
+				for episodeNumber in episodes:
+					prefix = ""
 
-		if episode.find("FileNameAudio"):
-			audioFile = episode.find("FileNameAudio").text
-		else:
-			dirList = os.listdir(inputPath + audioPath + seasonPath)
-			audioFile = listSearch(dirList, episode.find("FileNameAudioContains").text)
+					if episode.find("PrefixEpisode"):
+						prefix = episode.find("PrefixEpisode").text
 
-		if audioDelay < 0:
-			audioStart += abs(audioDelay)
-			audioDelay = 0
+					if episodeNumber in prefix:
+						skip = False
+
+			if skip:
+				continue
+
+			audioStart = timeStringToSeconds(season.find("AudioStart").text)
+			audioDelay = timeStringToSeconds(episode.find("AudioOffset").text)
+			videoFile = ""
+			audioFile = ""
+
+			# Partial file names are resolved for all episodes at once after parsing
+			if episode.find("FileNameVideo"):
+				videoFile = episode.find("FileNameVideo").text
+			else:
+				fileResolutions.append([
+					len(episodeSettings),
+					"fileVideo",
+					show.inputPath + show.videoPath + seasonPath,
+					episode.find("FileNameVideoContains").text
+				])
 
-		prefixSeason = ""
+			if episode.find("FileNameAudio"):
+				audioFile = episode.find("FileNameAudio").text
+			else:
+				fileResolutions.append([
+					len(episodeSettings),
+					"fileAudio",
+					show.inputPath + show.audioPath + seasonPath,
+					episode.find("FileNameAudioContains").text
+				])
 
-		if season.find("PrefixSeason") is not None:
-			prefixSeason = season.find("PrefixSeason").text
+			if audioDelay < 0:
+				audioStart += abs(audioDelay)
+				audioDelay = 0
 
-		if prefixSeason is None:
 			prefixSeason = ""
 
-		prefixEpisode = ""
+			if season.find("PrefixSeason") is not None:
+				prefixSeason = season.find("PrefixSeason").text
 
-		if episode.find("PrefixEpisode") is not None:
-			prefixEpisode = episode.find("PrefixEpisode").text
+			if prefixSeason is None:
+				prefixSeason = ""
 
-		if prefixEpisode is None:
 			prefixEpisode = ""
 
-		audio_fps = 0
-
-		if episode.find("AudioFPS") is not None:
-			audio_fps = float(episode.find("AudioFPS").text)
-		elif season.find("AudioFPS") is not None:
-			audio_fps = float(season.find("AudioFPS").text)
-		elif root_node.find("AudioFPS") is not None:
-			audio_fps = float(root_node.find("AudioFPS").text)
-
-		episodeSettings.append(SettingsEpisode(
-			seasonPath,
-			videoFile,
-			audioFile,
-			episode.find("TitleDE").text,
-			episode.find("TitleEN").text,
-			prefixSeason + prefixEpisode,
-			secondsToTimeString(audioStart),
-			secondsToTimeString(audioDelay),
-			audio_fps
-		))
+			if episode.find("PrefixEpisode") is not None:
+				prefixEpisode = episode.find("PrefixEpisode").text
+
+			if prefixEpisode is None:
+				prefixEpisode = ""
+
+			audio_fps = 0
+
+			if episode.find("AudioFPS") is not None:
+				audio_fps = float(episode.find("AudioFPS").text)
+			elif season.find("AudioFPS") is not None:
+				audio_fps = float(season.find("AudioFPS").text)
+			elif root_node.find("AudioFPS") is not None:
+				audio_fps = float(root_node.find("AudioFPS").text)
+
+			episodeSettings.append(SettingsEpisode(
+				show,
+				seasonPath,
+				videoFile,
+				audioFile,
+				episode.find("TitleDE").text,
+				episode.find("TitleEN").text,
+				prefixSeason + prefixEpisode,
+				secondsToTimeString(audioStart),
+				secondsToTimeString(audioDelay),
+				audio_fps
+			))
+
+	resolveFileNames(episodeSettings, fileResolutions)
+
+	return episodeSettings
+
+
+def discoverShows():
+	showList = []
+
+	for dirPath, dirNames, fileNames in os.walk(inputPathRoot):
+		if "info.xml" not in fileNames:
+			dirNames.sort()
+			continue
+
+		showName = os.path.relpath(dirPath, inputPathRoot)
+
+		if showName == os.curdir:
+			showName = ""
+
+		showList.append([
+			showName,
+			os.path.join(dirPath, ""),
+			os.path.join(outputPathRoot, showName, "")
+		])
+
+		# Season folders of a show do not contain further shows
+		dirNames.clear()
+
+	return showList
+
+
+def parseLibrary():
+	showList = discoverShows()
+
+	def parseShow(showSettings):
+		try:
+			return parseEpisodeSettings(*showSettings)
+		except Exception as e:
+			logWrite("Error: Could not read \"" + showSettings[1] + "info.xml\"! Exception: " + str(e))
+			return []
+
+	# Reading info.xml and listing the season folders is I/O bound, parse all shows in parallel
+	with ThreadPool(max(MAX_THREADS_PARSE, 1)) as parsePool:
+		showEpisodes = parsePool.map(parseShow, showList)
+
+	episodeSettings = [ep for episodeList in showEpisodes for ep in episodeList]
+
+	for showSettings, episodeList in zip(showList, showEpisodes):
+		logWrite("Show \"" + showSettings[0] + "\": " + str(len(episodeList)) + " episodes")
+
+	logWrite(
+		"Library \""
+		+ inputPathRoot
+		+ "\": "
+		+ str(len(showList))
+		+ " shows, "
+		+ str(len(episodeSettings))
+		+ " episodes"
+	)
+
+	return episodeSettings
+
+
+def recordTelemetry(job, status):
+	if not enableTelemetry:
+		return
+
+	telemetry = job.telemetry
+	telemetry.endStage()
+
+	# Values of child processes are only known with psutil
+	record = {
+		"time":				datetime.now().isoformat(timespec = "seconds"),
+		"show":				job.settings.show.name,
+		"episode":			job.settings.seasonPath + job.settings.fileVideo,
+		"status":			status,
+		"stages":			{stage: round(seconds, 3) for stage, seconds in telemetry.stages.items()},
+		"cpuTime":			{stage: round(seconds, 3) for stage, seconds in telemetry.cpuTime.items()} if psutil is not None else None,
+		"peakRss":			telemetry.peakRss if psutil is not None else None,
+		"readBytes":		telemetry.readBytes if psutil is not None else None,
+		"writeBytes":		telemetry.writeBytes if psutil is not None else None,
+		"processes":		telemetry.amountProcesses
+	}
+
+	with telemetryLock:
+		telemetryRecords.append(record)
+
+	logWriter.write(telemetryFile, json.dumps(record))
+
+
+def getPercentile(values, fraction):
+	# Nearest rank
+	values = sorted(values)
+	return values[max(math.ceil(fraction * len(values)) - 1, 0)]
+
+
+def logTelemetrySummary():
+	if not enableTelemetry or not telemetryRecords:
+		return
+
+	logWrite("Telemetry of " + str(len(telemetryRecords)) + " episodes written to \"" + telemetryFile + "\"")
+
+	stages = []
+
+	for record in telemetryRecords:
+		stages.extend(stage for stage in record["stages"] if stage not in stages)
+
+	for stage in stages:
+		times = [record["stages"][stage] for record in telemetryRecords if stage in record["stages"]]
+		summary = (
+			"Stage \""
+			+ stage
+			+ "\": total "
+			+ secondsToTimeString(sum(times))
+			+ ", p50 "
+			+ secondsToTimeString(getPercentile(times, 0.5))
+			+ ", p95 "
+			+ secondsToTimeString(getPercentile(times, 0.95))
+		)
+
+		if psutil is not None:
+			summary += ", CPU time " + secondsToTimeString(sum(record["cpuTime"].get(stage, 0.0) for record in telemetryRecords))
+
+		logWrite(summary)
+
+	if psutil is not None:
+		logWrite(
+			"Child processes: read "
+			+ f"{sum(record['readBytes'] for record in telemetryRecords) / 1000 ** 3:.2f}"
+			+ " GB, written "
+			+ f"{sum(record['writeBytes'] for record in telemetryRecords) / 1000 ** 3:.2f}"
+			+ " GB, peak memory "
+			+ f"{max(record['peakRss'] for record in telemetryRecords) / 1000 ** 2:.0f}"
+			+ " MB"
+		)
+
+
+def verifySync(filePaths):
+	if verify_sync is None:
+		logWrite("Warning: numpy is not installed, sync verification is skipped")
+		return
+
+	# Same tools as for the encoding
+	verify_sync.ffmpeg = ffmpeg
+	verify_sync.ffprobe = ffprobe
+
+	logWrite("Verifying sync of " + str(len(filePaths)) + " files...")
+
+	results = verify_sync.verifyFiles(filePaths)
+
+	for result in results:
+		logWrite("Sync " + verify_sync.formatResult(result))
+
+	verify_sync.writeReport(results, syncReportFile)
+
+
+def runBatch(episodeList, predictedMakespan):
+	batchStartTime = time.monotonic()
+	episodeSettings = list(episodeList)
+
+	progressBarTotal = tqdm(desc = "Processing Episodes", total = len(episodeSettings))
+
+	# Output files written by this batch
+	finishedFiles = []
+
+	def onEpisodeFinished(job):
+		progressBarTotal.update(1)
+
+		if job is not None and not job.skipped:
+			finishedFiles.append(job.convertedVideoFilePath)
+
+		if job is not None and job.settings.estimatedCost is not None and not job.skipped:
+			logWrite(
+				"Processing time of \""
+				+ job.settings.seasonPath
+				+ job.settings.fileVideo
+				+ "\": estimated "
+				+ secondsToTimeString(job.settings.estimatedCost)
+				+ ", actual "
+				+ secondsToTimeString(job.processingTime)
+			)
+
+	pool = None
+	jobs = None
 
-progressBarTotal = tqdm(desc = "Processing Episodes", total = len(episodeSettings))
-updateProgressBarTotal = lambda a : progressBarTotal.update(1)
+	# Maximum number of ffmpeg processes running at the same time
+	if enableAsyncRunner:
+		ffmpegSlots = ASYNC_MAX_FFMPEG
+	elif enablePipeline:
+		ffmpegSlots = MAX_THREADS + (MAX_THREADS_ANALYSIS if enableNormalization else 0)
+	else:
+		ffmpegSlots = MAX_THREADS
+
+	coreBudget.begin(len(episodeSettings), ffmpegSlots)
 
-pool = None
-jobs = None
+	if enableAsyncRunner:
+		runAsync(episodeSettings, onEpisodeFinished)
+		episodeSettings = []
+	elif enablePipeline:
+		runPipeline(episodeSettings, onEpisodeFinished)
+		episodeSettings = []
+	elif MAX_THREADS > 1:
+		pool = ThreadPool(MAX_THREADS)
+		jobs = []
 
-if MAX_THREADS > 1:
-	pool = ThreadPool(MAX_THREADS)
-	jobs = []
+	while episodeSettings:
+		es = episodeSettings.pop(0)
 
-while episodeSettings:
-	es = episodeSettings.pop(0)
+		if pool is not None:
+			jobs.append(pool.apply_async(processEpisode, args = (es,), callback = onEpisodeFinished))
+		else:
+			onEpisodeFinished(processEpisode(es))
 
 	if pool is not None:
-		jobs.append(pool.apply_async(processEpisode, args = (es,), callback = updateProgressBarTotal))
+		pool.close()
+		pool.join()
+
+	volumeScheduler.report()
+	logTelemetrySummary()
+
+	if enableSyncVerification and finishedFiles:
+		verifySync(finishedFiles)
+
+	if predictedMakespan is not None:
+		logWrite(
+			"Batch time: predicted "
+			+ secondsToTimeString(predictedMakespan)
+			+ ", actual "
+			+ secondsToTimeString(time.monotonic() - batchStartTime)
+		)
+
+
+def estimateOutputSize(job):
+	duration = job.infoVideo.duration
+	size = os.path.getsize(job.videoFilePath)
+
+	for idxFile in range(2):
+		for idxStream in range(job.amountAudioStreams[idxFile]):
+			infoStream = job.infoAudio[idxFile * job.amountAudioStreams[0] + idxStream]
+
+			# Original audio is copied without normalization
+			if idxFile == 0 and not enableNormalization:
+				continue
+
+			if idxFile == 0:
+				size -= infoStream.bitrate * duration / 8
+
+			size += getNearestValidBitrate(infoStream.bitrate) * duration / 8
+
+	return int(size)
+
+
+def createPlan(episodeList, predictedMakespan):
+	shows = []
+	showIndex = {}
+
+	for ep in episodeList:
+		if id(ep.show) not in showIndex:
+			showIndex[id(ep.show)] = len(shows)
+			shows.append(vars(ep.show))
+
+	def planEpisode(ep):
+		job = EpisodeJob(ep)
+		entry = {
+			"show":			showIndex[id(ep.show)],
+			"settings":		{key: value for key, value in vars(ep).items() if key not in ["show", "estimatedCost"]},
+			"videoFile":	job.videoFilePath,
+			"audioFile":	job.audioFilePath
+		}
+
+		try:
+			probeEpisode(job)
+
+			entry["inputFingerprints"] = [getFileFingerprint(job.videoFilePath), getFileFingerprint(job.audioFilePath)]
+			entry["probe"] = [probeFile(job.videoFilePath), probeFile(job.audioFilePath)]
+			entry["outputFile"] = job.convertedVideoFilePath
+			entry["upToDate"] = job.skipped
+			entry["estimatedCpuTime"] = ep.estimatedCost if ep.estimatedCost is not None else estimateEpisodeCost(ep)
+			entry["estimatedOutputSize"] = estimateOutputSize(job)
+
+			commands = {"analysis": [], "encode": None}
+			loudnessMeasurements = None
+
+			if enableNormalization:
+				inputFiles, loudnessMeasurements, missingStreams = getCachedLoudness(job)
+
+				if missingStreams and loudnessEngine == "numpy":
+					for idxFile, idxStream in missingStreams:
+						infoStream = job.infoAudio[idxFile * job.amountAudioStreams[0] + idxStream]
+						commands["analysis"].append(buildPcmDecodeCommand(
+							inputFiles[idxFile][0],
+							idxStream,
+							inputFiles[idxFile][1],
+							infoStream.samplerate,
+							infoStream.channels
+						))
+				elif missingStreams:
+					commands["analysis"].append(buildLoudnessCommand(job, missingStreams, inputFiles))
+
+				# Values measured by the analysis are not known yet
+				loudnessMeasurements = [
+					measurement if measurement is not None else {key: "{" + key + "}" for key in LOUDNESS_MEASUREMENT_KEYS}
+					for measurement in loudnessMeasurements
+				]
+
+			commands["encode"] = buildEncodeCommand(job, loudnessMeasurements)
+			entry["commands"] = commands
+		except Exception as e:
+			entry["error"] = str(e)
+			logWrite("Error: Planning of \"" + ep.seasonPath + ep.fileVideo + "\" failed! Exception: " + str(e))
+
+		return entry
+
+	# Probing is I/O bound, plan all episodes in parallel
+	with ThreadPool(max(MAX_THREADS, MAX_THREADS_ANALYSIS, 1)) as planPool:
+		entries = planPool.map(planEpisode, episodeList)
+
+	return {
+		"script":				os.path.basename(__file__),
+		"created":				datetime.now().isoformat(timespec = "seconds"),
+		"shows":				shows,
+		"predictedBatchTime":	predictedMakespan,
+		"estimatedCpuTime":		sum(entry.get("estimatedCpuTime", 0) for entry in entries),
+		"estimatedOutputSize":	sum(entry.get("estimatedOutputSize", 0) for entry in entries),
+		"errors":				sum(1 for entry in entries if "error" in entry),
+		"episodes":				entries
+	}
+
+
+def writePlan(plan, planFilePath):
+	if os.path.dirname(planFilePath) != "":
+		os.makedirs(os.path.dirname(planFilePath), exist_ok = True)
+
+	with open(planFilePath, 'w', encoding = "utf-8") as fileHandle:
+		json.dump(plan, fileHandle, indent = "\t")
+
+	logWrite(
+		"Plan written to \""
+		+ planFilePath
+		+ "\": "
+		+ str(len(plan["episodes"]))
+		+ " episodes, "
+		+ str(plan["errors"])
+		+ " errors, estimated CPU time "
+		+ secondsToTimeString(plan["estimatedCpuTime"])
+		+ ", estimated output size "
+		+ f"{plan['estimatedOutputSize'] / 1024 ** 3:.2f}"
+		+ " GiB"
+	)
+
+
+def loadPlan(planFilePath):
+	with open(planFilePath, 'r', encoding = "utf-8") as fileHandle:
+		plan = json.load(fileHandle)
+
+	shows = [
+		SettingsShow(
+			show["name"],
+			show["inputPath"],
+			show["outputPath"],
+			show["videoPath"],
+			show["audioPath"],
+			show["prefixShow"],
+			show["titleLanguage"]
+		)
+		for show in plan["shows"]
+	]
+
+	episodeList = []
+
+	# Episodes are stored in the planned order
+	for entry in plan["episodes"]:
+		if "error" in entry:
+			logWrite("Warning: Skipping \"" + entry["videoFile"] + "\", planning failed: " + entry["error"])
+			continue
+
+		settings = entry["settings"]
+		ep = SettingsEpisode(
+			shows[entry["show"]],
+			settings["seasonPath"],
+			settings["fileVideo"],
+			settings["fileAudio"],
+			settings["titleDE"],
+			settings["titleEN"],
+			settings["filePrefix"],
+			settings["audioStart"],
+			settings["audioOffset"],
+			settings["audio_fps"]
+		)
+		ep.estimatedCost = entry["estimatedCpuTime"]
+
+		# Reuse probe results of the plan if the input files did not change since planning
+		for filePath, fingerprint, probeJson in zip([entry["videoFile"], entry["audioFile"]], entry["inputFingerprints"], entry["probe"]):
+			if os.path.exists(filePath) and getFileFingerprint(filePath) == fingerprint:
+				metadataCache.put(getCacheKey(filePath), fingerprint, probeJson)
+			else:
+				logWrite("Warning: \"" + filePath + "\" changed since planning, probing again")
+
+		episodeList.append(ep)
+
+	logWrite("Executing plan \"" + planFilePath + "\" with " + str(len(episodeList)) + " episodes")
+
+	return episodeList, plan["predictedBatchTime"]
+
+
+# =========================== Start of Script ===========================================
+
+# Clear log file
+if not enableUniqueLogFile:
+	open(logFile, 'w').close()
+
+# Start background log writer, remaining messages are written when the script exits
+logWriter = LogWriter(logFlushInterval)
+logWriter.start()
+atexit.register(logWriter.stop)
+
+# Write name of script to log file
+logWrite("This is " + os.path.basename(__file__))
+
+# Prepare numpy loudness engine
+kWeightingFilters = {}
+truePeakFilter = None
+loudnessEnginePool = None
+
+if enableNormalization and loudnessEngine == "numpy":
+	if np is None:
+		errorCritical("loudnessEngine \"numpy\" requires numpy, install it or use loudnessEngine \"ffmpeg\"!")
+
+	truePeakFilter = getTruePeakFilter()
+	loudnessEnginePool = ThreadPool(max(loudnessEngineThreads, 1))
+
+# Directory listings are read once per run
+directoryIndex = DirectoryIndex()
+
+# Telemetry of all episodes of this run for the summary
+telemetryRecords = []
+telemetryLock = threading.Lock()
+
+if enableTelemetry and psutil is None:
+	logWrite("Warning: psutil is not installed, CPU time, memory and I/O of child processes are not recorded")
+
+# Threads of simultaneous ffmpeg processes share the available cores
+coreBudget = CoreBudget(coreBudgetCores, enableCoreAffinity)
+
+if enableCoreAffinity and psutil is None:
+	logWrite("Warning: psutil is not installed, ffmpeg processes are not pinned to cores")
+elif enableCoreAffinity and not isAffinitySupported():
+	logWrite("Warning: Process affinity is not supported on this platform, ffmpeg processes are not pinned to cores")
+
+# Heavy reads and writes are limited per volume
+volumeScheduler = VolumeScheduler(MAX_JOBS_PER_VOLUME, volumeLimits)
+
+# Load metadata cache of previous runs
+metadataCache = PersistentCache(metadataCacheFile, metadataCacheMaxEntries, enableMetadataCache)
+
+if invalidateMetadataCache:
+	logWrite("Invalidating metadata cache \"" + metadataCacheFile + "\"")
+	metadataCache.clear()
+else:
+	metadataCache.load()
+
+# Load loudness measurements of previous runs
+loudnessCache = PersistentCache(loudnessCacheFile, loudnessCacheMaxEntries, enableLoudnessCache)
+
+if invalidateLoudnessCache:
+	logWrite("Invalidating loudness cache \"" + loudnessCacheFile + "\"")
+	loudnessCache.clear()
+else:
+	loudnessCache.load()
+
+# Load manifest of finished episodes of previous runs
+runManifest = PersistentCache(runManifestFile, runManifestMaxEntries, enableRunManifest)
+
+if invalidateRunManifest:
+	logWrite("Invalidating run manifest \"" + runManifestFile + "\"")
+	runManifest.clear()
+else:
+	runManifest.load()
+
+# Get episodes from XML file or from plan of a previous dry run
+if runPlanFile != "":
+	episodeSettings, predictedMakespan = loadPlan(runPlanFile)
+else:
+	if enableLibraryMode:
+		episodeSettings = parseLibrary()
 	else:
-		processEpisode(es)
-		progressBarTotal.update(1)
+		episodeSettings = parseEpisodeSettings(pathMedia, inputPath, outputPath)
+
+	predictedMakespan = None
 
-if pool is not None:
-	pool.close()
-	pool.join()
+	if enableCostScheduling and episodeSettings:
+		episodeSettings, predictedMakespan = scheduleEpisodes(episodeSettings)
+
+if dryRun:
+	writePlan(createPlan(episodeSettings, predictedMakespan), planFile)
+else:
+	runBatch(episodeSettings, predictedMakespan)
+
+# Store metadata and loudness cache for the next run
+metadataCache.save()
+loudnessCache.save()
 
 logWrite("Finished")
+
+logWriter.stop()
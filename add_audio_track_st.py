@@ -1,5 +1,9 @@
 import os
 import subprocess
+import threading
+import tempfile
+import shutil
+from multiprocessing.pool import ThreadPool
 import xml.etree.ElementTree as ET
 from datetime import datetime
 
@@ -18,6 +22,14 @@ outputPath = ""
 # Select title language (DE or EN)
 titleLanguage = "DE"
 
+# Process episodes simultaneously, every job writes its own Avidemux script and temporary audio file
+# Disabled: episodes are processed one after another, the shared Avidemux settings file is rewritten for each episode
+enableConcurrentJobs = False
+# Maximum number of episodes processed simultaneously
+MAX_JOBS = 2
+# Folder for the Avidemux scripts and temporary audio files of the jobs (empty: system temporary folder)
+jobTempPath = ""
+
 # Application paths
 ffmpeg = "../ffmpeg.exe"
 mkvpropedit = "../mkvpropedit.exe"
@@ -30,10 +42,26 @@ logFile = "logs/log_" + os.path.splitext(os.path.basename(__file__))[0] + dateti
 
 # =========================== Functions =================================================
 
+class EpisodeJob:
+	def __init__(self, _videoFilePath, _audioFilePath, _audioStart, _audioOffset, _episodeFullTitle, _outputFolderPath):
+		self.videoFilePath			= _videoFilePath
+		self.audioFilePath			= _audioFilePath
+		self.audioStart				= _audioStart
+		self.audioOffset			= _audioOffset
+		self.episodeFullTitle		= _episodeFullTitle
+		self.outputFolderPath		= _outputFolderPath
+		self.convertedVideoFilePath	= _outputFolderPath + _episodeFullTitle + ".mkv"
+
+
+logLock = threading.Lock()
+
+
 def logWrite(logStr):
-	print(logStr)
-	with open(logFile, 'a') as fileHandle:
-		fileHandle.write(logStr + '\n')
+	# Jobs write from several threads
+	with logLock:
+		print(logStr)
+		with open(logFile, 'a') as fileHandle:
+			fileHandle.write(logStr + '\n')
 
 
 def errorCritical(errorStr):
@@ -42,6 +70,108 @@ def errorCritical(errorStr):
 	exit()
 
 
+def writeAvidemuxScript(scriptPath, audioFilePath, audioOffset):
+	# Read settings file
+	with open(avidemuxSettings, 'r') as file:
+		data = file.readlines()
+
+	# Avidemux accepts forward slashes on all platforms, backslashes would be escape sequences in the script
+	audioFilePath = audioFilePath.replace("\\", "/")
+
+	for idx, line in enumerate(data):
+		if "adm.audioAddExternal" in line:
+			data[idx] = "adm.audioAddExternal(\"" + audioFilePath + "\")\n"
+		if "adm.audioSetShift(0" in line:
+			data[idx] = "adm.audioSetShift(0, 1, " + audioOffset + ")\n"
+
+	# Write settings file
+	with open(scriptPath, 'w') as file:
+		for line in data:
+			file.write(line)
+
+
+def processEpisode(job, scriptPath, convertedAudioFilePath):
+	# Check if audio file exists
+	if not os.path.exists(job.audioFilePath):
+		raise FileNotFoundError('"' + job.audioFilePath + '"' + " does not exist!")
+
+	# Check if video file exists
+	if not os.path.exists(job.videoFilePath):
+		raise FileNotFoundError('"' + job.videoFilePath + '"' + " does not exist!")
+
+	# Check if output folder exists and create it if it doesn't
+	os.makedirs(job.outputFolderPath, exist_ok = True)
+
+	# Extract .aac audio file from .m4a container
+	logWrite("Extracting audio from " + '"' + job.audioFilePath + '"' + "...")
+	subprocess.run([
+		ffmpeg,
+		"-hide_banner",
+		"-loglevel",
+		"error",
+		"-y",
+		"-ss",
+		job.audioStart,
+		"-i",
+		job.audioFilePath,
+		"-acodec",
+		"copy",
+		convertedAudioFilePath
+	])
+
+	writeAvidemuxScript(scriptPath, convertedAudioFilePath, job.audioOffset)
+
+	# Add audio track to video
+	logWrite("Adding audio track to video file " + '"' + job.videoFilePath + '"' + "...")
+	subprocess.run([
+		avidemux,
+		"--load",
+		job.videoFilePath,
+		"--run",
+		scriptPath,
+		"--save",
+		job.convertedVideoFilePath,
+		"--quit"
+	])
+
+	# Check if output file exists
+	if os.path.exists(job.convertedVideoFilePath):
+		# Set title in video file properties
+		subprocess.run([
+			mkvpropedit,
+			job.convertedVideoFilePath,
+			"-e",
+			"info",
+			"-s",
+			'title="' + job.episodeFullTitle + '"',
+			"--add-track-statistics-tags"
+		])
+
+
+def processEpisodeShared(job):
+	# Shared settings file and temporary audio file next to the input, only one episode at a time
+	convertedAudioFilePath = os.path.dirname(job.audioFilePath) + "/temp.aac"
+
+	try:
+		processEpisode(job, avidemuxSettings, convertedAudioFilePath)
+	finally:
+		# Delete extracted audio
+		if os.path.exists(convertedAudioFilePath):
+			os.remove(convertedAudioFilePath)
+
+
+def processEpisodePrivate(job):
+	# Avidemux script and temporary audio file of this job only
+	jobPath = tempfile.mkdtemp(prefix = "avidemux_", dir = jobTempPath if jobTempPath != "" else None)
+
+	try:
+		processEpisode(job, os.path.join(jobPath, "avidemux_settings.py"), os.path.join(jobPath, "temp.aac"))
+	except Exception as e:
+		logWrite("Error: Processing of " + '"' + job.videoFilePath + '"' + " failed! Exception: " + str(e))
+	finally:
+		shutil.rmtree(jobPath, ignore_errors = True)
+
+
 # =========================== Start of Script ===========================================
 
 # Clear log file
@@ -60,9 +190,13 @@ audioPath = root_node.find("FilePathAudio").text
 # Get show prefix for output file name from XML
 outputFilePrefixShow = root_node.find("PrefixShow").text
 
+episodeJobs = []
+
 # Loop over all seasons in XML file
 for season in root_node.findall("Season"):
 	# Check if only specific seasons should be processed
+	skip = False
+
 	if seasons:
 		skip = True
 		# Check if season was specified to be processed
@@ -85,6 +219,8 @@ for season in root_node.findall("Season"):
 	# Loop over all episodes within one season
 	for episode in season.find("Episodes").findall("Episode"):
 		# Check if only specific episodes should be processed
+		skip = False
+
 		if episodes:
 			skip = True
 			# Check if episode was specified to be processed
@@ -103,83 +239,27 @@ for season in root_node.findall("Season"):
 		outputFilePrefixEpisode = episode.find("PrefixEpisode").text
 		episodeAudioOffset = episode.find("AudioOffset").text
 
-		# Check if output folder exists and create it if it doesn't
-		if not os.path.isdir(outputPath + seasonPath):
-			os.makedirs(outputPath + seasonPath)
-
-		# Check if audio file exists
-		filePath = inputPath + audioPath + seasonPath + episodeFileAudio
-		convertedAudioFilePath = inputPath + audioPath + seasonPath + "temp.aac"
-		if os.path.exists(filePath):
-			# Extract .aac audio file from .m4a container
-			logWrite("Extracting audio from " + '"' + filePath + '"' + "...")
-			subprocess.run([
-				ffmpeg,
-				"-hide_banner",
-				"-loglevel",
-				"error",
-				"-y",
-				"-ss",
-				audioStart,
-				"-i",
-				filePath,
-				"-acodec",
-				"copy",
-				convertedAudioFilePath
-			])
-		else:
-			errorCritical('"' + filePath + '"' + " does not exist!")
-
-		# Read settings file
-		with open(avidemuxSettings, 'r') as file:
-			data = file.readlines()
-
-			for idx, line in enumerate(data):
-				if "adm.audioAddExternal" in line:
-					data[idx] = "adm.audioAddExternal(\"" + convertedAudioFilePath + "\")\n"
-				if "adm.audioSetShift(0" in line:
-					data[idx] = "adm.audioSetShift(0, 1, " + episodeAudioOffset + ")\n"
-
-		# Write settings file
-		with open(avidemuxSettings, 'w') as file:
-			for line in data:
-				file.write(line)
-
-		# Check if video file exists
-		filePath = inputPath + videoPath + seasonPath + episodeFileVideo
 		episodeFullTitle = outputFilePrefixShow \
 						   + outputFilePrefixSeason \
 						   + outputFilePrefixEpisode \
 						   + episodeTitleDE if titleLanguage == "DE" else episodeTitleEN
-		convertedVideoFilePath = outputPath + seasonPath + episodeFullTitle + ".mkv"
-		if os.path.exists(filePath):
-			# Add audio track to video
-			logWrite("Adding audio track to video file " + '"' + filePath + '"' + "...")
-			subprocess.run([
-				avidemux,
-				"--load",
-				filePath,
-				"--run",
-				avidemuxSettings,
-				"--save",
-				convertedVideoFilePath,
-				"--quit"
-			])
-
-			# Delete extracted audio
-			os.remove(convertedAudioFilePath)
-		else:
-			errorCritical('"' + filePath + '"' + " does not exist!")
-
-		# Check if output file exists
-		if os.path.exists(convertedVideoFilePath):
-			# Set title in video file properties
-			subprocess.run([
-				mkvpropedit,
-				convertedVideoFilePath,
-				"-e",
-				"info",
-				"-s",
-				'title="' + episodeFullTitle + '"',
-				"--add-track-statistics-tags"
-			])
+
+		episodeJobs.append(EpisodeJob(
+			inputPath + videoPath + seasonPath + episodeFileVideo,
+			inputPath + audioPath + seasonPath + episodeFileAudio,
+			audioStart,
+			episodeAudioOffset,
+			episodeFullTitle,
+			outputPath + seasonPath
+		))
+
+if enableConcurrentJobs:
+	# Jobs do not share any files, Avidemux runs once per job
+	with ThreadPool(max(MAX_JOBS, 1)) as jobPool:
+		jobPool.map(processEpisodePrivate, episodeJobs)
+else:
+	for job in episodeJobs:
+		try:
+			processEpisodeShared(job)
+		except FileNotFoundError as e:
+			errorCritical(str(e))
@@ -0,0 +1,354 @@
+import os
+import sys
+import re
+import json
+import time
+import shutil
+import platform
+import statistics
+import subprocess
+import itertools
+import xml.etree.ElementTree as ET
+from datetime import datetime
+
+# =========================== Settings ==================================================
+
+# Folder of this script, all paths below are relative to it
+benchmarkPath = os.path.dirname(os.path.abspath(__file__))
+
+# Script to benchmark
+scriptFile = os.path.join(benchmarkPath, "..", "add_audio_track_mt.py")
+
+# Synthetic corpus (generated once, delete the folder to generate it again)
+corpusPath = os.path.join(benchmarkPath, "corpus")
+corpusSeasons = 2
+corpusEpisodesPerSeason = 4
+corpusEpisodeLength = 120				# Seconds
+corpusVideoSize = "1280x720"
+corpusVideoRate = 24
+corpusVideoChannels = "5.1"				# Channel layout of the original audio track
+corpusAudioChannels = "stereo"			# Channel layout of the added audio track
+corpusSampleRate = 48000
+
+# Working folder for patched scripts and outputs of the benchmark runs
+workPath = os.path.join(benchmarkPath, "work")
+
+# Reports of all runs and the baseline they are compared to
+resultsPath = os.path.join(benchmarkPath, "results")
+baselineFile = os.path.join(benchmarkPath, "baseline.json")
+# Store the results of this run as new baseline
+updateBaseline = False
+# Cases slower than the baseline by more than this fraction are flagged as regression
+regressionTolerance = 0.10
+
+# Every case is run this often, the median time is reported
+repetitions = 3
+
+# Benchmark matrix, every combination is one case
+benchmarkMatrix = {
+	"MAX_THREADS":			[1, 2, 4],
+	"enableNormalization":	[False, True],
+	"audioResampler":		["swr", "soxr"]
+}
+
+# Settings of the benchmarked script used for all cases
+fixedSettings = {
+	"enablePipeline":			False,
+	"enableAsyncRunner":		False,
+	"enableCostScheduling":		False,
+	"enableMetadataCache":		False,
+	"enableLoudnessCache":		False,
+	"enableRunManifest":		False,
+	"enableFfmpegLogFile":		False,
+	"audioEncoderAAC":			"aac"
+}
+
+# Application paths (repository root or PATH)
+ffmpeg = shutil.which(os.path.join(benchmarkPath, "..", "ffmpeg.exe")) or "ffmpeg.exe"
+ffprobe = shutil.which(os.path.join(benchmarkPath, "..", "ffprobe.exe")) or "ffprobe.exe"
+
+# Number of channels of the supported corpus channel layouts
+CHANNEL_LAYOUTS = {"mono": 1, "stereo": 2, "5.1": 6, "7.1": 8}
+
+
+# =========================== Functions =================================================
+
+def logWrite(logStr):
+	print(logStr)
+
+
+def errorCritical(errorStr):
+	logWrite("Error: " + errorStr)
+	exit(1)
+
+
+def generateEpisode(videoFilePath, audioFilePath, seed):
+	# Video: test pattern with multichannel sine and noise audio
+	# Audio: different sine frequencies and noise so both tracks are measured separately
+	channelExpression = "0.2*sin({FREQUENCY}*2*PI*t)+0.05*(random(" + str(seed) + ")*2-1)"
+
+	def audioSource(channelLayout, baseFrequency):
+		amountChannels = CHANNEL_LAYOUTS[channelLayout]
+
+		expressions = [channelExpression.replace("{FREQUENCY}", str(baseFrequency * (idxChannel + 1))) for idxChannel in range(amountChannels)]
+
+		return "aevalsrc=" + "|".join(expressions) + ":s=" + str(corpusSampleRate) + ":c=" + channelLayout + ":d=" + str(corpusEpisodeLength)
+
+	subprocess.run([
+		ffmpeg,
+		"-hide_banner",
+		"-loglevel",
+		"error",
+		"-y",
+		"-f",
+		"lavfi",
+		"-i",
+		"testsrc2=size=" + corpusVideoSize + ":rate=" + str(corpusVideoRate) + ":duration=" + str(corpusEpisodeLength),
+		"-f",
+		"lavfi",
+		"-i",
+		audioSource(corpusVideoChannels, 220),
+		"-c:v",
+		"libx264",
+		"-preset",
+		"ultrafast",
+		"-c:a",
+		"ac3",
+		"-metadata:s:a:0",
+		"language=eng",
+		videoFilePath
+	], check = True)
+
+	subprocess.run([
+		ffmpeg,
+		"-hide_banner",
+		"-loglevel",
+		"error",
+		"-y",
+		"-f",
+		"lavfi",
+		"-i",
+		audioSource(corpusAudioChannels, 330),
+		"-c:a",
+		"aac",
+		"-metadata:s:a:0",
+		"language=ger",
+		audioFilePath
+	], check = True)
+
+
+def generateCorpus():
+	infoFilePath = os.path.join(corpusPath, "info.xml")
+
+	if os.path.exists(infoFilePath):
+		logWrite("Using existing corpus \"" + corpusPath + "\"")
+		return
+
+	logWrite("Generating corpus \"" + corpusPath + "\"...")
+
+	rootNode = ET.Element("TVShow")
+	ET.SubElement(rootNode, "FilePathVideo").text = "Englisch/"
+	ET.SubElement(rootNode, "FilePathAudio").text = "Deutsch/"
+	ET.SubElement(rootNode, "PrefixShow").text = "Benchmark (2000)-"
+
+	for idxSeason in range(corpusSeasons):
+		seasonPath = f"Season {idxSeason + 1:02d}/"
+
+		seasonNode = ET.SubElement(rootNode, "Season")
+		ET.SubElement(seasonNode, "FilePathSeason").text = seasonPath
+		ET.SubElement(seasonNode, "PrefixSeason").text = f"S{idxSeason + 1:02d}-"
+		ET.SubElement(seasonNode, "AudioStart").text = "00:00:00.000"
+		episodesNode = ET.SubElement(seasonNode, "Episodes")
+
+		os.makedirs(os.path.join(corpusPath, "Englisch", seasonPath), exist_ok = True)
+		os.makedirs(os.path.join(corpusPath, "Deutsch", seasonPath), exist_ok = True)
+
+		for idxEpisode in range(corpusEpisodesPerSeason):
+			fileName = f"Benchmark.S{idxSeason + 1:02d}.E{idxEpisode + 1:02d}"
+
+			generateEpisode(
+				os.path.join(corpusPath, "Englisch", seasonPath, fileName + ".mkv"),
+				os.path.join(corpusPath, "Deutsch", seasonPath, fileName + ".m4a"),
+				idxSeason * corpusEpisodesPerSeason + idxEpisode
+			)
+
+			episodeNode = ET.SubElement(episodesNode, "Episode")
+			ET.SubElement(episodeNode, "FileNameVideo").text = fileName + ".mkv"
+			ET.SubElement(episodeNode, "FileNameAudio").text = fileName + ".m4a"
+			ET.SubElement(episodeNode, "TitleDE").text = f"Titel {idxEpisode + 1}"
+			ET.SubElement(episodeNode, "TitleEN").text = f"Title {idxEpisode + 1}"
+			ET.SubElement(episodeNode, "PrefixEpisode").text = f"E{idxEpisode + 1:02d} - "
+			ET.SubElement(episodeNode, "AudioOffset").text = "00:00:00.000"
+
+	# info.xml is written last, an interrupted generation is started again
+	ET.ElementTree(rootNode).write(infoFilePath, encoding = "utf-8", xml_declaration = True)
+
+
+def getCaseName(caseSettings):
+	return ",".join(key + "=" + str(value) for key, value in caseSettings.items())
+
+
+def patchScript(caseSettings, patchedFilePath, outputPath):
+	# Settings are overridden right before the functions of the script, derived settings are overridden as well
+	with open(scriptFile, 'r', encoding = "utf-8") as fileHandle:
+		source = fileHandle.read()
+
+	overrides = dict(fixedSettings)
+	overrides.update(caseSettings)
+	overrides.update({
+		"seasons":			[],
+		"episodes":			[],
+		"dryRun":			False,
+		"runPlanFile":		"",
+		"enableLibraryMode":	False,
+		"inputPath":		os.path.join(corpusPath, ""),
+		"outputPath":		os.path.join(outputPath, ""),
+		"ffmpeg":			ffmpeg,
+		"ffprobe":			ffprobe
+	})
+
+	overrideStr = "# Benchmark settings\n"
+
+	for key, value in overrides.items():
+		overrideStr += key + " = " + repr(value) + "\n"
+
+	source, amountReplaced = re.subn(
+		r"^(# =+ Functions =+)$",
+		lambda match: overrideStr + "\n\n" + match.group(1),
+		source,
+		count = 1,
+		flags = re.MULTILINE
+	)
+
+	if amountReplaced != 1:
+		errorCritical("Settings section of \"" + scriptFile + "\" not found!")
+
+	with open(patchedFilePath, 'w', encoding = "utf-8") as fileHandle:
+		fileHandle.write(source)
+
+
+def runCase(caseSettings):
+	caseName = getCaseName(caseSettings)
+	casePath = os.path.join(workPath, re.sub(r'[\\/:*?"<>|=,]', "_", caseName))
+	patchedFilePath = os.path.join(casePath, "add_audio_track_mt.py")
+	outputPath = os.path.join(casePath, "output")
+
+	os.makedirs(os.path.join(casePath, "logs"), exist_ok = True)
+	patchScript(caseSettings, patchedFilePath, outputPath)
+
+	times = []
+	returnCodes = []
+
+	for idxRun in range(repetitions):
+		# Every run starts without outputs of previous runs
+		shutil.rmtree(outputPath, ignore_errors = True)
+
+		startTime = time.perf_counter()
+		process = subprocess.run(
+			[sys.executable, patchedFilePath],
+			cwd = casePath,
+			stdout = subprocess.DEVNULL,
+			stderr = subprocess.DEVNULL
+		)
+		times.append(time.perf_counter() - startTime)
+		returnCodes.append(process.returncode)
+
+	amountOutputs = sum(len(fileNames) for _, _, fileNames in os.walk(outputPath))
+
+	result = {
+		"name":			caseName,
+		"settings":		caseSettings,
+		"times":		times,
+		"median":		statistics.median(times),
+		"min":			min(times),
+		"returnCodes":	returnCodes,
+		"outputs":		amountOutputs,
+		"failed":		any(returnCodes) or amountOutputs != corpusSeasons * corpusEpisodesPerSeason
+	}
+
+	logWrite(
+		caseName
+		+ f": median {result['median']:.2f} s, min {result['min']:.2f} s"
+		+ (" (FAILED)" if result["failed"] else "")
+	)
+
+	return result
+
+
+def compareBaseline(report, baseline):
+	# Only cases of both reports with the same corpus are comparable
+	if baseline["corpus"] != report["corpus"]:
+		logWrite("Warning: Corpus of the baseline differs, results are not compared")
+		return []
+
+	baselineCases = {case["name"]: case for case in baseline["cases"]}
+	regressions = []
+
+	for case in report["cases"]:
+		if case["name"] not in baselineCases or case["failed"]:
+			continue
+
+		ratio = case["median"] / baselineCases[case["name"]]["median"]
+		case["baselineRatio"] = ratio
+
+		if ratio > 1 + regressionTolerance:
+			regressions.append(case["name"])
+			logWrite(f"Regression: {case['name']} is {(ratio - 1) * 100:.1f} % slower than the baseline")
+		elif ratio < 1 - regressionTolerance:
+			logWrite(f"Improvement: {case['name']} is {(1 - ratio) * 100:.1f} % faster than the baseline")
+
+	return regressions
+
+
+# =========================== Start of Script ===========================================
+
+generateCorpus()
+
+report = {
+	"created":		datetime.now().isoformat(timespec = "seconds"),
+	"script":		os.path.basename(scriptFile),
+	"machine": {
+		"platform":		platform.platform(),
+		"processor":	platform.processor(),
+		"cpuCount":		os.cpu_count(),
+		"python":		platform.python_version()
+	},
+	"corpus": {
+		"seasons":			corpusSeasons,
+		"episodesPerSeason":	corpusEpisodesPerSeason,
+		"episodeLength":	corpusEpisodeLength,
+		"videoSize":		corpusVideoSize,
+		"videoRate":		corpusVideoRate,
+		"videoChannels":	corpusVideoChannels,
+		"audioChannels":	corpusAudioChannels,
+		"sampleRate":		corpusSampleRate
+	},
+	"repetitions":	repetitions,
+	"cases":		[]
+}
+
+for values in itertools.product(*benchmarkMatrix.values()):
+	report["cases"].append(runCase(dict(zip(benchmarkMatrix.keys(), values))))
+
+if os.path.exists(baselineFile):
+	with open(baselineFile, 'r', encoding = "utf-8") as fileHandle:
+		report["regressions"] = compareBaseline(report, json.load(fileHandle))
+else:
+	logWrite("No baseline \"" + baselineFile + "\" found, set updateBaseline = True to store this run")
+	report["regressions"] = []
+
+os.makedirs(resultsPath, exist_ok = True)
+reportFilePath = os.path.join(resultsPath, "report_" + datetime.now().strftime("%Y%m%d_%H%M%S") + ".json")
+
+with open(reportFilePath, 'w', encoding = "utf-8") as fileHandle:
+	json.dump(report, fileHandle, indent = "\t")
+
+logWrite("Report written to \"" + reportFilePath + "\"")
+
+if updateBaseline:
+	shutil.copyfile(reportFilePath, baselineFile)
+	logWrite("Baseline \"" + baselineFile + "\" updated")
+
+# Non-zero exit code for regressions and failed cases, so the benchmark can be used in scripts
+if report["regressions"] or any(case["failed"] for case in report["cases"]):
+	exit(1)
@@ -0,0 +1,367 @@
+import os
+import sys
+import subprocess
+import json
+import time
+import tempfile
+from multiprocessing import Pool
+from datetime import datetime
+
+# =========================== Settings ==================================================
+
+# Files or folders (searched recursively) to check, replaced by the command line arguments if there are any
+inputPaths = []
+fileExtensions = [".mkv", ".mp4", ".m4v", ".mov", ".avi", ".ts", ".m2ts", ".webm"]
+
+# "demux": read all packets without decoding and check packet flags and timestamps (fast)
+# "decode": decode all streams like "ffmpeg -v warning -i <file> -f null -"
+# Can be set on the command line with --mode=demux or --mode=decode
+checkMode = "demux"
+
+# Logical cores used by all checks together (0: all cores)
+coreBudget = 0
+# Threads of one decoding ffmpeg (decode mode), the number of simultaneous checks is coreBudget / threadsPerDecode
+threadsPerDecode = 2
+
+# Gap between two packets of an audio or video stream reported as missing data (seconds)
+# Subtitle and data streams are not checked, they have long gaps between the packets
+maxPacketGap = 1.0
+# Number of messages stored per file in the report
+maxMessages = 50
+
+# Results are cached per file (keyed by path, size and modification time) and mode
+enableCache = True
+# Clear the cache before checking (forces all files to be checked again)
+invalidateCache = False
+cacheFile = "cache/integrity_cache.json"
+# Cache file is written after this number of checked files and at the end of the run
+cacheSaveInterval = 20
+
+# Application paths
+ffmpeg = "ffmpeg.exe"
+ffprobe = "ffprobe.exe"
+
+# Log file location
+logFile = "logs/log_" + os.path.splitext(os.path.basename(__file__))[0] + datetime.today().now().strftime("%Y%m%d_%H%M%S") + ".txt"
+reportFile = "logs/integrity_report_" + datetime.today().now().strftime("%Y%m%d_%H%M%S") + ".json"
+
+
+# =========================== Functions =================================================
+
+def logWrite(logStr):
+	print(logStr)
+	with open(logFile, 'a') as fileHandle:
+		fileHandle.write(logStr + '\n')
+
+
+def getCacheKey(filePath):
+	return os.path.normcase(os.path.abspath(filePath))
+
+
+def getFileFingerprint(filePath):
+	fileStat = os.stat(filePath)
+	return [fileStat.st_size, fileStat.st_mtime_ns]
+
+
+def loadCache(cacheFilePath):
+	if not enableCache or invalidateCache or not os.path.exists(cacheFilePath):
+		return {}
+
+	try:
+		with open(cacheFilePath, 'r', encoding = "utf-8") as fileHandle:
+			return json.load(fileHandle)
+	except (OSError, ValueError) as e:
+		logWrite("Warning: Could not read cache file \"" + cacheFilePath + "\"! Exception: " + str(e))
+		return {}
+
+
+def saveCache(cache, cacheFilePath):
+	if not enableCache:
+		return
+
+	if os.path.dirname(cacheFilePath) != "":
+		os.makedirs(os.path.dirname(cacheFilePath), exist_ok = True)
+
+	# Write to temporary file first so an interrupted run cannot corrupt the cache
+	with open(cacheFilePath + ".tmp", 'w', encoding = "utf-8") as fileHandle:
+		json.dump(cache, fileHandle)
+
+	os.replace(cacheFilePath + ".tmp", cacheFilePath)
+
+
+def findFiles(paths):
+	filePaths = []
+
+	for path in paths:
+		if os.path.isfile(path):
+			filePaths.append(path)
+			continue
+
+		for dirPath, dirNames, fileNames in os.walk(path):
+			dirNames.sort()
+
+			for fileName in sorted(fileNames):
+				if os.path.splitext(fileName)[1].lower() in fileExtensions:
+					filePaths.append(os.path.join(dirPath, fileName))
+
+	return filePaths
+
+
+def getStreamTypes(filePath):
+	# Stream index -> codec type, only the headers of the file are read
+	processOut = subprocess.check_output([
+		ffprobe,
+		"-v",
+		"error",
+		"-show_entries",
+		"stream=index,codec_type",
+		"-of",
+		"csv=p=0",
+		filePath
+	]).decode("utf-8")
+
+	return dict(line.strip().split(",")[:2] for line in processOut.splitlines() if line.count(",") >= 1)
+
+
+def checkDemux(filePath):
+	streamTypes = getStreamTypes(filePath)
+
+	# Packet headers of all streams, nothing is decoded; errors go to a temporary file so a full pipe cannot block ffprobe
+	errorFile = tempfile.TemporaryFile(mode = "w+", encoding = "utf-8", errors = "replace")
+	process = subprocess.Popen([
+		ffprobe,
+		"-v",
+		"error",
+		"-show_entries",
+		"packet=stream_index,pts_time,dts_time,duration_time,flags",
+		"-of",
+		"csv=p=0",
+		filePath
+	], stdout = subprocess.PIPE, stderr = errorFile, universal_newlines = True, encoding = "utf-8", errors = "replace")
+
+	# Stream index -> [packets, end of the previous packet, previous DTS, first packet is a keyframe]
+	streams = {}
+	messages = []
+	errors = 0
+	warnings = 0
+
+	for line in process.stdout:
+		fields = line.strip().split(",")
+
+		if len(fields) < 5:
+			continue
+
+		idxStream, ptsTime, dtsTime, durationTime, flags = fields[:5]
+		stream = streams.setdefault(idxStream, [0, None, None, "K" in flags])
+		stream[0] += 1
+
+		if "C" in flags:
+			errors += 1
+			messages.append("Stream " + idxStream + ": corrupt packet at " + ptsTime)
+
+		if dtsTime == "N/A":
+			continue
+
+		dts = float(dtsTime)
+
+		if stream[2] is not None and dts < stream[2]:
+			errors += 1
+			messages.append("Stream " + idxStream + ": non monotonic DTS " + dtsTime + " after " + f"{stream[2]:.6f}")
+		elif stream[1] is not None and dts - stream[1] > maxPacketGap and streamTypes.get(idxStream) in ["audio", "video"]:
+			warnings += 1
+			messages.append("Stream " + idxStream + ": gap of " + f"{dts - stream[1]:.3f}" + " s at " + dtsTime)
+
+		stream[1] = dts + (float(durationTime) if durationTime != "N/A" else 0.0)
+		stream[2] = dts
+
+	process.wait()
+
+	# Messages of the demuxer (e.g. truncated file, invalid data)
+	with errorFile:
+		errorFile.seek(0)
+
+		for line in errorFile:
+			if line.strip() != "":
+				errors += 1
+				messages.append(line.strip())
+
+	if process.returncode:
+		errors += 1
+		messages.append("ffprobe exited with code " + str(process.returncode))
+
+	for idxStream, stream in streams.items():
+		if not stream[3]:
+			warnings += 1
+			messages.append("Stream " + idxStream + ": first packet is no keyframe")
+
+	return [errors, warnings, messages, sum(stream[0] for stream in streams.values())]
+
+
+def checkDecode(filePath, threads):
+	# Same as check_video_corruption.bat, every message of ffmpeg is a finding
+	process = subprocess.run([
+		ffmpeg,
+		"-hide_banner",
+		"-v",
+		"warning",
+		"-threads",
+		str(threads),
+		"-i",
+		filePath,
+		"-f",
+		"null",
+		"-"
+	], stdout = subprocess.DEVNULL, stderr = subprocess.PIPE, universal_newlines = True, encoding = "utf-8", errors = "replace")
+
+	messages = [line.strip() for line in process.stderr.splitlines() if line.strip() != ""]
+	errors = sum(1 for message in messages if "error" in message.lower())
+
+	if process.returncode:
+		errors += 1
+		messages.append("ffmpeg exited with code " + str(process.returncode))
+
+	return [errors, len(messages) - errors, messages, None]
+
+
+def checkFile(args):
+	# Runs in a worker process, settings changed on the command line are passed as arguments
+	filePath, mode, threads = args
+	startTime = time.monotonic()
+
+	try:
+		if mode == "decode":
+			errors, warnings, messages, packets = checkDecode(filePath, threads)
+		else:
+			errors, warnings, messages, packets = checkDemux(filePath)
+	except OSError as e:
+		errors, warnings, messages, packets = [1, 0, [str(e)], None]
+	except subprocess.CalledProcessError as e:
+		errors, warnings, messages, packets = [1, 0, ["ffprobe exited with code " + str(e.returncode)], None]
+
+	return {
+		"file":			filePath,
+		"mode":			mode,
+		"status":		"error" if errors > 0 else "warning" if warnings > 0 else "ok",
+		"errors":		errors,
+		"warnings":		warnings,
+		"packets":		packets,
+		"messages":		messages[:maxMessages],
+		"time":			round(time.monotonic() - startTime, 3)
+	}
+
+
+def getAmountCores():
+	return coreBudget if coreBudget > 0 else (os.cpu_count() or 1)
+
+
+def writeReport(results, reportFilePath):
+	if os.path.dirname(reportFilePath) != "":
+		os.makedirs(os.path.dirname(reportFilePath), exist_ok = True)
+
+	report = {
+		"created":		datetime.now().isoformat(timespec = "seconds"),
+		"mode":			checkMode,
+		"files":		len(results),
+		"status":		{status: sum(1 for result in results if result["status"] == status) for status in ["ok", "warning", "error"]},
+		"cached":		sum(1 for result in results if result.get("cached", False)),
+		"results":		results
+	}
+
+	with open(reportFilePath, 'w', encoding = "utf-8") as fileHandle:
+		json.dump(report, fileHandle, indent = 2)
+
+
+# =========================== Start of Script ===========================================
+
+if __name__ == "__main__":
+	# Files and folders dropped on check_video_corruption.bat
+	argumentPaths = []
+
+	for argument in sys.argv[1:]:
+		if argument.startswith("--mode="):
+			checkMode = argument.removeprefix("--mode=")
+		else:
+			argumentPaths.append(argument)
+
+	if argumentPaths:
+		inputPaths = argumentPaths
+
+	if os.path.dirname(logFile) != "":
+		os.makedirs(os.path.dirname(logFile), exist_ok = True)
+
+	# Clear log file
+	open(logFile, 'w').close()
+
+	# Write name of script to log file
+	logWrite("This is " + os.path.basename(__file__))
+
+	if checkMode not in ["demux", "decode"]:
+		logWrite("Error: Unknown check mode \"" + checkMode + "\"")
+		sys.exit(1)
+
+	cache = loadCache(cacheFile)
+	results = {}
+	pendingFiles = []
+
+	for filePath in findFiles(inputPaths):
+		key = getCacheKey(filePath)
+		entry = cache.get(key, {}).get(checkMode)
+
+		# Unchanged files are not checked again
+		if entry is not None and entry["fingerprint"] == getFileFingerprint(filePath):
+			results[filePath] = dict(entry["result"], cached = True)
+		else:
+			pendingFiles.append(filePath)
+			results[filePath] = None
+
+	logWrite(
+		"Checking "
+		+ str(len(pendingFiles))
+		+ " files ("
+		+ checkMode
+		+ "), "
+		+ str(len(results) - len(pendingFiles))
+		+ " unchanged files taken from the cache"
+	)
+
+	# Every decoding ffmpeg uses threadsPerDecode cores, demuxing uses one core per file
+	threads = max(threadsPerDecode, 1) if checkMode == "decode" else 1
+	amountWorkers = max(getAmountCores() // threads, 1)
+
+	try:
+		with Pool(amountWorkers) as checkPool:
+			for amountChecked, result in enumerate(checkPool.imap_unordered(checkFile, [(filePath, checkMode, threads) for filePath in pendingFiles]), 1):
+				results[result["file"]] = result
+
+				if result["status"] != "ok":
+					logWrite("[" + result["status"] + "] \"" + result["file"] + "\"")
+
+					for message in result["messages"]:
+						logWrite("\t" + message)
+
+				cache.setdefault(getCacheKey(result["file"]), {})[checkMode] = {
+					"fingerprint":	getFileFingerprint(result["file"]),
+					"result":		result
+				}
+
+				# Saved in intervals, an interrupted run keeps most of its results
+				if amountChecked % max(cacheSaveInterval, 1) == 0:
+					saveCache(cache, cacheFile)
+	finally:
+		saveCache(cache, cacheFile)
+
+	resultList = [results[filePath] for filePath in results]
+	writeReport(resultList, reportFile)
+
+	logWrite(
+		"Checked "
+		+ str(len(resultList))
+		+ " files: "
+		+ str(sum(1 for result in resultList if result["status"] == "ok"))
+		+ " ok, "
+		+ str(sum(1 for result in resultList if result["status"] == "warning"))
+		+ " with warnings, "
+		+ str(sum(1 for result in resultList if result["status"] == "error"))
+		+ " with errors"
+	)
+	logWrite("Report written to \"" + reportFile + "\"")
@@ -0,0 +1,518 @@
+import os
+import subprocess
+import json
+import xml.etree.ElementTree as ET
+from multiprocessing.pool import ThreadPool
+from datetime import datetime
+
+import numpy as np
+
+# =========================== Settings ==================================================
+
+# Empty list selects all seasons (specify as string)
+seasons = []
+# Empty list selects all episodes (specify as string)
+episodes = []
+
+# Input path containing info.xml and the video and audio folders
+inputPath = r'E:\\Filme\\'
+# Suggested values are written to a copy of info.xml in the input path
+outputFileName = "info_suggested.xml"
+
+# Maximum number of episodes analyzed simultaneously
+MAX_THREADS = 4
+
+# Compared audio streams (index of the audio stream within the video and the audio file)
+videoAudioStream = 0
+audioAudioStream = 0
+
+# Audio is decoded to mono with this sample rate, the envelope has one value per block of 1 / envelopeRate seconds
+decodeSampleRate = 8000
+envelopeRate = 100
+
+# Frame rates considered for <AudioFPS> (speed of the added audio = frame rate of the video / AudioFPS)
+candidateFps = [23.976, 24.0, 25.0, 29.97, 30.0]
+# Estimated speed is replaced by the speed of a candidate frame rate if it differs less than this (relative)
+speedSnapTolerance = 0.0002
+
+# The offset is refined in windows spread over the whole episode to fit offset and speed
+amountWindows = 16
+windowLength = 30.0			# Seconds
+# Search range of every window around the offset of the whole episode (seconds)
+windowSearchRange = 2.0
+# Minimum peak of the cross-correlation (standard deviations above the mean) to use a window
+minConfidence = 6.0
+
+# Application paths
+ffmpeg = "ffmpeg.exe"
+ffprobe = "ffprobe.exe"
+
+# Log file location
+logFile = "logs/log_" + os.path.splitext(os.path.basename(__file__))[0] + datetime.today().now().strftime("%Y%m%d_%H%M%S") + ".txt"
+
+
+# =========================== Functions =================================================
+
+class SyncEstimate:
+	def __init__(self, _speed, _start, _center, _confidence, _amountWindows, _amountInliers, _residual):
+		self.speed				= _speed			# Seconds of the audio per second of the video
+		self.start				= _start			# Position in the audio at the start of the video (seconds)
+		self.center				= _center			# Video time the fit is most accurate at (seconds)
+		self.confidence			= _confidence		# Peak of the cross-correlation of the whole episode
+		self.amountWindows		= _amountWindows
+		self.amountInliers		= _amountInliers	# Windows matching the fitted offset and speed
+		self.residual			= _residual			# Median deviation of the windows from the fit (seconds)
+
+
+def logWrite(logStr):
+	print(logStr)
+	with open(logFile, 'a') as fileHandle:
+		fileHandle.write(logStr + '\n')
+
+
+def errorCritical(errorStr):
+	logWrite("Error: " + errorStr)
+	exit()
+
+
+def secondsToTimeString(seconds):
+	sign = "-" if seconds < 0 else ""
+	seconds = abs(seconds)
+
+	hours = int(seconds // 3600)
+	minutes = int((seconds % 3600) // 60)
+	seconds -= hours * 3600 + minutes * 60
+
+	return sign + f"{hours:02}:{minutes:02}:{seconds:06.3f}"
+
+
+def timeStringToSeconds(timeStr):
+	isNegative = timeStr.startswith("-")
+	timeStr = timeStr.removeprefix("-")
+
+	timeList = timeStr.split(":")
+	seconds = int(timeList[0]) * 3600 + int(timeList[1]) * 60 + float(timeList[2])
+
+	if isNegative:
+		seconds *= -1
+
+	return seconds
+
+
+def getVideoFramerate(filePath):
+	processOutJson = json.loads(subprocess.check_output([
+		ffprobe,
+		"-v",
+		"error",
+		"-select_streams",
+		"v:0",
+		"-show_entries",
+		"stream=avg_frame_rate",
+		"-of",
+		"json",
+		filePath
+	]).decode("utf-8"))
+
+	avgFps = processOutJson["streams"][0]["avg_frame_rate"].split("/")
+	return int(avgFps[0]) / int(avgFps[1])
+
+
+def getOnsetEnvelope(energy):
+	# Onsets of the music and effects are shared by the original and the dubbed mix, absolute levels are not
+	logEnergy = np.log10(energy + 1e-5)
+	onsets = np.maximum(np.diff(logEnergy, prepend = logEnergy[:1]), 0.0)
+
+	return normalizeEnvelope(onsets)
+
+
+def normalizeEnvelope(envelope):
+	envelope = envelope - np.mean(envelope) if len(envelope) > 0 else envelope
+	deviation = np.std(envelope) if len(envelope) > 0 else 0.0
+
+	return envelope / deviation if deviation > 0 else envelope
+
+
+def decodeEnvelope(filePath, idxStream):
+	# Decode to mono float samples, only the envelope of one minute is kept in memory at a time
+	process = subprocess.Popen([
+		ffmpeg,
+		"-hide_banner",
+		"-loglevel",
+		"error",
+		"-i",
+		filePath,
+		"-map",
+		"0:a:" + str(idxStream),
+		"-ac",
+		"1",
+		"-ar",
+		str(decodeSampleRate),
+		"-f",
+		"f32le",
+		"-"
+	], stdout = subprocess.PIPE)
+
+	blockLength = decodeSampleRate // envelopeRate
+	readSize = blockLength * envelopeRate * 60 * 4
+	pendingBytes = b""
+	pendingSamples = np.zeros(0, dtype = np.float32)
+	energy = []
+
+	while True:
+		data = process.stdout.read(readSize)
+
+		if not data:
+			break
+
+		data = pendingBytes + data
+		usableBytes = len(data) - len(data) % 4
+		pendingBytes = data[usableBytes:]
+
+		samples = np.concatenate([pendingSamples, np.frombuffer(data[:usableBytes], dtype = np.float32)])
+		amountBlocks = len(samples) // blockLength
+		pendingSamples = samples[amountBlocks * blockLength:]
+
+		# RMS of every block
+		blocks = samples[:amountBlocks * blockLength].reshape(-1, blockLength)
+		energy.append(np.sqrt(np.mean(np.square(blocks, dtype = np.float64), axis = 1)))
+
+	process.wait()
+
+	if process.returncode:
+		raise RuntimeError("Failed to decode audio stream " + str(idxStream) + " of \"" + filePath + "\"")
+
+	return getOnsetEnvelope(np.concatenate(energy) if energy else np.zeros(0))
+
+
+def resampleEnvelope(envelope, speed):
+	# Envelope of the audio on the time axis of the video: value n is taken from audio time speed * n
+	positions = np.arange(int(len(envelope) / speed)) * speed
+	return np.interp(positions, np.arange(len(envelope)), envelope)
+
+
+def getFftSize(length):
+	return 1 << max(int(length - 1).bit_length(), 1)
+
+
+def getPeak(correlation):
+	# Position of the maximum with sub-sample accuracy (parabola through the neighbours) and its height in standard deviations
+	idxPeak = np.argmax(correlation, axis = -1)
+	rows = np.arange(correlation.shape[0])
+
+	left = correlation[rows, np.maximum(idxPeak - 1, 0)]
+	center = correlation[rows, idxPeak]
+	right = correlation[rows, np.minimum(idxPeak + 1, correlation.shape[1] - 1)]
+
+	denominator = left - 2 * center + right
+	shift = np.divide(0.5 * (left - right), denominator, out = np.zeros_like(center), where = denominator < 0)
+
+	deviation = np.std(correlation, axis = -1)
+	confidence = np.divide(center - np.mean(correlation, axis = -1), deviation, out = np.zeros_like(center), where = deviation > 0)
+
+	return idxPeak + shift, confidence
+
+
+def estimateGlobalOffset(videoEnvelope, audioEnvelope, speeds):
+	# Cross-correlation of the whole episode for every candidate speed, returns [speed, lag in samples, confidence]
+	best = None
+
+	for speed in speeds:
+		resampled = resampleEnvelope(audioEnvelope, speed)
+		fftSize = getFftSize(len(videoEnvelope) + len(resampled))
+
+		# correlation[k] = sum(video[n] * audio[n + k]), negative lags are stored at the end
+		correlation = np.fft.irfft(np.fft.rfft(resampled, fftSize) * np.conj(np.fft.rfft(videoEnvelope, fftSize)), fftSize)
+		correlation = np.concatenate([correlation[fftSize - len(videoEnvelope) + 1:], correlation[:len(resampled)]])
+
+		peak, confidence = getPeak(correlation[np.newaxis, :])
+		lag = peak[0] - (len(videoEnvelope) - 1)
+
+		if best is None or confidence[0] > best[2]:
+			best = [speed, lag, confidence[0]]
+
+	return best
+
+
+def refineOffset(videoEnvelope, resampled, lag):
+	# Offset of every window relative to the offset of the whole episode, all windows are correlated at once
+	windowSamples = int(windowLength * envelopeRate)
+	searchSamples = int(windowSearchRange * envelopeRate)
+	roundedLag = int(round(lag))
+
+	starts = np.linspace(0, len(videoEnvelope) - windowSamples, amountWindows).astype(int)
+	segmentStarts = starts + roundedLag - searchSamples
+
+	# Windows must be covered by both envelopes
+	valid = (starts >= 0) & (segmentStarts >= 0) & (segmentStarts + windowSamples + 2 * searchSamples <= len(resampled))
+	starts = starts[valid]
+	segmentStarts = segmentStarts[valid]
+
+	if len(starts) == 0:
+		return np.zeros(0), np.zeros(0), np.zeros(0)
+
+	windows = videoEnvelope[starts[:, np.newaxis] + np.arange(windowSamples)]
+	segments = resampled[segmentStarts[:, np.newaxis] + np.arange(windowSamples + 2 * searchSamples)]
+
+	fftSize = getFftSize(windowSamples + segments.shape[1])
+	correlation = np.fft.irfft(
+		np.fft.rfft(segments, fftSize, axis = 1) * np.conj(np.fft.rfft(windows, fftSize, axis = 1)),
+		fftSize,
+		axis = 1
+	)[:, :2 * searchSamples + 1]
+
+	peaks, confidence = getPeak(correlation)
+
+	times = (starts + windowSamples / 2) / envelopeRate
+	lags = (roundedLag - searchSamples + peaks) / envelopeRate
+
+	return times, lags, confidence
+
+
+def fitOffset(times, lags, confidence):
+	# Straight line through the window offsets, windows far from the line (cuts, different scenes) are removed
+	inliers = confidence >= minConfidence
+
+	for _ in range(3):
+		if np.count_nonzero(inliers) < 3:
+			return None
+
+		slope, intercept = np.polyfit(times[inliers], lags[inliers], 1)
+		residuals = np.abs(lags - (slope * times + intercept))
+		limit = max(3 * np.median(residuals[inliers]), 1.0 / envelopeRate)
+		inliers = (confidence >= minConfidence) & (residuals <= limit)
+
+	if np.count_nonzero(inliers) < 3:
+		return None
+
+	slope, intercept = np.polyfit(times[inliers], lags[inliers], 1)
+	residual = float(np.median(np.abs(lags[inliers] - (slope * times[inliers] + intercept))))
+
+	return [slope, intercept, inliers, residual]
+
+
+def getCandidateSpeeds(videoFramerate):
+	speeds = [1.0]
+
+	for fps in candidateFps:
+		speed = videoFramerate / fps
+
+		if all(abs(speed / other - 1) > speedSnapTolerance for other in speeds):
+			speeds.append(speed)
+
+	return speeds
+
+
+def snapSpeed(speed, videoFramerate):
+	# Returns [speed, AudioFPS], AudioFPS is 0 if the speed is not changed
+	for candidateSpeed in getCandidateSpeeds(videoFramerate):
+		if abs(speed / candidateSpeed - 1) <= speedSnapTolerance:
+			if candidateSpeed == 1.0:
+				return [1.0, 0]
+
+			return [candidateSpeed, videoFramerate / candidateSpeed]
+
+	return [speed, videoFramerate / speed]
+
+
+def estimateSync(videoEnvelope, audioEnvelope, speeds):
+	# Fits audio time = speed * video time + start
+	speed, lag, confidence = estimateGlobalOffset(videoEnvelope, audioEnvelope, speeds)
+	resampled = resampleEnvelope(audioEnvelope, speed)
+
+	times, lags, windowConfidence = refineOffset(videoEnvelope, resampled, lag)
+	fit = fitOffset(times, lags, windowConfidence)
+
+	if fit is None:
+		# Too few usable windows, only the offset of the whole episode is known
+		return SyncEstimate(speed, speed * lag / envelopeRate, len(videoEnvelope) / envelopeRate / 2, confidence, len(times), 0, None)
+
+	slope, intercept, inliers, residual = fit
+
+	# Window offsets are measured on the resampled audio: audio time = speed * (video time + offset)
+	return SyncEstimate(
+		speed * (1 + slope),
+		speed * intercept,
+		float(np.mean(times[inliers])),
+		confidence,
+		len(times),
+		int(np.count_nonzero(inliers)),
+		residual * speed
+	)
+
+
+def estimateSyncFiles(videoFilePath, idxVideoStream, audioFilePath, idxAudioStream, speeds):
+	return estimateSync(
+		decodeEnvelope(videoFilePath, idxVideoStream),
+		decodeEnvelope(audioFilePath, idxAudioStream),
+		speeds
+	)
+
+
+def getSuggestedValues(estimate, videoFramerate, audioStart):
+	# Converts the fit to the settings of info.xml: [AudioOffset, AudioFPS]
+	speed, audioFps = snapSpeed(estimate.speed, videoFramerate)
+	start = estimate.start
+
+	# Line with the exact speed of the frame rate through the center of the fit
+	start += (estimate.speed - speed) * estimate.center
+
+	# Positive AudioOffset delays the audio (video time), negative AudioOffset skips audio (audio time)
+	if start >= audioStart:
+		audioOffset = -(start - audioStart)
+	else:
+		audioOffset = (audioStart - start) / speed
+
+	return [audioOffset, audioFps]
+
+
+def estimateEpisode(job):
+	# job: [season node, episode node, video file path, audio file path, AudioStart in seconds]
+	_, episode, videoFilePath, audioFilePath, audioStart = job
+	name = episode.find("PrefixEpisode").text if episode.find("PrefixEpisode") is not None else videoFilePath
+
+	try:
+		videoFramerate = getVideoFramerate(videoFilePath)
+		estimate = estimateSyncFiles(
+			videoFilePath,
+			videoAudioStream,
+			audioFilePath,
+			audioAudioStream,
+			getCandidateSpeeds(videoFramerate)
+		)
+	except (OSError, ValueError, KeyError, IndexError, RuntimeError, subprocess.CalledProcessError) as e:
+		logWrite("Error: Estimation of \"" + videoFilePath + "\" failed! Exception: " + str(e))
+		return None
+
+	audioOffset, audioFps = getSuggestedValues(estimate, videoFramerate, audioStart)
+
+	logWrite(
+		str(name)
+		+ ": AudioOffset "
+		+ secondsToTimeString(audioOffset)
+		+ ", AudioFPS "
+		+ (f"{audioFps:.3f}" if audioFps > 0 else "unchanged")
+		+ " (confidence "
+		+ f"{estimate.confidence:.1f}"
+		+ ", "
+		+ str(estimate.amountInliers)
+		+ " of "
+		+ str(estimate.amountWindows)
+		+ " windows"
+		+ (", residual " + f"{estimate.residual * 1000:.0f}" + " ms" if estimate.residual is not None else "")
+		+ ")"
+	)
+
+	if estimate.confidence < minConfidence or estimate.amountInliers < 3:
+		logWrite("Warning: Estimate of \"" + videoFilePath + "\" is unreliable, check it manually")
+
+	return [audioOffset, audioFps]
+
+
+def setElementText(parent, tag, text, previousTag):
+	# Element is inserted after previousTag with the same indentation if it does not exist yet
+	element = parent.find(tag)
+
+	if element is None:
+		previous = parent.find(previousTag)
+		element = ET.Element(tag)
+		element.tail = previous.tail
+		parent.insert(list(parent).index(previous) + 1, element)
+
+	element.text = text
+
+
+def resolveFileName(episode, tagName, directory):
+	if episode.find(tagName) is not None:
+		return directory + episode.find(tagName).text
+
+	# Partial file name: first file of the folder containing it
+	pattern = episode.find(tagName + "Contains").text
+	matches = sorted(fileName for fileName in os.listdir(directory) if pattern in fileName)
+
+	if not matches:
+		raise FileNotFoundError("No file in " + directory + " contains \"" + pattern + "\"")
+
+	return directory + matches[0]
+
+
+# =========================== Start of Script ===========================================
+
+if __name__ == "__main__":
+	# Clear log file
+	open(logFile, 'w').close()
+
+	# Write name of script to log file
+	logWrite("This is " + os.path.basename(__file__))
+
+	# Get root element of XML file
+	tree = ET.parse(inputPath + "info.xml")
+	root_node = tree.getroot()
+
+	# Get video and audio file paths from XML
+	videoPath = root_node.find("FilePathVideo").text
+	audioPath = root_node.find("FilePathAudio").text
+
+	episodeJobs = []
+
+	# Loop over all seasons in XML file
+	for season in root_node.findall("Season"):
+		# Check if only specific seasons should be processed
+		skip = False
+		if seasons:
+			skip = True
+			# Check if season was specified to be processed
+			for seasonNumber in seasons:
+				if seasonNumber in season.find("PrefixSeason").text:
+					skip = False
+
+		if skip:
+			continue
+
+		# Get path for season
+		seasonPath = season.find("FilePathSeason").text
+
+		# Get start time for audio
+		audioStart = timeStringToSeconds(season.find("AudioStart").text)
+
+		# Loop over all episodes within one season
+		for episode in season.find("Episodes").findall("Episode"):
+			# Check if only specific episodes should be processed
+			skip = False
+			if episodes:
+				skip = True
+				# Check if episode was specified to be processed
+				for episodeNumber in episodes:
+					if episodeNumber in episode.find("PrefixEpisode").text:
+						skip = False
+
+			if skip:
+				continue
+
+			try:
+				episodeJobs.append([
+					season,
+					episode,
+					resolveFileName(episode, "FileNameVideo", inputPath + videoPath + seasonPath),
+					resolveFileName(episode, "FileNameAudio", inputPath + audioPath + seasonPath),
+					audioStart
+				])
+			except (OSError, AttributeError) as e:
+				logWrite("Error: Could not find files of episode! Exception: " + str(e))
+
+	# Decoding runs in ffmpeg and the FFTs release the GIL, threads are sufficient
+	with ThreadPool(max(MAX_THREADS, 1)) as estimatePool:
+		results = estimatePool.map(estimateEpisode, episodeJobs)
+
+	for job, result in zip(episodeJobs, results):
+		if result is None:
+			continue
+
+		audioOffset, audioFps = result
+		setElementText(job[1], "AudioOffset", secondsToTimeString(audioOffset), "PrefixEpisode")
+
+		# 0 overrides an AudioFPS of the season or show
+		if audioFps > 0 or job[0].find("AudioFPS") is not None or root_node.find("AudioFPS") is not None or job[1].find("AudioFPS") is not None:
+			setElementText(job[1], "AudioFPS", f"{audioFps:.3f}" if audioFps > 0 else "0", "AudioOffset")
+
+	tree.write(inputPath + outputFileName, encoding = "utf-8", xml_declaration = True)
+	logWrite("Suggested values written to \"" + inputPath + outputFileName + "\"")
@@ -1,9 +1,19 @@
 import os
 import shutil
+import asyncio
 import subprocess
+import time
 import xml.etree.ElementTree as ET
+from multiprocessing.pool import ThreadPool
 from datetime import datetime
 
+try:
+	import fcntl
+except ImportError:
+	fcntl = None
+
+import track_statistics as trackStatistics
+
 # =========================== Settings ==================================================
 
 # Empty list selects all seasons (specify as string)
@@ -22,8 +32,29 @@ titleLanguage = "DE"
 # Maximum number of simultaneous threads
 MAX_THREADS = 10
 
+# Process all episodes concurrently with asyncio, copying the next file overlaps with tagging the previous one
+enableAsyncRunner = False
+# Maximum number of simultaneous copies
+MAX_COPY_JOBS = 1
+# Maximum number of simultaneous mkvpropedit calls
+MAX_TAG_JOBS = 2
+
+# Copy method if input and output are on the same filesystem
+# "copy": always copy the data
+# "reflink": copy on write clone (Linux only: Btrfs, XFS, ...), falls back to copy_file_range and a regular copy
+# "hardlink": no copy at all, but mkvpropedit changes the input file as well!
+# The method actually used is logged for every file
+copyMethod = "copy"
+
+# Track statistics tags (BPS, DURATION, NUMBER_OF_FRAMES, NUMBER_OF_BYTES) of the output file
+# "index": input packets are indexed with ffprobe while the file is copied, the tags are written with the title in one header update
+#          statistics already present in the input are kept, the output is an identical copy
+# "scan": mkvpropedit --add-track-statistics-tags reads the whole output file again (also used if indexing fails)
+trackStatisticsMode = "index"
+
 # Application paths
 ffmpeg = "ffmpeg.exe"
+ffprobe = "ffprobe.exe"
 mkvpropedit = "mkvpropedit.exe"
 
 # Log file location
@@ -57,52 +88,232 @@ def errorCritical(errorStr):
 	exit()
 
 
-def listSearch(elementList, value):
-	for element in elementList:
-		if value in element:
-			return element
+def resolveFileNames(directory, patterns):
+	# Read directory only once and search it for all patterns in a single pass
+	try:
+		with os.scandir(directory) as iterator:
+			fileNames = sorted(entry.name for entry in iterator if entry.is_file())
+	except OSError as e:
+		logWrite("Error: Could not read directory " + directory + "! Exception: " + str(e))
+		fileNames = []
 
-	return ''
+	matches = {pattern: [] for pattern in patterns}
 
+	for fileName in fileNames:
+		for pattern in matches:
+			if pattern in fileName:
+				matches[pattern].append(fileName)
 
-def processEpisode(_prefixShow, _prefixSeason, ep):
-	# Check if video file exists
-	inputFolderPath = inputPath + seasonPath
-	outputFolderPath = outputPath + seasonPath
+	resolved = {}
+
+	for pattern, matchList in matches.items():
+		if not matchList:
+			logWrite("Warning: No file in " + directory + " contains \"" + pattern + "\"")
+			resolved[pattern] = ''
+			continue
+
+		if len(matchList) > 1:
+			logWrite("Warning: Multiple files in " + directory + " contain \"" + pattern + "\": "
+					 + ", ".join(matchList) + " (using " + matchList[0] + ")")
+
+		resolved[pattern] = matchList[0]
+
+	return resolved
+
+
+def getEpisodePaths(_prefixShow, _prefixSeason, _seasonPath, ep):
+	inputFolderPath = inputPath + _seasonPath
+	outputFolderPath = outputPath + _seasonPath
 	episodeFullTitle = _prefixShow \
 					   + _prefixSeason \
 					   + ep.filePrefix \
 					   + (ep.titleDE if titleLanguage == "DE" else ep.titleEN)
 	fileExtension = os.path.splitext(inputFolderPath + ep.fileVideo)[1]
 
-	# Rename file
-	if os.path.exists(inputFolderPath + ep.fileVideo):
-		# Rename existing if input == output
-		if inputFolderPath == outputFolderPath:
-			os.rename(inputFolderPath + ep.fileVideo, inputFolderPath + episodeFullTitle + fileExtension)
-		# Copy otherwise
-		else:
-			# Check if output folder exists and create it if it doesn't
-			if not os.path.isdir(outputPath + seasonPath):
-				os.makedirs(outputPath + seasonPath)
+	return inputFolderPath + ep.fileVideo, outputFolderPath + episodeFullTitle + fileExtension, episodeFullTitle
+
+
+def cloneFile(inputFilePath, outputFilePath):
+	# FICLONE ioctl (Linux), shares the data blocks until one of the files is changed
+	if fcntl is None:
+		return False
+
+	with open(inputFilePath, 'rb') as inputFile, open(outputFilePath, 'wb') as outputFile:
+		try:
+			fcntl.ioctl(outputFile.fileno(), 0x40049409, inputFile.fileno())
+			return True
+		except OSError:
+			return False
+
+
+def copyFileRange(inputFilePath, outputFilePath):
+	# Data is copied by the kernel (or the file server) without passing through user space
+	if not hasattr(os, "copy_file_range"):
+		return False
+
+	with open(inputFilePath, 'rb') as inputFile, open(outputFilePath, 'wb') as outputFile:
+		remaining = os.fstat(inputFile.fileno()).st_size
+
+		try:
+			while remaining > 0:
+				copied = os.copy_file_range(inputFile.fileno(), outputFile.fileno(), min(remaining, 2 ** 30))
+
+				if copied == 0:
+					break
+
+				remaining -= copied
+		except OSError:
+			return False
+
+	return remaining == 0
+
+
+def transferFile(inputFilePath, outputFilePath):
+	# Rename existing if input == output
+	if os.path.dirname(inputFilePath) == os.path.dirname(outputFilePath):
+		os.rename(inputFilePath, outputFilePath)
+		return "rename"
+
+	# Copy otherwise
+	# Check if output folder exists and create it if it doesn't
+	os.makedirs(os.path.dirname(outputFilePath), exist_ok = True)
+
+	sameFilesystem = os.stat(inputFilePath).st_dev == os.stat(os.path.dirname(outputFilePath)).st_dev
+
+	if sameFilesystem and copyMethod == "hardlink":
+		if os.path.exists(outputFilePath):
+			os.remove(outputFilePath)
+
+		os.link(inputFilePath, outputFilePath)
+		return "hardlink"
+
+	if sameFilesystem and copyMethod == "reflink":
+		if cloneFile(inputFilePath, outputFilePath):
+			return "reflink"
+
+		if copyFileRange(inputFilePath, outputFilePath):
+			return "copy_file_range"
+
+	shutil.copyfile(inputFilePath, outputFilePath)
+	return "copy"
+
+
+def logThroughput(action, filePath, method, seconds):
+	fileSize = os.path.getsize(filePath)
+
+	logWrite(
+		"Info: " + action + " " + filePath + " (" + method + "): "
+		+ f"{fileSize / 1000 ** 2:.0f} MB in {seconds:.1f} s"
+		+ f" ({fileSize / 1000 ** 2 / seconds if seconds > 0 else 0:.1f} MB/s)"
+	)
+
 
-			shutil.copyfile(inputFolderPath + ep.fileVideo, outputFolderPath + episodeFullTitle + fileExtension)
+def indexTrackStatistics(filePath):
+	# Returns tags for mkvpropedit, None if the output file has to be scanned
+	if trackStatisticsMode != "index" or os.path.splitext(filePath)[1].lower() != ".mkv":
+		return None
 
-		# Set title in video file properties
-		subprocess.run([
-			mkvpropedit,
-			outputFolderPath + episodeFullTitle + fileExtension,
-			"-e",
-			"info",
-			"-s",
-			"title=" + episodeFullTitle,
-			"--add-track-statistics-tags"
-		])
+	try:
+		return trackStatistics.indexTrackStatistics(ffprobe, filePath, os.path.basename(__file__))
+	except (OSError, ValueError, subprocess.CalledProcessError) as e:
+		logWrite("Warning: Could not index " + filePath + ", scanning output file instead! Exception: " + str(e))
+		return None
 
-		logWrite("Info: " + "Renamed " + inputFolderPath + ep.fileVideo + " to " + outputFolderPath + episodeFullTitle + fileExtension)
+
+def transferAndIndexFile(inputFilePath, outputFilePath):
+	# Renaming is instant, nothing to overlap with: the index reads the whole file on its own (as "scan" would do)
+	# The input is indexed before the rename, an opened file cannot be renamed on Windows
+	if os.path.dirname(inputFilePath) == os.path.dirname(outputFilePath):
+		statisticsTags = indexTrackStatistics(inputFilePath)
+		return transferFile(inputFilePath, outputFilePath), statisticsTags
+
+	# Input is indexed while it is copied, the copy and ffprobe read the same data
+	with ThreadPool(1) as indexPool:
+		indexResult = indexPool.apply_async(indexTrackStatistics, (inputFilePath,))
+
+		try:
+			method = transferFile(inputFilePath, outputFilePath)
+		finally:
+			# Waits for the index, exceptions of the index thread are raised here
+			statisticsTags = indexResult.get()
+
+	return method, statisticsTags
+
+
+def buildTagCommand(filePath, episodeFullTitle, statisticsTags):
+	# Set title in video file properties
+	command = [
+		mkvpropedit,
+		filePath,
+		"-e",
+		"info",
+		"-s",
+		"title=" + episodeFullTitle
+	]
+
+	if statisticsTags is None:
+		command.append("--add-track-statistics-tags")
+	else:
+		command.extend(statisticsTags[0])
+
+	return command
+
+
+def processEpisode(_prefixShow, _prefixSeason, _seasonPath, ep):
+	inputFilePath, outputFilePath, episodeFullTitle = getEpisodePaths(_prefixShow, _prefixSeason, _seasonPath, ep)
+
+	# Check if video file exists
+	if os.path.exists(inputFilePath):
+		startTime = time.monotonic()
+		method, statisticsTags = transferAndIndexFile(inputFilePath, outputFilePath)
+		logThroughput("Transferred", outputFilePath, method, time.monotonic() - startTime)
+
+		startTime = time.monotonic()
+		subprocess.run(buildTagCommand(outputFilePath, episodeFullTitle, statisticsTags))
+		trackStatistics.removeTagFiles(statisticsTags)
+		logThroughput("Tagged", outputFilePath, "mkvpropedit", time.monotonic() - startTime)
+
+		logWrite("Info: " + "Renamed " + inputFilePath + " to " + outputFilePath)
 
 	else:
-		logWrite("Error: " + inputFolderPath + ep.fileVideo + "does not exist!")
+		logWrite("Error: " + inputFilePath + "does not exist!")
+
+
+async def processEpisodeAsync(_prefixShow, _prefixSeason, _seasonPath, ep, copySemaphore, tagSemaphore):
+	inputFilePath, outputFilePath, episodeFullTitle = getEpisodePaths(_prefixShow, _prefixSeason, _seasonPath, ep)
+
+	# Check if video file exists
+	if not os.path.exists(inputFilePath):
+		logWrite("Error: " + inputFilePath + "does not exist!")
+		return
+
+	# Copying blocks, it is moved to a worker thread of the event loop
+	async with copySemaphore:
+		startTime = time.monotonic()
+		method, statisticsTags = await asyncio.to_thread(transferAndIndexFile, inputFilePath, outputFilePath)
+		logThroughput("Transferred", outputFilePath, method, time.monotonic() - startTime)
+
+	# Next file is copied while this one is tagged
+	async with tagSemaphore:
+		startTime = time.monotonic()
+		process = await asyncio.create_subprocess_exec(*buildTagCommand(outputFilePath, episodeFullTitle, statisticsTags))
+		await process.wait()
+		trackStatistics.removeTagFiles(statisticsTags)
+		logThroughput("Tagged", outputFilePath, "mkvpropedit", time.monotonic() - startTime)
+
+	logWrite("Info: " + "Renamed " + inputFilePath + " to " + outputFilePath)
+
+
+async def processEpisodesAsync(episodeJobs):
+	# Semaphores have to be created inside the event loop
+	copySemaphore = asyncio.Semaphore(max(MAX_COPY_JOBS, 1))
+	tagSemaphore = asyncio.Semaphore(max(MAX_TAG_JOBS, 1))
+
+	startTime = time.monotonic()
+
+	await asyncio.gather(*[processEpisodeAsync(*episodeJob, copySemaphore, tagSemaphore) for episodeJob in episodeJobs])
+
+	logWrite("Info: Processed " + str(len(episodeJobs)) + f" episodes in {time.monotonic() - startTime:.1f} s")
 
 
 # =========================== Start of Script ===========================================
@@ -113,12 +324,18 @@ open(logFile, 'w').close()
 # Write name of script to log file
 logWrite("This is " + os.path.basename(__file__))
 
+if copyMethod == "hardlink":
+	logWrite("Warning: copyMethod \"hardlink\" is selected, mkvpropedit changes the input files as well!")
+
 # Get root element of XML file
 root_node = ET.parse(infoPath + "info.xml").getroot()
 
 # Get show prefix for output file name from XML
 prefixShow = root_node.find("PrefixShow").text
 
+# Episodes of all seasons for the asynchronous runner
+episodeJobs = []
+
 # Loop over all seasons in XML file
 for season in root_node.findall("Season"):
 	# Check if only specific seasons should be processed
@@ -156,15 +373,26 @@ for season in root_node.findall("Season"):
 		if skip:
 			continue
 
-		dirList = os.listdir(inputPath + seasonPath)
-
+		# File name is resolved for all episodes of the season at once
 		episodeSettings.append(SettingsEpisode(
-			listSearch(dirList, episode.find("FileNameVideoContains").text),
+			episode.find("FileNameVideoContains").text,
 			episode.find("TitleDE").text,
 			episode.find("TitleEN").text,
 			episode.find("PrefixEpisode").text,
 		))
 
+	resolvedFiles = resolveFileNames(inputPath + seasonPath, [es.fileVideo for es in episodeSettings])
+
+	for es in episodeSettings:
+		es.fileVideo = resolvedFiles[es.fileVideo]
+
 	while episodeSettings:
 		es = episodeSettings.pop()
-		processEpisode(prefixShow, prefixSeason, es)
+
+		if enableAsyncRunner:
+			episodeJobs.append([prefixShow, prefixSeason, seasonPath, es])
+		else:
+			processEpisode(prefixShow, prefixSeason, seasonPath, es)
+
+if episodeJobs:
+	asyncio.run(processEpisodesAsync(episodeJobs))
@@ -0,0 +1,226 @@
+import os
+import sys
+import subprocess
+import tempfile
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+from datetime import datetime
+
+# =========================== Settings ==================================================
+
+# Files or folders (searched recursively), replaced by the command line arguments if there are any
+inputPaths = []
+
+# Matroska files get the cover as attachment in place (mkvpropedit), only the header of the file is rewritten
+matroskaExtensions = [".mkv"]
+# Other containers are remuxed with the cover as attached picture stream
+remuxExtensions = [".mp4", ".m4v", ".mov"]
+
+# Position of the thumbnail (seconds), the first keyframe after this position is used
+thumbnailTime = 1.0
+# JPEG quality of the thumbnail (2: best, 31: worst)
+thumbnailQuality = 2
+
+# Attachment written to Matroska files, an existing attachment with the same name is replaced
+coverFileName = "cover.jpg"
+
+# Maximum number of files processed simultaneously
+MAX_THREADS = 4
+
+# Application paths
+ffmpeg = "ffmpeg.exe"
+ffprobe = "ffprobe.exe"
+mkvpropedit = "mkvpropedit.exe"
+
+# Log file location
+logFile = "logs/log_" + os.path.splitext(os.path.basename(__file__))[0] + datetime.today().now().strftime("%Y%m%d_%H%M%S") + ".txt"
+
+
+# =========================== Functions =================================================
+
+logLock = threading.Lock()
+
+
+def logWrite(logStr):
+	# Files are processed by several threads
+	with logLock:
+		print(logStr)
+		with open(logFile, 'a') as fileHandle:
+			fileHandle.write(logStr + '\n')
+
+
+def findFiles(paths):
+	filePaths = []
+	extensions = matroskaExtensions + remuxExtensions
+
+	for path in paths:
+		if os.path.isfile(path):
+			filePaths.append(path)
+			continue
+
+		for dirPath, dirNames, fileNames in os.walk(path):
+			dirNames.sort()
+
+			for fileName in sorted(fileNames):
+				if os.path.splitext(fileName)[1].lower() in extensions:
+					filePaths.append(os.path.join(dirPath, fileName))
+
+	return filePaths
+
+
+def extractThumbnail(filePath, thumbnailPath):
+	# Input seeking jumps to the keyframe before thumbnailTime, only keyframes are decoded from there
+	subprocess.run([
+		ffmpeg,
+		"-hide_banner",
+		"-loglevel",
+		"error",
+		"-y",
+		"-noaccurate_seek",
+		"-ss",
+		str(thumbnailTime),
+		"-skip_frame",
+		"nokey",
+		"-i",
+		filePath,
+		"-map",
+		"0:v:0",
+		"-frames:v",
+		"1",
+		"-q:v",
+		str(thumbnailQuality),
+		thumbnailPath
+	], check = True)
+
+
+def hasCoverAttachment(filePath):
+	processOut = subprocess.check_output([
+		ffprobe,
+		"-v",
+		"error",
+		"-select_streams",
+		"t",
+		"-show_entries",
+		"stream_tags=filename",
+		"-of",
+		"csv=p=0",
+		filePath
+	]).decode("utf-8")
+
+	return coverFileName in [line.strip() for line in processOut.splitlines()]
+
+
+def attachThumbnail(filePath, thumbnailPath):
+	# Only the Matroska header and the attachments are rewritten, the video data stays in place
+	command = [mkvpropedit, filePath]
+
+	if hasCoverAttachment(filePath):
+		command.extend(["--delete-attachment", "name:" + coverFileName])
+
+	command.extend([
+		"--attachment-name",
+		coverFileName,
+		"--attachment-mime-type",
+		"image/jpeg",
+		"--add-attachment",
+		thumbnailPath
+	])
+
+	subprocess.run(command, stdout = subprocess.DEVNULL, check = True)
+
+
+def remuxThumbnail(filePath, thumbnailPath):
+	# Same streams as the former set_thumbnail.bat, the thumbnail becomes an attached picture
+	baseName, extension = os.path.splitext(filePath)
+	tempFilePath = baseName + ".thumbnail" + extension
+
+	try:
+		subprocess.run([
+			ffmpeg,
+			"-hide_banner",
+			"-loglevel",
+			"error",
+			"-y",
+			"-i",
+			filePath,
+			"-i",
+			thumbnailPath,
+			"-map",
+			"0:v:0",
+			"-map",
+			"0:a?",
+			"-map",
+			"1:v",
+			"-c",
+			"copy",
+			"-c:v:1",
+			"mjpeg",
+			"-disposition:v:1",
+			"attached_pic",
+			"-metadata:s:v:1",
+			"title=Cover",
+			"-metadata:s:v:1",
+			"comment=Cover (front)",
+			tempFilePath
+		], check = True)
+
+		# Original is replaced in one step, no backup copy needed
+		os.replace(tempFilePath, filePath)
+	finally:
+		if os.path.exists(tempFilePath):
+			os.remove(tempFilePath)
+
+
+def processFile(filePath):
+	startTime = time.monotonic()
+	extension = os.path.splitext(filePath)[1].lower()
+
+	if extension not in matroskaExtensions + remuxExtensions:
+		logWrite("Warning: Unsupported file type, skipping \"" + filePath + "\"")
+		return False
+
+	try:
+		with tempfile.TemporaryDirectory() as tempDirectory:
+			thumbnailPath = os.path.join(tempDirectory, coverFileName)
+			extractThumbnail(filePath, thumbnailPath)
+
+			if extension in matroskaExtensions:
+				attachThumbnail(filePath, thumbnailPath)
+				method = "attached"
+			else:
+				remuxThumbnail(filePath, thumbnailPath)
+				method = "remuxed"
+	except (OSError, subprocess.CalledProcessError) as e:
+		logWrite("Error: Failed to set thumbnail of \"" + filePath + "\"! Exception: " + str(e))
+		return False
+
+	logWrite("Info: Thumbnail " + method + " in " + f"{time.monotonic() - startTime:.1f}" + " s: \"" + filePath + "\"")
+	return True
+
+
+# =========================== Start of Script ===========================================
+
+if __name__ == "__main__":
+	# Files and folders dropped on set_thumbnail.bat
+	if len(sys.argv) > 1:
+		inputPaths = sys.argv[1:]
+
+	if os.path.dirname(logFile) != "":
+		os.makedirs(os.path.dirname(logFile), exist_ok = True)
+
+	# Clear log file
+	open(logFile, 'w').close()
+
+	# Write name of script to log file
+	logWrite("This is " + os.path.basename(__file__))
+
+	filePaths = findFiles(inputPaths)
+
+	with ThreadPool(max(MAX_THREADS, 1)) as thumbnailPool:
+		results = thumbnailPool.map(processFile, filePaths)
+
+	logWrite("Set thumbnail of " + str(sum(results)) + " of " + str(len(filePaths)) + " files")
+
+	if not all(results):
+		sys.exit(1)
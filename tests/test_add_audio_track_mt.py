@@ -0,0 +1,173 @@
+import os
+import types
+import asyncio
+import tempfile
+import threading
+import unittest
+
+# =========================== Settings ==================================================
+
+scriptFile = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "add_audio_track_mt.py")
+
+# Time to wait for a job that is expected to start (seconds)
+startTimeout = 2.0
+
+
+# =========================== Functions =================================================
+
+def loadScript():
+	# Settings and functions of the script, the batch processing below "Start of Script" is not run
+	with open(scriptFile, 'r', encoding = "utf-8") as fileHandle:
+		source = fileHandle.read()
+
+	namespace = {"__name__": "add_audio_track_mt", "__file__": scriptFile}
+	exec(compile(source.split("# =========================== Start of Script")[0], scriptFile, "exec"), namespace)
+
+	return namespace
+
+
+class VolumeSchedulerTest(unittest.TestCase):
+	def setUp(self):
+		self.script = loadScript()
+		self.script["enableVolumeScheduling"] = True
+		self.tempDirectory = tempfile.TemporaryDirectory()
+
+		# All files are on the same volume
+		self.filePaths = [os.path.join(self.tempDirectory.name, "episode" + str(idx) + ".mkv") for idx in range(3)]
+
+	def tearDown(self):
+		self.tempDirectory.cleanup()
+
+	def waitForWaiting(self, scheduler, amountWaiting):
+		for _ in range(int(startTimeout / 0.01)):
+			with scheduler.condition:
+				if len(scheduler.waiting) >= amountWaiting:
+					return
+
+			threading.Event().wait(0.01)
+
+		self.fail("Jobs were not queued")
+
+	def testAdmissionWakesJobsWaitingForDiskOrder(self):
+		scheduler = self.script["VolumeScheduler"](2, {})
+		reservations = {}
+		started = {idx: threading.Event() for idx in [1, 2]}
+
+		def runJob(idx):
+			reservations[idx] = scheduler.acquire([self.filePaths[idx]], idx)
+			started[idx].set()
+
+		# Job 0 is located first on the disk, jobs 1 and 2 are queued behind it
+		reservations[0] = scheduler.register([self.filePaths[0]], 0)
+		threads = [threading.Thread(target = runJob, args = (idx,), daemon = True) for idx in [1, 2]]
+
+		for thread in threads:
+			thread.start()
+
+		self.waitForWaiting(scheduler, 3)
+		self.assertTrue(scheduler.tryAdmit(reservations[0]))
+
+		# Two jobs run without any release, the third one waits for the limit
+		self.assertTrue(started[1].wait(startTimeout))
+		self.assertFalse(started[2].wait(0.2))
+
+		scheduler.release(reservations[0])
+		self.assertTrue(started[2].wait(startTimeout))
+
+		scheduler.release(reservations[1])
+		scheduler.release(reservations[2])
+
+		for thread in threads:
+			thread.join(startTimeout)
+
+	def testAsyncAdmissionWakesJobsWaitingForDiskOrder(self):
+		scheduler = self.script["VolumeScheduler"](2, {})
+
+		async def runJobs():
+			# Job 0 is located first on the disk, jobs 1 and 2 are queued behind it
+			reservation = scheduler.register([self.filePaths[0]], 0)
+			tasks = {idx: asyncio.create_task(scheduler.acquireAsync([self.filePaths[idx]], idx)) for idx in [1, 2]}
+
+			while len(scheduler.waiting) < 3:
+				await asyncio.sleep(0.01)
+
+			# Waiters are blocked in the event loop before job 0 is admitted
+			await asyncio.sleep(0.1)
+			self.assertTrue(scheduler.tryAdmit(reservation))
+
+			# Two jobs run without any release, the third one waits for the limit
+			done, pending = await asyncio.wait(tasks.values(), timeout = startTimeout, return_when = asyncio.FIRST_COMPLETED)
+			self.assertEqual(list(done), [tasks[1]])
+			await asyncio.sleep(0.2)
+			self.assertFalse(tasks[2].done())
+
+			scheduler.release(reservation)
+			await asyncio.wait_for(tasks[2], startTimeout)
+
+			scheduler.release(tasks[1].result())
+			scheduler.release(tasks[2].result())
+
+		asyncio.run(runJobs())
+
+
+
+class SegmentTest(unittest.TestCase):
+	def setUp(self):
+		self.script = loadScript()
+		self.script["enableNormalization"] = True
+		self.script["enableSegmentedEncode"] = True
+		self.script["segmentMinDuration"] = 1800
+		self.script["segmentLength"] = 300
+		self.script["segmentPadding"] = 1
+		self.script["trim_before_resample"] = True
+
+	def createJob(self, audioStart):
+		# One original audio stream (file 0) and one added audio stream (file 1) with the same length as the video
+		job = types.SimpleNamespace(
+			settings				= types.SimpleNamespace(audioStart = audioStart, audioOffset = "00:00:00"),
+			infoVideo				= self.script["InfoVideo"](),
+			infoAudio				= [self.script["InfoAudio"](), self.script["InfoAudio"]()],
+			videoFilePath			= "episode.mkv",
+			audioFilePath			= "episode.ac3",
+			amountAudioStreams		= [1, 1],
+			audioSpeed				= 1.0,
+			segmentFallback			= False,
+			convertedVideoFilePath	= os.path.join(tempfile.gettempdir(), "episode.mkv")
+		)
+		job.infoVideo.duration = 3600.0
+
+		for infoStream in job.infoAudio:
+			infoStream.duration = 3600.0
+			infoStream.samplerate = 48000
+
+		return job
+
+	def getMeasurements(self):
+		# Linear normalization, all streams are encoded in segments
+		measurement = {"input_i": "-30.0", "input_lra": "3.0", "input_tp": "-20.0", "input_thresh": "-40.0", "target_offset": "0.0"}
+		return [measurement, measurement]
+
+	def testSegmentsStartAtAudioStart(self):
+		job = self.createJob("00:05:00.000")
+		segments = self.script["createSegments"](job, self.getMeasurements())
+
+		# Added audio is read from 300 s on, 3300 s are left for the segments
+		segmentsAdded = [segment for segment in segments if segment.idxStreamOut == 1]
+		self.assertEqual(len([segment for segment in segments if segment.idxStreamOut == 0]), 12)
+		self.assertEqual(len(segmentsAdded), 11)
+		self.assertEqual(segmentsAdded[-1].start, 3000)
+		self.assertIsNone(segmentsAdded[-1].end)
+
+		# Last segment is trimmed to the remaining samples after audioStart
+		command = self.script["buildSegmentCommand"](job, segmentsAdded[-1], self.getMeasurements()[1])
+		self.assertIn("atrim=duration=301.0,", command[command.index("-filter_complex") + 1])
+
+	def testSegmentsWithoutAudioStart(self):
+		job = self.createJob("00:00:00.000")
+		segments = self.script["createSegments"](job, self.getMeasurements())
+
+		self.assertEqual(len([segment for segment in segments if segment.idxStreamOut == 1]), 12)
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,160 @@
+import os
+import subprocess
+import tempfile
+import json
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+
+# =========================== Settings ==================================================
+
+# Statistics tags written by mkvpropedit --add-track-statistics-tags
+TRACK_STATISTICS_TAGS = ["BPS", "DURATION", "NUMBER_OF_FRAMES", "NUMBER_OF_BYTES"]
+
+
+# =========================== Functions =================================================
+
+def getTrackStreams(ffprobe, filePath):
+	# Streams stored as Matroska tracks, attachments are listed as streams by ffprobe but are no tracks
+	processOutJson = json.loads(subprocess.check_output([
+		ffprobe,
+		"-v",
+		"error",
+		"-show_entries",
+		"stream=index,codec_type,codec_name:stream_tags",
+		"-of",
+		"json",
+		filePath
+	]).decode("utf-8"))
+
+	return [stream for stream in processOutJson["streams"] if stream.get("codec_type") != "attachment"]
+
+
+def hasTrackStatistics(trackStreams):
+	for stream in trackStreams:
+		tagNames = [tagName.split("-")[0] for tagName in stream.get("tags", {})]
+
+		if not all(tagName in tagNames for tagName in TRACK_STATISTICS_TAGS):
+			return False
+
+	return True
+
+
+def getPacketIndex(ffprobe, filePath):
+	# Only packet headers are needed: [number of packets, bytes, first timestamp, end of last packet] per stream
+	process = subprocess.Popen([
+		ffprobe,
+		"-v",
+		"error",
+		"-show_entries",
+		"packet=stream_index,pts_time,duration_time,size",
+		"-of",
+		"csv=p=0",
+		filePath
+	], stdout = subprocess.PIPE, universal_newlines = True)
+
+	packetIndex = {}
+
+	for line in process.stdout:
+		fields = line.strip().split(",")
+
+		if len(fields) < 4:
+			continue
+
+		idxStream, ptsTime, durationTime, size = fields[:4]
+		entry = packetIndex.setdefault(int(idxStream), [0, 0, None, None])
+
+		entry[0] += 1
+		entry[1] += int(size) if size.isdigit() else 0
+
+		if ptsTime != "N/A":
+			start = float(ptsTime)
+			end = start + (float(durationTime) if durationTime != "N/A" else 0.0)
+
+			entry[2] = start if entry[2] is None else min(entry[2], start)
+			entry[3] = end if entry[3] is None else max(entry[3], end)
+
+	process.wait()
+
+	if process.returncode:
+		raise subprocess.CalledProcessError(process.returncode, ffprobe)
+
+	return packetIndex
+
+
+def buildStatisticsTags(trackStreams, trackPackets, writingApp):
+	# mkvpropedit arguments replacing the tags of every track, existing tags of the track are kept
+	arguments = []
+	tagFiles = []
+	writingDate = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+	for idxTrack, (stream, packets) in enumerate(zip(trackStreams, trackPackets)):
+		amountPackets, amountBytes, firstTime, endTime = packets
+		duration = endTime - firstTime if firstTime is not None and endTime is not None else 0.0
+
+		statistics = {
+			"BPS":							str(round(amountBytes * 8 / duration) if duration > 0 else 0),
+			"DURATION":						f"{int(duration // 3600):02d}:{int(duration % 3600 // 60):02d}:{duration % 60:012.9f}",
+			"NUMBER_OF_FRAMES":				str(amountPackets),
+			"NUMBER_OF_BYTES":				str(amountBytes),
+			"_STATISTICS_WRITING_APP":		writingApp,
+			"_STATISTICS_WRITING_DATE_UTC":	writingDate,
+			"_STATISTICS_TAGS":				" ".join(TRACK_STATISTICS_TAGS)
+		}
+
+		tagsNode = ET.Element("Tags")
+		tagNode = ET.SubElement(tagsNode, "Tag")
+		ET.SubElement(tagNode, "Targets")
+
+		# Name and language of the track are stored in the track header, not in the tags
+		for tagName, tagValue in stream.get("tags", {}).items():
+			name, separator, language = tagName.partition("-")
+
+			if name.lower() in ["language", "title"] or name in statistics:
+				continue
+
+			simpleNode = ET.SubElement(tagNode, "Simple")
+			ET.SubElement(simpleNode, "Name").text = name
+			ET.SubElement(simpleNode, "String").text = tagValue
+
+			if separator != "":
+				ET.SubElement(simpleNode, "TagLanguage").text = language
+
+		for name, value in statistics.items():
+			simpleNode = ET.SubElement(tagNode, "Simple")
+			ET.SubElement(simpleNode, "Name").text = name
+			ET.SubElement(simpleNode, "String").text = value
+
+		fileHandle, tagFilePath = tempfile.mkstemp(suffix = ".xml")
+		os.close(fileHandle)
+		ET.ElementTree(tagsNode).write(tagFilePath, encoding = "utf-8", xml_declaration = True)
+
+		tagFiles.append(tagFilePath)
+		arguments.extend(["--tags", "track:" + str(idxTrack + 1) + ":" + tagFilePath])
+
+	return [arguments, tagFiles]
+
+
+def removeTagFiles(statisticsTags):
+	if statisticsTags is None:
+		return
+
+	for tagFilePath in statisticsTags[1]:
+		if os.path.exists(tagFilePath):
+			os.remove(tagFilePath)
+
+
+def indexTrackStatistics(ffprobe, filePath, writingApp):
+	# Tags for mkvpropedit computed from the packet headers of the file itself, raises if the file cannot be indexed
+	trackStreams = getTrackStreams(ffprobe, filePath)
+
+	# Tags already present are kept, nothing to write
+	if hasTrackStatistics(trackStreams):
+		return [[], []]
+
+	packetIndex = getPacketIndex(ffprobe, filePath)
+
+	return buildStatisticsTags(
+		trackStreams,
+		[packetIndex.get(stream["index"], [0, 0, None, None]) for stream in trackStreams],
+		writingApp
+	)
@@ -0,0 +1,276 @@
+import os
+import subprocess
+import json
+from multiprocessing.pool import ThreadPool
+from datetime import datetime
+
+import numpy as np
+
+import estimate_audio_offset as estimator
+
+# =========================== Settings ==================================================
+
+# Folder containing the finished files (searched recursively)
+outputPath = r'script_output\\'
+fileExtensions = [".mkv", ".mp4"]
+
+# Maximum number of files verified simultaneously
+MAX_THREADS = 4
+
+# Original audio: first audio stream, added audio: first audio stream with this language (last audio stream if none)
+addedAudioLanguage = "deu"
+
+# Only these windows are decoded, spread between 5 % and 95 % of the file
+amountWindows = 6
+windowLength = 20.0				# Seconds
+# Maximum offset searched in every window (seconds)
+maxOffset = 2.0
+
+# Limits of a file in sync (seconds)
+maxAllowedOffset = 0.040
+# Difference of the offset between the first and the last window
+maxAllowedDrift = 0.040
+# Minimum peak of the cross-correlation (standard deviations above the mean) to use a window
+minConfidence = 6.0
+
+# Application paths
+ffmpeg = "ffmpeg.exe"
+ffprobe = "ffprobe.exe"
+
+# Log file location
+logFile = "logs/log_" + os.path.splitext(os.path.basename(__file__))[0] + datetime.today().now().strftime("%Y%m%d_%H%M%S") + ".txt"
+reportFile = "logs/sync_report_" + datetime.today().now().strftime("%Y%m%d_%H%M%S") + ".json"
+
+
+# =========================== Functions =================================================
+
+def logWrite(logStr):
+	print(logStr)
+	with open(logFile, 'a') as fileHandle:
+		fileHandle.write(logStr + '\n')
+
+
+def getSyncStreams(filePath):
+	# Returns [duration, index of the original audio stream, index of the added audio stream] (indices within the audio streams)
+	processOutJson = json.loads(subprocess.check_output([
+		ffprobe,
+		"-v",
+		"error",
+		"-show_entries",
+		"format=duration:stream=codec_type:stream_tags=language",
+		"-of",
+		"json",
+		filePath
+	]).decode("utf-8"))
+
+	languages = [
+		stream.get("tags", {}).get("language")
+		for stream in processOutJson["streams"]
+		if stream.get("codec_type") == "audio"
+	]
+
+	if len(languages) < 2:
+		raise ValueError("File has less than two audio streams")
+
+	idxAdded = languages.index(addedAudioLanguage, 1) if addedAudioLanguage in languages[1:] else len(languages) - 1
+
+	return [float(processOutJson["format"]["duration"]), 0, idxAdded]
+
+
+def decodeWindowEnvelopes(filePath, idxOriginal, idxAdded, start, length):
+	# Both streams of one window are decoded by one ffmpeg seeking to the window, returns onset envelopes [original, added]
+	sampleRate = estimator.decodeSampleRate
+	filterStr = ""
+
+	for label, idxStream in [["a", idxOriginal], ["b", idxAdded]]:
+		filterStr += "[0:a:" + str(idxStream) + "]"
+		filterStr += "aresample=" + str(sampleRate)
+		filterStr += ",aformat=sample_fmts=flt:channel_layouts=mono"
+		filterStr += "[" + label + "];"
+
+	filterStr += "[a][b]amerge=inputs=2[out]"
+
+	processOut = subprocess.run([
+		ffmpeg,
+		"-hide_banner",
+		"-loglevel",
+		"error",
+		"-ss",
+		estimator.secondsToTimeString(start),
+		"-t",
+		estimator.secondsToTimeString(length),
+		"-i",
+		filePath,
+		"-filter_complex",
+		filterStr,
+		"-map",
+		"[out]",
+		"-f",
+		"f32le",
+		"-"
+	], stdout = subprocess.PIPE)
+
+	if processOut.returncode:
+		raise RuntimeError("Failed to decode window at " + estimator.secondsToTimeString(start))
+
+	blockLength = sampleRate // estimator.envelopeRate
+	samples = np.frombuffer(processOut.stdout[:len(processOut.stdout) - len(processOut.stdout) % 8], dtype = np.float32).reshape(-1, 2)
+	amountBlocks = len(samples) // blockLength
+
+	# RMS of every block and channel
+	blocks = samples[:amountBlocks * blockLength].reshape(amountBlocks, blockLength, 2)
+	energy = np.sqrt(np.mean(np.square(blocks, dtype = np.float64), axis = 1))
+
+	return [estimator.getOnsetEnvelope(energy[:, 0]), estimator.getOnsetEnvelope(energy[:, 1])]
+
+
+def correlateWindows(originalWindows, addedWindows):
+	# Offset of the added audio in every window (positive: added audio is late), all windows are correlated at once
+	searchSamples = int(maxOffset * estimator.envelopeRate)
+	windowSamples = originalWindows.shape[1]
+
+	fftSize = estimator.getFftSize(windowSamples + addedWindows.shape[1])
+	correlation = np.fft.irfft(
+		np.fft.rfft(addedWindows, fftSize, axis = 1) * np.conj(np.fft.rfft(originalWindows, fftSize, axis = 1)),
+		fftSize,
+		axis = 1
+	)[:, :2 * searchSamples + 1]
+
+	peaks, confidence = estimator.getPeak(correlation)
+
+	return (peaks - searchSamples) / estimator.envelopeRate, confidence
+
+
+def verifyFile(filePath):
+	result = {
+		"file":			filePath,
+		"status":		"error",
+		"windows":		[]
+	}
+
+	try:
+		duration, idxOriginal, idxAdded = getSyncStreams(filePath)
+		result["streams"] = [idxOriginal, idxAdded]
+		result["duration"] = duration
+
+		searchSamples = int(maxOffset * estimator.envelopeRate)
+		windowSamples = int(windowLength * estimator.envelopeRate)
+		starts = np.linspace(0.05, 0.95, amountWindows) * duration - windowLength / 2
+		starts = np.clip(starts, maxOffset, max(duration - windowLength - maxOffset, maxOffset))
+
+		originalWindows = []
+		addedWindows = []
+		times = []
+
+		for start in starts:
+			# Added audio is decoded with maxOffset before and after the window
+			original, added = decodeWindowEnvelopes(filePath, idxOriginal, idxAdded, start - maxOffset, windowLength + 2 * maxOffset)
+
+			if len(added) < windowSamples + 2 * searchSamples:
+				continue
+
+			originalWindows.append(original[searchSamples:searchSamples + windowSamples])
+			addedWindows.append(added[:windowSamples + 2 * searchSamples])
+			times.append(start + windowLength / 2)
+
+		if not times:
+			raise ValueError("File is too short for the sampled windows")
+
+		offsets, confidence = correlateWindows(np.array(originalWindows), np.array(addedWindows))
+		times = np.array(times)
+
+		result["windows"] = [
+			{"time": round(float(time), 3), "offset": round(float(offset), 4), "confidence": round(float(conf), 1)}
+			for time, offset, conf in zip(times, offsets, confidence)
+		]
+
+		valid = confidence >= minConfidence
+		result["score"] = round(float(np.median(confidence)), 1)
+		result["usedWindows"] = int(np.count_nonzero(valid))
+
+		if np.count_nonzero(valid) < 2:
+			result["status"] = "unreliable"
+			return result
+
+		# Drift is the change of the offset from the first to the last window
+		slope, _ = np.polyfit(times[valid], offsets[valid], 1)
+		result["offset"] = round(float(np.median(offsets[valid])), 4)
+		result["drift"] = round(float(slope * (times[valid][-1] - times[valid][0])), 4)
+
+		if abs(result["drift"]) > maxAllowedDrift:
+			result["status"] = "drift"
+		elif abs(result["offset"]) > maxAllowedOffset:
+			result["status"] = "offset"
+		else:
+			result["status"] = "ok"
+	except (OSError, ValueError, KeyError, RuntimeError, subprocess.CalledProcessError) as e:
+		result["error"] = str(e)
+
+	return result
+
+
+def verifyFiles(filePaths):
+	with ThreadPool(max(MAX_THREADS, 1)) as verifyPool:
+		return verifyPool.map(verifyFile, filePaths)
+
+
+def formatResult(result):
+	resultStr = "[" + result["status"] + "] \"" + result["file"] + "\""
+
+	if "offset" in result:
+		resultStr += ": offset " + f"{result['offset'] * 1000:+.0f}" + " ms, drift " + f"{result['drift'] * 1000:+.0f}" + " ms"
+
+	if "score" in result:
+		resultStr += ", score " + f"{result['score']:.1f}" + " (" + str(result["usedWindows"]) + " of " + str(len(result["windows"])) + " windows)"
+
+	if "error" in result:
+		resultStr += ": " + result["error"]
+
+	return resultStr
+
+
+def writeReport(results, reportFilePath):
+	if os.path.dirname(reportFilePath) != "":
+		os.makedirs(os.path.dirname(reportFilePath), exist_ok = True)
+
+	report = {
+		"created":		datetime.now().isoformat(timespec = "seconds"),
+		"files":		len(results),
+		"status":		{status: sum(1 for result in results if result["status"] == status) for status in ["ok", "offset", "drift", "unreliable", "error"]},
+		"results":		results
+	}
+
+	with open(reportFilePath, 'w', encoding = "utf-8") as fileHandle:
+		json.dump(report, fileHandle, indent = 2)
+
+
+def findFiles(folderPath):
+	filePaths = []
+
+	for dirPath, dirNames, fileNames in os.walk(folderPath):
+		dirNames.sort()
+
+		for fileName in sorted(fileNames):
+			# Incomplete outputs of add_audio_track_mt.py are skipped
+			if os.path.splitext(fileName)[1].lower() in fileExtensions and ".partial." not in fileName:
+				filePaths.append(os.path.join(dirPath, fileName))
+
+	return filePaths
+
+
+# =========================== Start of Script ===========================================
+
+if __name__ == "__main__":
+	# Clear log file
+	open(logFile, 'w').close()
+
+	# Write name of script to log file
+	logWrite("This is " + os.path.basename(__file__))
+
+	results = verifyFiles(findFiles(outputPath))
+
+	for result in results:
+		logWrite(formatResult(result))
+
+	writeReport(results, reportFile)
+	logWrite("Sync report of " + str(len(results)) + " files written to \"" + reportFile + "\"")